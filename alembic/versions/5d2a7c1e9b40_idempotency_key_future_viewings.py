@@ -0,0 +1,33 @@
+"""idempotency key en future_viewings
+
+Revision ID: 5d2a7c1e9b40
+Revises: 113cfb044a91
+Create Date: 2026-10-19 14:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2a7c1e9b40'
+down_revision: Union[str, None] = '113cfb044a91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('future_viewings', sa.Column('idempotency_key', sa.String(length=128), nullable=True))
+    op.create_index(
+        'ix_future_viewings_idempotency_key', 'future_viewings', ['idempotency_key'],
+        unique=True, postgresql_where=sa.text('idempotency_key IS NOT NULL'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_future_viewings_idempotency_key', table_name='future_viewings')
+    op.drop_column('future_viewings', 'idempotency_key')
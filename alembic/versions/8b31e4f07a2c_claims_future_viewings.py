@@ -0,0 +1,35 @@
+"""claims de trabajos de imagen en future_viewings
+
+Revision ID: 8b31e4f07a2c
+Revises: 5d2a7c1e9b40
+Create Date: 2026-10-19 15:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b31e4f07a2c'
+down_revision: Union[str, None] = '5d2a7c1e9b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('future_viewings', sa.Column('claimed_by', sa.String(length=100), nullable=True))
+    op.add_column('future_viewings', sa.Column('claimed_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index(
+        'ix_future_viewings_pending_created_at', 'future_viewings', ['created_at'],
+        postgresql_where=sa.text("status = 'PENDING'"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_future_viewings_pending_created_at', table_name='future_viewings')
+    op.drop_column('future_viewings', 'claimed_at')
+    op.drop_column('future_viewings', 'claimed_by')
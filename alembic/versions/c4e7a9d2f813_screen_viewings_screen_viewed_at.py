@@ -0,0 +1,27 @@
+"""índice de screen_viewings por pantalla y fecha de visualización
+
+Revision ID: c4e7a9d2f813
+Revises: 8b31e4f07a2c
+Create Date: 2026-10-19 16:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e7a9d2f813'
+down_revision: Union[str, None] = '8b31e4f07a2c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_screen_viewings_screen_id_viewed_at', 'screen_viewings', ['screen_id', 'viewed_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_screen_viewings_screen_id_viewed_at', table_name='screen_viewings')
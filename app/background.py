@@ -1,47 +1,637 @@
 import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import OrderedDict, deque
+from itertools import islice
+from dataclasses import dataclass, field
+from enum import Enum
+from datetime import datetime, timedelta, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
 from .db import AsyncSessionLocal
-from .services import image_generator
-from .crud import update_future_viewing_image, update_future_viewing_status
+from .services import ensure_image_provider_configured, get_image_generator
+from .crud import (
+    expire_idempotency_keys,
+    get_future_viewings_by_ids, claim_pending_future_viewings, renew_claims, release_claims,
+)
 from .models import ProcessingStatus
+from .cleanup_images import evict_to_quota
+from .images import IMAGES_DIR, image_cache, served_at, prune_served_at
+from .metrics import TASK_QUEUE_DEPTH, IMAGE_WORKERS_BUSY, IMAGE_JOB_QUEUE_WAIT, TIME_TO_COMPLETED, IMAGE_JOBS_SHED
+from .logging_config import sampled
+from .write_behind import status_writer
+from .feed import screen_feed
 
-# Una cola simple en memoria para las tareas de generación de imágenes
+logger = logging.getLogger(__name__)
+
+# Cuota de disco para las imágenes generadas (0 desactiva la expulsión por cuota)
+IMAGE_STORE_MAX_BYTES = int(os.getenv("IMAGE_STORE_MAX_BYTES", "0"))
+IMAGE_EVICTION_INTERVAL_SECONDS = int(os.getenv("IMAGE_EVICTION_INTERVAL_SECONDS", "300"))
+# Vigencia de las claves de idempotencia de addFutureViewing y cada cuánto se liberan las vencidas
+IDEMPOTENCY_KEY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS = int(os.getenv("IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS", "600"))
+
+# Cola acotada en memoria para las tareas de generación de imágenes
 # En producción, podrías considerar Celery, RQ, o ARQ con Redis.
-task_queue = asyncio.Queue()
+IMAGE_QUEUE_MAX_SIZE = int(os.getenv("IMAGE_QUEUE_MAX_SIZE", "500"))  # 0 sin límite
+# Trabajos que el barrido de aplazados y la recuperación encolan como mucho en cada pasada
+IMAGE_QUEUE_REFILL_BATCH = int(os.getenv("IMAGE_QUEUE_REFILL_BATCH", "500"))
+# Qué hacer con un addFutureViewing cuando la cola está llena:
+# "reject" responde con un error QUEUE_FULL sin crear la fila; "defer" la crea como PENDING y
+# encola el trabajo cuando vuelve a haber sitio
+IMAGE_QUEUE_FULL_POLICY = os.getenv("IMAGE_QUEUE_FULL_POLICY", "reject")
+IMAGE_WORKER_CONCURRENCY = int(os.getenv("IMAGE_WORKER_CONCURRENCY", "1"))
+# Con trabajos en ambos carriles, uno de cada N trabajos tomados sale del carril LOW (reintentos,
+# recuperaciones), para que no se quede sin atender bajo carga continua
+IMAGE_QUEUE_LOW_LANE_EVERY = int(os.getenv("IMAGE_QUEUE_LOW_LANE_EVERY", "5"))
+# Trabajos en cola que admite cada origen (kiosco o cliente) con la política "reject"; 0 sin límite
+IMAGE_QUEUE_MAX_PER_SOURCE = int(os.getenv("IMAGE_QUEUE_MAX_PER_SOURCE", "100"))
+# Duración estimada de un trabajo hasta que haya mediciones reales
+IMAGE_JOB_ESTIMATE_SECONDS = float(os.getenv("IMAGE_JOB_ESTIMATE_SECONDS", "15"))
+DEFERRED_SWEEP_INTERVAL_SECONDS = float(os.getenv("DEFERRED_SWEEP_INTERVAL_SECONDS", "2"))
+# Identificador de esta instancia en los claims de trabajos (future_viewings.claimed_by).
+# El sufijo aleatorio distingue un proceso reiniciado con el mismo hostname y PID (p. ej. PID 1).
+INSTANCE_ID = os.getenv("INSTANCE_ID") or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+# Un claim que no se renueva en este tiempo se considera abandonado (instancia caída)
+IMAGE_JOB_LEASE_SECONDS = float(os.getenv("IMAGE_JOB_LEASE_SECONDS", "120"))
+# Tiempo que el apagado espera a que terminen las generaciones en curso
+IMAGE_SHUTDOWN_GRACE_SECONDS = float(os.getenv("IMAGE_SHUTDOWN_GRACE_SECONDS", "20"))
+IMAGE_RECOVERY_INTERVAL_SECONDS = float(os.getenv("IMAGE_RECOVERY_INTERVAL_SECONDS", "30"))
+# Los trabajos PENDING más antiguos no se recuperan: su imagen ya no se mostraría
+IMAGE_RECOVERY_MAX_AGE_HOURS = float(os.getenv("IMAGE_RECOVERY_MAX_AGE_HOURS", "24"))
+# Peso de cada nueva medición en la media móvil exponencial de la duración de los trabajos
+THROUGHPUT_EWMA_ALPHA = 0.2
+
+
+class JobPriority(str, Enum):
+    """Queue lane of an image job: live submissions go first, retries and recoveries after."""
+    HIGH = "high"
+    LOW = "low"
+
+
+# Origen de los trabajos que no vienen de una petición (recuperados de otras instancias)
+RECOVERY_SOURCE = "recovery"
+
+
+@dataclass
+class ImageJob:
+    """
+    An image generation job waiting in, or taken from, `task_queue`.
+
+    Attributes:
+        future_viewing_id (str): ID of the FutureViewing whose image is generated.
+        name (str): Name used in the prompt.
+        age (int): Age used in the prompt.
+        content (str): The user's description, used in the prompt.
+        source (str): Kiosk or client that submitted the job; the queue is fair between sources.
+        priority (JobPriority): Lane the job waits in.
+        job_id (str): Random ID correlating the job's log records.
+        enqueued_at (float): time.monotonic() when the job entered the queue.
+    """
+    future_viewing_id: str
+    name: str
+    age: int
+    content: str
+    source: str = RECOVERY_SOURCE
+    priority: JobPriority = JobPriority.HIGH
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    enqueued_at: float = 0.0
+
+
+class QueueFullError(Exception):
+    """Raised when a new image job is rejected because the queue is full."""
+
+    def __init__(self, retry_after_seconds: float):
+        super().__init__("The image generation queue is full.")
+        self.retry_after_seconds = retry_after_seconds
+
+
+class ShuttingDownError(Exception):
+    """Raised when a new image job arrives while the process is shutting down."""
+
+
+class FairJobQueue:
+    """
+    Bounded image job queue with two priority lanes and round-robin between sources.
+
+    Within a lane every source (kiosk or client) has its own FIFO, and the workers take one job
+    from each source in turn, so a burst from one kiosk only delays that kiosk's own jobs. The
+    HIGH lane goes first, but while both lanes have work one of every IMAGE_QUEUE_LOW_LANE_EVERY
+    jobs comes from the LOW lane, so retries are never starved.
+
+    It offers the subset of the asyncio.Queue interface the workers use.
+    """
+
+    def __init__(self, maxsize: int, low_lane_every: int):
+        self.maxsize = maxsize
+        self.low_lane_every = max(low_lane_every, 1)
+        # carril -> origen -> trabajos; el orden del OrderedDict es el turno de cada origen
+        self._lanes: dict[JobPriority, OrderedDict[str, deque[ImageJob]]] = {
+            priority: OrderedDict() for priority in JobPriority
+        }
+        self._size = 0
+        self._high_streak = 0  # Trabajos HIGH tomados seguidos con el carril LOW esperando
+        self._available = asyncio.Semaphore(0)
+        self._positions: dict[str, int] | None = None  # Orden previsto, invalidado en cada cambio
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return self._size == 0
+
+    def full(self) -> bool:
+        return 0 < self.maxsize <= self._size
+
+    def room(self, limit: int) -> int:
+        """How many more jobs fit, at most `limit` (exactly `limit` if the queue is unbounded)."""
+        if self.maxsize <= 0:
+            return limit
+        return max(min(self.maxsize - self._size, limit), 0)
+
+    def source_size(self, source: str) -> int:
+        return sum(len(lane.get(source, ())) for lane in self._lanes.values())
+
+    def active_sources(self) -> int:
+        return len(self._lanes[JobPriority.HIGH])
+
+    def put_nowait(self, job: ImageJob) -> None:
+        if self.full():
+            raise asyncio.QueueFull
+        job.enqueued_at = time.monotonic()
+        lane = self._lanes[job.priority]
+        if job.source not in lane:
+            lane[job.source] = deque()  # Un origen nuevo espera su turno al final de la ronda
+        lane[job.source].append(job)
+        self._size += 1
+        self._positions = None
+        self._available.release()
+
+    async def get(self) -> ImageJob:
+        while True:
+            await self._available.acquire()
+            # Puede sobrar un permiso si alguien vació la cola con get_nowait()
+            if self._size:
+                return self.get_nowait()
+
+    def get_nowait(self) -> ImageJob:
+        if self._size == 0:
+            raise asyncio.QueueEmpty
+        job, self._high_streak = self._take(self._lanes, self._high_streak)
+        self._size -= 1
+        self._positions = None
+        return job
+
+    def task_done(self) -> None:
+        pass
+
+    def job_ids(self) -> list[str]:
+        """FutureViewing IDs of the jobs waiting in the queue."""
+        return [job.future_viewing_id for lane in self._lanes.values() for jobs in lane.values() for job in jobs]
+
+    def _take(self, lanes, high_streak: int) -> tuple[ImageJob, int]:
+        """Removes the next job from `lanes` following the scheduling rules; returns it and the new streak."""
+        high, low = lanes[JobPriority.HIGH], lanes[JobPriority.LOW]
+        use_low = bool(low) and (not high or high_streak >= self.low_lane_every - 1)
+        lane = low if use_low else high
+        source, jobs = next(iter(lane.items()))
+        job = jobs.popleft()
+        if jobs:
+            lane.move_to_end(source)
+        else:
+            del lane[source]
+        return job, (0 if use_low or not low else high_streak + 1)
+
+    def position(self, future_viewing_id: str) -> int | None:
+        """1 for the next job the workers will take, 2 for the one after, ... assuming no new arrivals."""
+        if self._positions is None:
+            lanes = {
+                priority: OrderedDict((source, deque(jobs)) for source, jobs in lane.items())
+                for priority, lane in self._lanes.items()
+            }
+            streak = self._high_streak
+            positions = {}
+            for i in range(1, self._size + 1):
+                job, streak = self._take(lanes, streak)
+                positions[job.future_viewing_id] = i
+            self._positions = positions
+        return self._positions.get(future_viewing_id)
+
+
+class JobTracker:
+    """
+    Keeps the queue position of every job in this process and the measured job duration.
+
+    Positions come from the queue's own schedule, followed by the deferred jobs in arrival order.
+    Durations are smoothed with an exponential moving average, which follows the provider's live
+    latency.
+    """
+
+    def __init__(self, queue: FairJobQueue):
+        self.queue = queue
+        self.in_progress: dict[str, float] = {}  # future_viewing_id -> time.time() de inicio
+        # future_viewing_id -> (origen, carril) de los trabajos aún no encolados, en orden de llegada
+        self.deferred: OrderedDict[str, tuple[str, JobPriority]] = OrderedDict()
+        self.ewma_seconds: float | None = None
+
+    def start(self, job: ImageJob) -> None:
+        self.in_progress[job.future_viewing_id] = time.time()
+        IMAGE_JOB_QUEUE_WAIT.labels(job.priority.value).observe(time.monotonic() - job.enqueued_at)
+
+    def finish(self, job: ImageJob) -> None:
+        started = self.in_progress.pop(job.future_viewing_id, None)
+        if started is not None:
+            duration = time.time() - started
+            if self.ewma_seconds is None:
+                self.ewma_seconds = duration
+            else:
+                self.ewma_seconds += THROUGHPUT_EWMA_ALPHA * (duration - self.ewma_seconds)
+
+    def held_ids(self) -> list[str]:
+        """FutureViewing IDs of every job this process holds: in progress, queued or deferred."""
+        return [*self.in_progress, *self.queue.job_ids(), *self.deferred]
+
+    @property
+    def job_seconds(self) -> float:
+        return self.ewma_seconds if self.ewma_seconds is not None else IMAGE_JOB_ESTIMATE_SECONDS
+
+    def throughput(self) -> float:
+        """Jobs completed per second with the configured worker concurrency."""
+        return IMAGE_WORKER_CONCURRENCY / self.job_seconds
+
+    def position(self, future_viewing_id: str) -> int | None:
+        """0 while being generated, 1 for the next job, ...; None if this process does not hold the job."""
+        if future_viewing_id in self.in_progress:
+            return 0
+        position = self.queue.position(future_viewing_id)
+        if position is not None:
+            return position
+        if future_viewing_id in self.deferred:
+            return self.queue.qsize() + list(self.deferred).index(future_viewing_id) + 1
+        return None
+
+    def estimated_ready_at(self, future_viewing_id: str) -> datetime | None:
+        now = time.time()
+        started = self.in_progress.get(future_viewing_id)
+        if started is not None:
+            ready = max(started + self.job_seconds, now)
+        else:
+            position = self.position(future_viewing_id)
+            if position is None:
+                return None
+            # Trabajos por delante repartidos entre los workers, más media duración del que está
+            # en curso en cada worker, más la duración del propio trabajo
+            ready = now + ((position - 1) / IMAGE_WORKER_CONCURRENCY + 0.5) * self.job_seconds + self.job_seconds
+        return datetime.fromtimestamp(ready, timezone.utc)
+
+    def retry_after(self) -> float:
+        """Seconds until the queue has room for one more job, at the current throughput."""
+        return 1 / self.throughput()
+
+
+task_queue = FairJobQueue(IMAGE_QUEUE_MAX_SIZE, IMAGE_QUEUE_LOW_LANE_EVERY)
+job_tracker = JobTracker(task_queue)
+TASK_QUEUE_DEPTH.set_function(task_queue.qsize)
+
+# Workers en ejecución, por nombre; /readyz comprueba que sigan vivos
+worker_tasks: dict[str, asyncio.Task] = {}
+# Workers de generación con un trabajo en curso (el apagado espera a que terminen)
+busy_workers: set[asyncio.Task] = set()
+# Se activa al apagar: no se aceptan trabajos nuevos y los workers no toman más de la cola
+draining = asyncio.Event()
+
+
+def check_admission(source: str) -> None:
+    """
+    Applies IMAGE_QUEUE_FULL_POLICY before a new FutureViewing is created.
+
+    Args:
+        source (str): Kiosk or client submitting the job.
 
+    Raises:
+        ShuttingDownError: If the process is shutting down.
+        QueueFullError: If the policy is "reject" and the queue is full, or the source already has
+                        IMAGE_QUEUE_MAX_PER_SOURCE jobs waiting.
+    """
+    if draining.is_set():
+        raise ShuttingDownError("The server is shutting down.")
+    if IMAGE_QUEUE_FULL_POLICY != "reject":
+        return
+    if task_queue.full() or job_tracker.deferred:
+        IMAGE_JOBS_SHED.labels("rejected").inc()
+        raise QueueFullError(job_tracker.retry_after())
+    if IMAGE_QUEUE_MAX_PER_SOURCE and task_queue.source_size(source) >= IMAGE_QUEUE_MAX_PER_SOURCE:
+        IMAGE_JOBS_SHED.labels("rejected").inc()
+        # Con el reparto por turnos, a este origen le toca uno de cada (orígenes activos) trabajos
+        raise QueueFullError(job_tracker.retry_after() * max(task_queue.active_sources(), 1))
 
-async def enqueue_image_generation(future_viewing_id: str, name: str, age: int, content: str):
-    await task_queue.put((future_viewing_id, name, age, content))
-    print(f"Tarea de generación de imagen encolada para FutureViewing ID: {future_viewing_id}")
+
+def _enqueue_or_defer(job: ImageJob) -> bool:
+    """Queues the job, or defers it when there is no room (or deferred jobs are ahead of it)."""
+    if job_tracker.deferred or task_queue.full():
+        # Queda PENDING (y reclamado por esta instancia) hasta que lo encole el barrido
+        job_tracker.deferred[job.future_viewing_id] = (job.source, job.priority)
+        return False
+    task_queue.put_nowait(job)
+    return True
+
+
+async def enqueue_image_generation(
+    future_viewing_id: str, name: str, age: int, content: str,
+    source: str, priority: JobPriority = JobPriority.HIGH,
+):
+    job = ImageJob(future_viewing_id, name, age, content, source, priority)
+    if not _enqueue_or_defer(job):
+        IMAGE_JOBS_SHED.labels("deferred").inc()
+        logger.warning("Cola de imágenes llena, tarea aplazada",
+                       extra={"job_id": job.job_id, "viewing_id": future_viewing_id,
+                              "deferred": len(job_tracker.deferred)})
+        return
+    logger.info("Tarea de generación de imagen encolada",
+                extra=sampled(job_id=job.job_id, viewing_id=future_viewing_id,
+                              source=source, priority=priority.value))
+
+
+async def _run_job(image_generator, job: ImageJob) -> None:
+    image_url = await image_generator.generate_image(job.name, job.age, job.content, job.future_viewing_id)
+
+    # El resultado se escribe en lote con los de otros workers; write() vuelve tras el commit
+    if image_url:
+        created_at = await status_writer.write(job.future_viewing_id, ProcessingStatus.COMPLETED, image_url)
+        if created_at is not None:
+            TIME_TO_COMPLETED.observe((datetime.now(timezone.utc) - created_at).total_seconds())
+            # Las pantallas la ven en su próximo sondeo, sin esperar a la sincronización del índice
+            screen_feed.add_completed(job.future_viewing_id, job.name, job.age, job.content, created_at, image_url)
+        logger.info("Imagen generada y FutureViewing actualizado",
+                    extra={"job_id": job.job_id, "viewing_id": job.future_viewing_id, "image_url": image_url})
+    else:
+        await status_writer.write(job.future_viewing_id, ProcessingStatus.FAILED)
+        logger.warning("Falló la generación de imagen. Estado actualizado a FAILED.",
+                       extra={"job_id": job.job_id, "viewing_id": job.future_viewing_id})
+
+
+async def _release_job(job: ImageJob) -> None:
+    """
+    Gives up this instance's claim on a job its worker could not run, so that the recovery of any
+    instance queues it again. If the release fails too, the lease (no longer renewed) expires.
+    """
+    try:
+        async with AsyncSessionLocal() as db_session:
+            await release_claims(db_session, INSTANCE_ID, [uuid.UUID(job.future_viewing_id)])
+    except Exception as e:
+        logger.exception("No se pudo liberar el trabajo de imagen fallido: %s", e,
+                         extra={"job_id": job.job_id, "viewing_id": job.future_viewing_id})
 
 
 async def image_generation_worker():
-    print("Iniciando worker de generación de imágenes...")
+    logger.info("Iniciando worker de generación de imágenes...")
+    # Si falta la API key el worker termina aquí y /readyz lo informa
+    ensure_image_provider_configured()
+    image_generator = None
+    current = asyncio.current_task()
+    while not draining.is_set():
+        job = await task_queue.get()
+        busy_workers.add(current)
+        job_tracker.start(job)
+        IMAGE_WORKERS_BUSY.inc()
+        try:
+            if image_generator is None:
+                # El SDK del proveedor se importa con el primer trabajo, en un hilo para no bloquear el event loop
+                image_generator = await asyncio.to_thread(get_image_generator)
+            logger.info("Procesando tarea", extra=sampled(job_id=job.job_id, viewing_id=job.future_viewing_id))
+            await _run_job(image_generator, job)
+        except Exception as e:
+            # Manejo básico de errores en el worker.
+            # Considera un logging más robusto y reintentos si es necesario.
+            logger.exception("Error en image_generation_worker: %s", e,
+                             extra={"job_id": job.job_id, "viewing_id": job.future_viewing_id})
+            await _release_job(job)
+            await asyncio.sleep(5)  # Esperar un poco antes de tomar una nueva tarea (p. ej. si la BD no responde)
+        finally:
+            IMAGE_WORKERS_BUSY.dec()
+            job_tracker.finish(job)
+            task_queue.task_done()
+            busy_workers.discard(current)
+
+
+async def deferred_job_sweeper():
+    """
+    Moves deferred jobs into the queue, oldest first, as the workers free up room.
+
+    Only the FutureViewing IDs (with their source and lane) are kept in memory while deferred; the
+    prompt data is read back from the database, and rows that are no longer PENDING are skipped.
+    """
     while True:
+        await asyncio.sleep(DEFERRED_SWEEP_INTERVAL_SECONDS)
+        free = task_queue.room(IMAGE_QUEUE_REFILL_BATCH)
+        if not job_tracker.deferred or free <= 0:
+            continue
+        batch = list(islice(job_tracker.deferred, free))
         try:
-            future_viewing_id, name, age, content = await task_queue.get()
-            print(f"Procesando tarea para FutureViewing ID: {future_viewing_id}")
+            async with AsyncSessionLocal() as db_session:
+                rows = await get_future_viewings_by_ids(db_session, [uuid.UUID(fv_id) for fv_id in batch])
+        except Exception as e:
+            logger.exception("Error en deferred_job_sweeper: %s", e)
+            continue
+        by_id = {str(fv.id): fv for fv in rows}
+        for fv_id in batch:
+            source, priority = job_tracker.deferred.pop(fv_id)
+            fv = by_id.get(fv_id)
+            if fv is None or fv.status != ProcessingStatus.PENDING:
+                continue
+            task_queue.put_nowait(ImageJob(fv_id, fv.name, fv.age, fv.content, source, priority))
+        logger.info("Tareas aplazadas revisadas: %d (quedan %d)", len(batch), len(job_tracker.deferred))
 
-            async with AsyncSessionLocal() as db_session:  # Nueva sesión para esta tarea
-                image_url = await image_generator.generate_image(name, age, content, future_viewing_id)
 
-                if image_url:
-                    await update_future_viewing_image(db_session, future_viewing_id, image_url,
-                                                      ProcessingStatus.COMPLETED)
-                    print(f"Imagen generada y FutureViewing ID: {future_viewing_id} actualizado con URL: {image_url}")
-                else:
-                    await update_future_viewing_status(db_session, future_viewing_id, ProcessingStatus.FAILED)
-                    print(
-                        f"Falló la generación de imagen para FutureViewing ID: {future_viewing_id}. Estado actualizado a FAILED.")
+async def pending_job_recovery_worker():
+    """
+    Claims and queues the PENDING jobs that no live instance holds: those released by an instance
+    that shut down, and those whose owner crashed and stopped renewing its lease. Runs right at
+    startup and then every IMAGE_RECOVERY_INTERVAL_SECONDS, only claiming as many rows as fit.
+    """
+    while True:
+        free = task_queue.room(IMAGE_QUEUE_REFILL_BATCH) - len(job_tracker.deferred)
+        if free > 0:
+            try:
+                now = datetime.now(timezone.utc)
+                async with AsyncSessionLocal() as db_session:
+                    rows = await claim_pending_future_viewings(
+                        db_session, INSTANCE_ID,
+                        stale_before=now - timedelta(seconds=IMAGE_JOB_LEASE_SECONDS),
+                        created_after=now - timedelta(hours=IMAGE_RECOVERY_MAX_AGE_HOURS),
+                        limit=free,
+                    )
+                recovered = 0
+                for fv in rows:
+                    fv_id = str(fv.id)
+                    if job_tracker.position(fv_id) is None:  # Podría ser propio si no se pudo renovar a tiempo
+                        _enqueue_or_defer(ImageJob(fv_id, fv.name, fv.age, fv.content,
+                                                   RECOVERY_SOURCE, JobPriority.LOW))
+                        recovered += 1
+                if recovered:
+                    logger.info("Trabajos de imagen pendientes recuperados: %d", recovered)
+            except Exception as e:
+                logger.exception("Error en pending_job_recovery_worker: %s", e)
+        await asyncio.sleep(IMAGE_RECOVERY_INTERVAL_SECONDS)
 
-            task_queue.task_done()
+
+async def job_lease_renewal_worker():
+    """
+    Renews this instance's claims on the jobs it still holds (in progress, queued or deferred) so
+    other instances do not take them over. Jobs it dropped are left to expire and be recovered.
+    """
+    while True:
+        await asyncio.sleep(IMAGE_JOB_LEASE_SECONDS / 3)
+        held = job_tracker.held_ids()
+        if not held:
+            continue
+        try:
+            async with AsyncSessionLocal() as db_session:
+                await renew_claims(db_session, INSTANCE_ID, [uuid.UUID(fv_id) for fv_id in held])
         except Exception as e:
-            # Manejo básico de errores en el worker.
-            # Considera un logging más robusto y reintentos si es necesario.
-            print(
-                f"Error en image_generation_worker procesando {future_viewing_id if 'future_viewing_id' in locals() else 'tarea desconocida'}: {e}")
-            # No hacer task_done() si la tarea debe reintentarse o ser manejada de otra forma.
-            # Si la tarea falló catastróficamente, task_done() puede ser apropiado para evitar que bloquee la cola.
-            if task_queue.empty() == False:  # Solo si aún quedan tareas
-                task_queue.task_done()  # Marca como hecha para que no se bloquee la cola ante un error grave.
-            await asyncio.sleep(5)  # Esperar un poco antes de reintentar obtener una nueva tarea
\ No newline at end of file
+            logger.exception("Error en job_lease_renewal_worker: %s", e)
+
+
+async def image_quota_eviction_worker():
+    """
+    Keeps the image directory under IMAGE_STORE_MAX_BYTES by periodically evicting the least
+    recently served or displayed images. Images in the current 24h screen window are never evicted.
+    """
+    logger.info("Iniciando expulsión por cuota de imágenes (límite: %d bytes)...", IMAGE_STORE_MAX_BYTES)
+    while True:
+        try:
+            await prune_served_at()
+            await evict_to_quota(
+                IMAGES_DIR,
+                IMAGE_STORE_MAX_BYTES,
+                session_factory=AsyncSessionLocal,
+                served_at=served_at,
+                on_evicted=image_cache.invalidate,
+            )
+        except Exception as e:
+            logger.exception("Error en image_quota_eviction_worker: %s", e)
+        await asyncio.sleep(IMAGE_EVICTION_INTERVAL_SECONDS)
+
+
+async def idempotency_key_cleanup_worker():
+    """
+    Periodically releases the idempotency keys older than IDEMPOTENCY_KEY_TTL_HOURS, keeping the
+    unique index small. A retry after that window creates a new FutureViewing.
+    """
+    logger.info("Iniciando limpieza de claves de idempotencia (vigencia: %s h)...", IDEMPOTENCY_KEY_TTL_HOURS)
+    while True:
+        try:
+            cutoff = datetime.now(timezone.utc) - timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS)
+            async with AsyncSessionLocal() as db_session:
+                expired = await expire_idempotency_keys(db_session, cutoff)
+            if expired:
+                logger.info("Claves de idempotencia vencidas liberadas: %d", expired)
+        except Exception as e:
+            logger.exception("Error en idempotency_key_cleanup_worker: %s", e)
+        await asyncio.sleep(IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS)
+
+
+# Workers que reclaman o sostienen trabajos: solo tienen sentido con algún worker de generación vivo
+_JOB_HOLDING_WORKERS = ("deferred_job_sweeper", "pending_job_recovery", "job_lease_renewal")
+_abandon_task: asyncio.Task | None = None
+
+
+async def _abandon_held_jobs() -> None:
+    """
+    Called when every image worker has exited outside a shutdown (e.g. GOOGLE_API_KEY is missing).
+
+    Stops claiming and renewing jobs, drops the queued and deferred ones and releases all of this
+    instance's claims, so other instances generate those images instead of waiting on one that
+    never will.
+    """
+    holders = [worker_tasks[name] for name in _JOB_HOLDING_WORKERS if name in worker_tasks]
+    for task in holders:
+        task.cancel()
+    # Un claim a medio hacer termina (commit o rollback) antes de liberar
+    await asyncio.gather(*holders, return_exceptions=True)
+    while not task_queue.empty():
+        task_queue.get_nowait()
+    job_tracker.deferred.clear()
+    try:
+        async with AsyncSessionLocal() as db_session:
+            released = await release_claims(db_session, INSTANCE_ID)
+        logger.error("No queda ningún worker de generación de imágenes: %d trabajos devueltos como PENDING", released)
+    except Exception as e:
+        logger.exception("No se pudieron liberar los trabajos de imagen pendientes: %s", e)
+
+
+def _on_image_worker_exit(task: asyncio.Task) -> None:
+    global _abandon_task
+    if draining.is_set() or _abandon_task is not None:
+        return
+    image_workers = [t for name, t in worker_tasks.items() if name.startswith("image_generation")]
+    if all(t.done() for t in image_workers):
+        _abandon_task = asyncio.create_task(_abandon_held_jobs(), name="abandon_held_jobs")
+
+
+def _log_worker_exit(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("El worker %s terminó: %s", task.get_name(), task.exception())
+
+
+def start_workers() -> None:
+    """Starts the background workers on the running event loop and keeps references to them."""
+    global _abandon_task
+    _abandon_task = None
+    for i in range(IMAGE_WORKER_CONCURRENCY):
+        name = f"image_generation-{i}"
+        worker_tasks[name] = asyncio.create_task(image_generation_worker(), name=name)
+    worker_tasks["deferred_job_sweeper"] = asyncio.create_task(deferred_job_sweeper(), name="deferred_job_sweeper")
+    worker_tasks["pending_job_recovery"] = asyncio.create_task(
+        pending_job_recovery_worker(), name="pending_job_recovery"
+    )
+    worker_tasks["job_lease_renewal"] = asyncio.create_task(job_lease_renewal_worker(), name="job_lease_renewal")
+    worker_tasks["idempotency_key_cleanup"] = asyncio.create_task(
+        idempotency_key_cleanup_worker(), name="idempotency_key_cleanup"
+    )
+    if IMAGE_STORE_MAX_BYTES > 0:
+        worker_tasks["image_quota_eviction"] = asyncio.create_task(
+            image_quota_eviction_worker(), name="image_quota_eviction"
+        )
+    for name, task in worker_tasks.items():
+        task.add_done_callback(_log_worker_exit)
+        if name.startswith("image_generation"):
+            task.add_done_callback(_on_image_worker_exit)
+
+
+async def stop_workers(grace_seconds: float = IMAGE_SHUTDOWN_GRACE_SECONDS) -> None:
+    """
+    Stops the background workers for a graceful shutdown.
+
+    New jobs are refused from here on and idle workers stop at once. Generations in progress get
+    up to `grace_seconds` to finish and persist their result; the rest are cancelled. Finally,
+    every job this instance still holds (queued, deferred or cancelled) is released in the
+    database, so the next instance picks it up as PENDING.
+    """
+    draining.set()
+    image_workers = [task for name, task in worker_tasks.items() if name.startswith("image_generation")]
+    in_flight = [task for task in image_workers if task in busy_workers]
+    for task in worker_tasks.values():
+        if task not in in_flight:
+            task.cancel()
+
+    if in_flight:
+        logger.info("Esperando %d generaciones de imagen en curso (máx. %.0f s)...", len(in_flight), grace_seconds)
+        _, unfinished = await asyncio.wait(in_flight, timeout=grace_seconds)
+        for task in unfinished:
+            task.cancel()
+        if unfinished:
+            logger.warning("Generaciones canceladas al agotarse el tiempo de gracia: %d", len(unfinished))
+    await asyncio.gather(*worker_tasks.values(), return_exceptions=True)
+    worker_tasks.clear()
+    # Resultados de los trabajos terminados que aún esperan su UPDATE en lote
+    await status_writer.drain()
+
+    try:
+        async with AsyncSessionLocal() as db_session:
+            released = await release_claims(db_session, INSTANCE_ID)
+        logger.info("Trabajos de imagen devueltos como PENDING para otra instancia: %d", released)
+    except Exception as e:
+        logger.exception("No se pudieron liberar los trabajos de imagen pendientes: %s", e)
@@ -1,14 +1,16 @@
 import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import heapq
+import argparse
 import datetime
 import logging
-
-# Configure logging
-# Note: BasicConfig should ideally be called only once.
-# If this script is imported, and the importer also configures logging,
-# this might have no effect or conflict. For simplicity in this context,
-# we'll leave it. A more robust solution might involve getting a logger instance
-# and configuring it if not already configured.
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Iterator
 
 def clean_old_images(image_dir_path: str, days_threshold_value: int):
     """
@@ -34,31 +36,38 @@ def clean_old_images(image_dir_path: str, days_threshold_value: int):
 
     now = datetime.datetime.now()
 
-    for filename in os.listdir(image_dir_path):
-        file_path = os.path.join(image_dir_path, filename)
+    # os.scandir returns the stat data gathered while listing, avoiding extra syscalls per file
+    with os.scandir(image_dir_path) as entries:
+        for entry in entries:
+            filename = entry.name
 
-        if os.path.isfile(file_path):
             try:
-                # Get last modification timestamp
-                mod_time_timestamp = os.path.getmtime(file_path)
-                mod_time_datetime = datetime.datetime.fromtimestamp(mod_time_timestamp)
-
-                # Calculate the age of the file
-                file_age = now - mod_time_datetime
-
-                if file_age.days > days_threshold_value:
-                    found_old_files = True
-                    logging.info(f"Deleting old file: {filename} (age: {file_age.days} days)")
-                    os.remove(file_path)
-                    deleted_files_count += 1
-            except OSError as e:
-                logging.error(f"Error deleting file {filename}: {e}")
-                error_count += 1
-            except Exception as e:
-                logging.error(f"An unexpected error occurred with file {filename}: {e}")
-                error_count += 1
-        else:
-            logging.debug(f"Skipping non-file item: {filename}")
+                is_file = entry.is_file()
+            except OSError:
+                is_file = False
+
+            if is_file:
+                try:
+                    # Get last modification timestamp
+                    mod_time_timestamp = entry.stat().st_mtime
+                    mod_time_datetime = datetime.datetime.fromtimestamp(mod_time_timestamp)
+
+                    # Calculate the age of the file
+                    file_age = now - mod_time_datetime
+
+                    if file_age.days > days_threshold_value:
+                        found_old_files = True
+                        logging.info(f"Deleting old file: {filename} (age: {file_age.days} days)")
+                        os.remove(entry.path)
+                        deleted_files_count += 1
+                except OSError as e:
+                    logging.error(f"Error deleting file {filename}: {e}")
+                    error_count += 1
+                except Exception as e:
+                    logging.error(f"An unexpected error occurred with file {filename}: {e}")
+                    error_count += 1
+            else:
+                logging.debug(f"Skipping non-file item: {filename}")
 
     # Log summary
     if not found_old_files and deleted_files_count == 0 and error_count == 0:
@@ -68,7 +77,535 @@ def clean_old_images(image_dir_path: str, days_threshold_value: int):
     return deleted_files_count, error_count
 
 
+@dataclass
+class CleanupReport:
+    """
+    Summary of a streaming cleanup run.
+
+    Attributes:
+        scanned (int): Files inspected in the image directory.
+        expired (int): Files older than the age threshold.
+        orphaned (int): UUID-named files with no FutureViewing row behind them.
+        deleted (int): Files actually removed (always 0 on a dry run).
+        bytes_freed (int): Bytes removed, or that would be removed on a dry run.
+        dangling_rows (int): FutureViewing rows whose image_url pointed at a missing file.
+        errors (int): Files that could not be removed.
+        dry_run (bool): Whether the run only reported what it would do.
+    """
+    scanned: int = 0
+    expired: int = 0
+    orphaned: int = 0
+    deleted: int = 0
+    bytes_freed: int = 0
+    dangling_rows: int = 0
+    errors: int = 0
+    dry_run: bool = False
+
+
+def _iter_image_files(image_dir_path: str) -> Iterator[tuple[str, float, int]]:
+    """Streams (name, mtime, size) for every regular file, using the stat data cached by os.scandir."""
+    with os.scandir(image_dir_path) as entries:
+        for entry in entries:
+            try:
+                if not entry.is_file():
+                    continue
+                stat_result = entry.stat()
+            except OSError as e:
+                logging.error(f"Could not stat {entry.name}: {e}")
+                continue
+            yield entry.name, stat_result.st_mtime, stat_result.st_size
+
+
+def _viewing_id_from_filename(filename: str) -> uuid.UUID | None:
+    """Generated images are named <FutureViewing.id>.<ext>; returns that ID, or None for other files."""
+    stem, _ = os.path.splitext(filename)
+    try:
+        return uuid.UUID(stem)
+    except ValueError:
+        return None
+
+
+def _write_spool(image_dir_path: str, spool_path: str) -> int:
+    """
+    Writes one "name\tmtime\tsize" line per file to a spool file.
+
+    The spool freezes the listing of a run, so a resumed run walks exactly the same entries
+    even though earlier batches already deleted some of them.
+    """
+    count = 0
+    tmp_path = spool_path + ".tmp"
+    with open(tmp_path, "wb") as spool:
+        for name, mtime, size in _iter_image_files(image_dir_path):
+            if "\t" in name or "\n" in name:
+                logging.warning(f"Skipping file with unsupported name: {name!r}")
+                continue
+            spool.write(f"{name}\t{mtime!r}\t{size}\n".encode("utf-8", "surrogateescape"))
+            count += 1
+    os.replace(tmp_path, spool_path)
+    return count
+
+
+def _iter_spool_batches(spool_path: str, offset: int, batch_size: int):
+    """Yields (batch, offset_after_batch) tuples read from the spool, starting at `offset`."""
+    with open(spool_path, "rb") as spool:
+        spool.seek(offset)
+        batch = []
+        while True:
+            line = spool.readline()
+            if line:
+                name, mtime, size = line.decode("utf-8", "surrogateescape").rstrip("\n").split("\t")
+                batch.append((name, float(mtime), int(size)))
+            if batch and (len(batch) >= batch_size or not line):
+                yield batch, spool.tell()
+                batch = []
+            if not line:
+                return
+
+
+def _batched(iterable, size: int):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _load_checkpoint(checkpoint_path: str) -> dict | None:
+    try:
+        with open(checkpoint_path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _save_checkpoint(checkpoint_path: str, state: dict) -> None:
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def _remove_file(path: str) -> OSError | None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return None  # Ya no existe: nada que hacer
+    except OSError as e:
+        return e
+    return None
+
+
+def _write_report_line(report_file, record: dict) -> None:
+    if report_file is not None:
+        report_file.write(json.dumps(record) + "\n")
+
+
+async def _process_file_batch(
+    batch: list[tuple[str, float, int]],
+    image_dir_path: str,
+    cutoff: float,
+    orphan_cutoff: float,
+    report: CleanupReport,
+    session_factory,
+    executor: ThreadPoolExecutor,
+    report_file,
+) -> None:
+    """Classifies one batch of files as expired/orphaned, deletes them in parallel and clears their rows."""
+    report.scanned += len(batch)
+
+    doomed = []  # (name, size, reason, viewing_id)
+    orphan_candidates = {}
+    for name, mtime, size in batch:
+        viewing_id = _viewing_id_from_filename(name)
+        if mtime < cutoff:
+            doomed.append((name, size, "expired", viewing_id))
+        elif viewing_id is not None and mtime < orphan_cutoff:
+            orphan_candidates[viewing_id] = (name, size)
+
+    if session_factory is not None and orphan_candidates:
+        from app import crud
+        async with session_factory() as db:
+            existing = await crud.get_existing_future_viewing_ids(db, list(orphan_candidates))
+        for viewing_id, (name, size) in orphan_candidates.items():
+            if viewing_id not in existing:
+                doomed.append((name, size, "orphan", viewing_id))
+
+    if not doomed:
+        return
+
+    for name, size, reason, _ in doomed:
+        if reason == "expired":
+            report.expired += 1
+        else:
+            report.orphaned += 1
+        report.bytes_freed += size
+        _write_report_line(report_file, {"action": "delete_file", "reason": reason, "file": name, "size": size})
+
+    if report.dry_run:
+        return
+
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(*(
+        loop.run_in_executor(executor, _remove_file, os.path.join(image_dir_path, name))
+        for name, _, _, _ in doomed
+    ))
+    cleared_ids = []
+    for (name, size, reason, viewing_id), error in zip(doomed, results):
+        if error is not None:
+            logging.error(f"Error deleting file {name}: {error}")
+            report.errors += 1
+            report.bytes_freed -= size
+            continue
+        report.deleted += 1
+        if reason == "expired" and viewing_id is not None:
+            cleared_ids.append(viewing_id)
+
+    # Las filas cuyo archivo se acaba de borrar dejan de apuntar a él
+    if session_factory is not None and cleared_ids:
+        from app import crud
+        async with session_factory() as db:
+            await crud.clear_future_viewing_images(db, cleared_ids)
+
+
+async def _reconcile_rows(
+    image_dir_path: str,
+    report: CleanupReport,
+    session_factory,
+    executor: ThreadPoolExecutor,
+    batch_size: int,
+    after_id: uuid.UUID | None,
+    on_batch,
+    report_file,
+) -> None:
+    """Walks FutureViewing rows with an image_url in keyset batches and clears the ones whose file is missing."""
+    from app import crud
+
+    loop = asyncio.get_running_loop()
+    while True:
+        async with session_factory() as db:
+            page = await crud.get_future_viewing_image_urls(db, after_id=after_id, limit=batch_size)
+        if not page:
+            return
+
+        paths = [os.path.join(image_dir_path, os.path.basename(image_url)) for _, image_url in page]
+        exists = await asyncio.gather(*(loop.run_in_executor(executor, os.path.exists, path) for path in paths))
+        dangling = [viewing_id for (viewing_id, _), ok in zip(page, exists) if not ok]
+
+        report.dangling_rows += len(dangling)
+        for viewing_id in dangling:
+            _write_report_line(report_file, {"action": "clear_image_url", "id": str(viewing_id)})
+        if dangling and not report.dry_run:
+            async with session_factory() as db:
+                await crud.clear_future_viewing_images(db, dangling)
+
+        after_id = page[-1][0]
+        on_batch(after_id)
+
+
+async def reconcile_images(
+    image_dir_path: str,
+    days_threshold_value: int,
+    session_factory=None,
+    dry_run: bool = False,
+    batch_size: int = 1000,
+    max_workers: int = 8,
+    checkpoint_path: str | None = None,
+    report_path: str | None = None,
+    orphan_grace_seconds: int = 3600,
+) -> CleanupReport:
+    """
+    Streaming cleanup that scales to directories with millions of files.
+
+    The directory is streamed with os.scandir (reusing its cached stat results) and processed
+    in batches: files older than the threshold are deleted in parallel on a thread pool. When
+    `session_factory` is given, the run also reconciles with the database in both directions,
+    with one query per batch:
+
+    - UUID-named files with no FutureViewing row are deleted as orphans (after a grace period).
+    - Rows whose file was deleted, or is missing from disk, get their image_url cleared.
+
+    Args:
+        image_dir_path (str): The path to the directory containing images.
+        days_threshold_value (int): The age in days beyond which files should be deleted.
+        session_factory (optional): An async session factory (e.g. `AsyncSessionLocal`).
+                                    Defaults to None, which skips the database reconciliation.
+        dry_run (bool, optional): Only report what would be done. Defaults to False.
+        batch_size (int, optional): Files or rows handled per batch. Defaults to 1000.
+        max_workers (int, optional): Threads used for deletes and existence checks. Defaults to 8.
+        checkpoint_path (str | None, optional): File used to persist progress after every batch.
+                                                An interrupted run resumes from it, provided it
+                                                was started with the same `dry_run`. Defaults to None.
+        report_path (str | None, optional): NDJSON file that receives one line per planned or
+                                            performed action. Defaults to None.
+        orphan_grace_seconds (int, optional): Minimum age before a file without a row counts
+                                              as an orphan. Defaults to 3600.
+
+    Returns:
+        CleanupReport: Counters for the whole run (including resumed progress).
+    """
+    if not os.path.isdir(image_dir_path):
+        logging.error(f"Target directory {image_dir_path} does not exist or is not a directory.")
+        return CleanupReport(dry_run=dry_run)
+
+    state = _load_checkpoint(checkpoint_path) if checkpoint_path else None
+    if state is not None and state["report"].get("dry_run", False) != dry_run:
+        # Reanudar mezclaría acciones simuladas y reales en el mismo informe (o borraría en un dry run)
+        logging.error(
+            f"Checkpoint {checkpoint_path} belongs to a {'dry' if not dry_run else 'real'} run; refusing to resume it "
+            f"with dry_run={dry_run}. Re-run with the same mode or delete the checkpoint."
+        )
+        return CleanupReport(dry_run=dry_run)
+    if state is not None:
+        report = CleanupReport(**state["report"])
+        logging.info(f"Resuming cleanup of {image_dir_path} from checkpoint {checkpoint_path} ({state['phase']} phase).")
+    else:
+        now = time.time()
+        report = CleanupReport(dry_run=dry_run)
+        state = {
+            "phase": "files",
+            "offset": 0,
+            "last_row_id": None,
+            # Mismo criterio que clean_old_images: edad en días completos mayor que el umbral
+            "cutoff": now - (days_threshold_value + 1) * 24 * 60 * 60,
+            "orphan_cutoff": now - orphan_grace_seconds,
+        }
+
+    def persist() -> None:
+        if checkpoint_path:
+            state["report"] = asdict(report)
+            _save_checkpoint(checkpoint_path, state)
+
+    spool_path = checkpoint_path + ".spool" if checkpoint_path else None
+    report_file = open(report_path, "a" if state["offset"] or state["phase"] != "files" else "w") if report_path else None
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            if state["phase"] == "files":
+                if spool_path:
+                    if state["offset"] == 0 or not os.path.exists(spool_path):
+                        logging.info(f"Listed {_write_spool(image_dir_path, spool_path)} files in {image_dir_path}.")
+                        state["offset"] = 0
+                    batches = _iter_spool_batches(spool_path, state["offset"], batch_size)
+                else:
+                    batches = ((batch, None) for batch in _batched(_iter_image_files(image_dir_path), batch_size))
+
+                for batch, offset in batches:
+                    await _process_file_batch(
+                        batch, image_dir_path, state["cutoff"], state["orphan_cutoff"],
+                        report, session_factory, executor, report_file,
+                    )
+                    state["offset"] = offset
+                    persist()
+
+                state["phase"] = "rows"
+                persist()
+
+            if session_factory is not None:
+                def on_row_batch(last_id: uuid.UUID) -> None:
+                    state["last_row_id"] = str(last_id)
+                    persist()
+
+                after_id = uuid.UUID(state["last_row_id"]) if state["last_row_id"] else None
+                await _reconcile_rows(
+                    image_dir_path, report, session_factory, executor, batch_size,
+                    after_id, on_row_batch, report_file,
+                )
+    finally:
+        if report_file is not None:
+            report_file.close()
+
+    # Ejecución completa: el checkpoint y el listado ya no hacen falta
+    for path in (checkpoint_path, spool_path):
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    prefix = "Dry run summary" if dry_run else "Cleanup summary"
+    logging.info(
+        f"{prefix} for {image_dir_path}: {report.scanned} files scanned, {report.expired} expired, "
+        f"{report.orphaned} orphaned, {report.deleted} files deleted ({report.bytes_freed} bytes), "
+        f"{report.dangling_rows} dangling rows, {report.errors} errors."
+    )
+    return report
+
+
+@dataclass
+class EvictionReport:
+    """
+    Summary of a quota eviction run.
+
+    Attributes:
+        total_bytes (int): Bytes in the image directory before eviction.
+        budget_bytes (int): The configured quota.
+        evicted (int): Files evicted (or that would be evicted on a dry run).
+        bytes_freed (int): Bytes evicted (or that would be evicted on a dry run).
+        protected (int): Files skipped because they belong to the current 24h screen window.
+        errors (int): Files that could not be removed.
+        dry_run (bool): Whether the run only reported what it would do.
+    """
+    total_bytes: int = 0
+    budget_bytes: int = 0
+    evicted: int = 0
+    bytes_freed: int = 0
+    protected: int = 0
+    errors: int = 0
+    dry_run: bool = False
+
+
+def _lower_thread_priority() -> None:
+    # En Linux la prioridad se aplica por hilo: solo los hilos de limpieza quedan con baja prioridad
+    try:
+        os.nice(19)
+    except (AttributeError, OSError):
+        pass
+
+
+def _next_batch(iterator: Iterator, size: int) -> list:
+    batch = []
+    for item in iterator:
+        batch.append(item)
+        if len(batch) >= size:
+            break
+    return batch
+
+
+def _directory_size(image_dir_path: str) -> int:
+    return sum(size for _, _, size in _iter_image_files(image_dir_path))
+
+
+async def evict_to_quota(
+    image_dir_path: str,
+    max_bytes: int,
+    session_factory=None,
+    served_at: dict[str, float] | None = None,
+    protect_seconds: int = 24 * 60 * 60,
+    dry_run: bool = False,
+    batch_size: int = 1000,
+    pause_seconds: float = 0.05,
+    on_evicted=None,
+) -> EvictionReport:
+    """
+    Evicts the least recently used images until the directory fits in `max_bytes`.
+
+    The recency of a file is the latest of its mtime, the last time it was served by the
+    image route (`served_at`, filename -> epoch seconds) and the last `screen_viewings.viewed_at`
+    of its FutureViewing. Images whose FutureViewing was created within `protect_seconds`
+    (the current screen window), or whose file is that recent, are never evicted.
+
+    The directory is read twice with os.scandir: a cheap pass to total its size (nothing else
+    happens while under budget) and a batched pass that keeps only the oldest candidates needed
+    to cover the excess in a heap, so memory is proportional to what gets evicted. All blocking
+    work runs on a single low-priority thread, and the run pauses between delete batches.
+
+    Args:
+        image_dir_path (str): The path to the directory containing images.
+        max_bytes (int): The disk budget for the directory.
+        session_factory (optional): Async session factory used to read creation and viewing
+                                    times and to clear image_url of evicted rows. Defaults to None.
+        served_at (dict[str, float] | None, optional): Last-served times by filename. Defaults to None.
+        protect_seconds (int, optional): Age of the protected window. Defaults to 24 hours.
+        dry_run (bool, optional): Only report what would be evicted. Defaults to False.
+        batch_size (int, optional): Files handled per batch. Defaults to 1000.
+        pause_seconds (float, optional): Pause between delete batches. Defaults to 0.05.
+        on_evicted (callable, optional): Called with each evicted filename (e.g. to drop caches).
+
+    Returns:
+        EvictionReport: Counters for the run.
+    """
+    report = EvictionReport(budget_bytes=max_bytes, dry_run=dry_run)
+    if not os.path.isdir(image_dir_path):
+        logging.error(f"Target directory {image_dir_path} does not exist or is not a directory.")
+        return report
+
+    if served_at is None:
+        served_at = {}
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=1, initializer=_lower_thread_priority) as executor:
+        report.total_bytes = await loop.run_in_executor(executor, _directory_size, image_dir_path)
+        excess = report.total_bytes - max_bytes
+        if excess <= 0:
+            return report
+
+        now = time.time()
+        protect_cutoff = now - protect_seconds
+        # Montículo de máximos por recencia con los candidatos más antiguos que cubren el exceso
+        heap: list[tuple[float, str, int, uuid.UUID | None]] = []
+        heap_bytes = 0
+
+        files = _iter_image_files(image_dir_path)
+        while True:
+            batch = await loop.run_in_executor(executor, _next_batch, files, batch_size)
+            if not batch:
+                break
+
+            db_recency = {}
+            if session_factory is not None:
+                from app import crud
+                ids = [i for i in (_viewing_id_from_filename(name) for name, _, _ in batch) if i is not None]
+                async with session_factory() as db:
+                    db_recency = await crud.get_image_recency(db, ids)
+
+            for name, mtime, size in batch:
+                viewing_id = _viewing_id_from_filename(name)
+                created_at, viewed_at = db_recency.get(viewing_id, (None, None))
+                if mtime >= protect_cutoff or (created_at is not None and created_at.timestamp() >= protect_cutoff):
+                    report.protected += 1
+                    continue
+
+                recency = max(mtime, served_at.get(name, 0.0), viewed_at.timestamp() if viewed_at else 0.0)
+                heapq.heappush(heap, (-recency, name, size, viewing_id))
+                heap_bytes += size
+                # Descartar los más recientes mientras los restantes sigan cubriendo el exceso
+                while heap and heap_bytes - heap[0][2] >= excess:
+                    _, _, dropped_size, _ = heapq.heappop(heap)
+                    heap_bytes -= dropped_size
+
+        victims = sorted(heap, reverse=True)  # Del menos reciente al más reciente
+        for start in range(0, len(victims), batch_size):
+            chunk = victims[start:start + batch_size]
+            if dry_run:
+                errors = [None] * len(chunk)
+            else:
+                errors = await asyncio.gather(*(
+                    loop.run_in_executor(executor, _remove_file, os.path.join(image_dir_path, name))
+                    for _, name, _, _ in chunk
+                ))
+
+            evicted_ids = []
+            for (_, name, size, viewing_id), error in zip(chunk, errors):
+                if error is not None:
+                    logging.error(f"Error evicting file {name}: {error}")
+                    report.errors += 1
+                    continue
+                report.evicted += 1
+                report.bytes_freed += size
+                if not dry_run:
+                    served_at.pop(name, None)
+                    if on_evicted is not None:
+                        on_evicted(name)
+                    if viewing_id is not None:
+                        evicted_ids.append(viewing_id)
+
+            if session_factory is not None and evicted_ids:
+                from app import crud
+                async with session_factory() as db:
+                    await crud.clear_future_viewing_images(db, evicted_ids)
+            await asyncio.sleep(pause_seconds)
+
+    prefix = "Dry run eviction summary" if dry_run else "Eviction summary"
+    logging.info(
+        f"{prefix} for {image_dir_path}: {report.total_bytes} bytes over a budget of {max_bytes}, "
+        f"{report.evicted} files evicted ({report.bytes_freed} bytes), {report.protected} protected, "
+        f"{report.errors} errors."
+    )
+    return report
+
+
 if __name__ == "__main__":
+    # Logging is configured only when run as a script; the app configures it in app/logging_config.py
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
     # Production configuration
     # The script is in app/, images are in static/images/
     # So, we need to go up one level, then into static/images/
@@ -76,9 +613,49 @@ if __name__ == "__main__":
     DEFAULT_TARGET_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, '..', 'static', 'images'))
     DEFAULT_DAYS_THRESHOLD = 14
 
+    parser = argparse.ArgumentParser(description="Delete old generated images.")
+    parser.add_argument("--dir", default=DEFAULT_TARGET_DIR, help="Image directory to clean.")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS_THRESHOLD, help="Age threshold in days.")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Use the streaming, batched cleanup (implied by the options below).")
+    parser.add_argument("--reconcile-db", action="store_true",
+                        help="Delete orphan files and clear image_url of rows whose file is gone.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be done.")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=8, help="Threads used for parallel deletes.")
+    parser.add_argument("--checkpoint", help="Checkpoint file; rerun with the same path to resume.")
+    parser.add_argument("--report", help="Write one NDJSON line per planned/performed action to this file.")
+    parser.add_argument("--max-bytes", type=int,
+                        help="Evict least recently used images until the directory fits in this many bytes.")
+    args = parser.parse_args()
+
     # Ensure the default target directory exists before running
-    if not os.path.exists(DEFAULT_TARGET_DIR):
+    if args.dir == DEFAULT_TARGET_DIR and not os.path.exists(DEFAULT_TARGET_DIR):
         os.makedirs(DEFAULT_TARGET_DIR)
         logging.info(f"Created directory: {DEFAULT_TARGET_DIR} for application use.")
 
-    clean_old_images(DEFAULT_TARGET_DIR, DEFAULT_DAYS_THRESHOLD)
+    session_factory = None
+    if args.reconcile_db:
+        # Permite importar el paquete `app` al ejecutar el script directamente
+        sys.path.insert(0, os.path.abspath(os.path.join(SCRIPT_DIR, '..')))
+        from app.db import AsyncSessionLocal
+        session_factory = AsyncSessionLocal
+
+    if args.max_bytes is not None:
+        asyncio.run(evict_to_quota(
+            args.dir, args.max_bytes, session_factory=session_factory, dry_run=args.dry_run,
+            batch_size=args.batch_size,
+        ))
+    elif args.streaming or args.reconcile_db or args.dry_run or args.checkpoint or args.report:
+        asyncio.run(reconcile_images(
+            args.dir,
+            args.days,
+            session_factory=session_factory,
+            dry_run=args.dry_run,
+            batch_size=args.batch_size,
+            max_workers=args.workers,
+            checkpoint_path=args.checkpoint,
+            report_path=args.report,
+        ))
+    else:
+        clean_old_images(args.dir, args.days)
@@ -0,0 +1,199 @@
+import gzip
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Callable
+
+import anyio.to_thread
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .metrics import RESPONSE_COMPRESSION
+
+# brotli y zstd son opcionales: sin los paquetes `brotli` / `zstandard` sólo se ofrece gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Respuestas más pequeñas se envían sin comprimir (la cabecera gzip y el CPU no compensan)
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+# A partir de este tamaño se comprime en un hilo, para no bloquear el event loop
+COMPRESSION_THREAD_MIN_BYTES = int(os.getenv("COMPRESSION_THREAD_MIN_BYTES", str(32 * 1024)))
+# Caché de cuerpos ya comprimidos, por contenido y codificación (0 la desactiva)
+COMPRESSION_CACHE_MAX_BYTES = int(os.getenv("COMPRESSION_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+
+
+def _gzip(body: bytes) -> bytes:
+    # mtime=0: la misma entrada produce siempre los mismos bytes
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def _brotli(body: bytes) -> bytes:
+    return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+
+
+def _zstd(body: bytes) -> bytes:
+    # Un compresor por llamada: ZstdCompressor no admite uso simultáneo desde varios hilos
+    return zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compress(body)
+
+
+def available_encodings() -> dict[str, Callable[[bytes], bytes]]:
+    """The supported encodings, in the server's order of preference."""
+    encoders = {}
+    if zstandard is not None:
+        encoders["zstd"] = _zstd
+    if brotli is not None:
+        encoders["br"] = _brotli
+    encoders["gzip"] = _gzip
+    return encoders
+
+
+def negotiate_encoding(accept_encoding: str, supported: list[str]) -> str | None:
+    """
+    Picks the content coding for a response from an Accept-Encoding header (RFC 9110 §12.5.3).
+
+    The client's q-values decide; among equally weighted codings the order of `supported`
+    wins. `*` matches any supported coding not listed explicitly.
+
+    Returns:
+        str | None: The chosen coding, or None to send the response uncompressed.
+    """
+    weights: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        param, _, value = params.strip().partition("=")
+        if param.strip().lower() == "q":
+            try:
+                q = float(value)
+            except ValueError:
+                q = 0.0
+        weights[coding] = q
+    best, best_q = None, 0.0
+    for coding in supported:
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CompressedBodyCache:
+    """
+    LRU cache of compressed response bodies keyed by (encoding, BLAKE2b digest of the body).
+
+    Identical responses (the same page of `futureViewings` polled by many screens) are then
+    compressed once: later requests only pay for hashing the body, which is much cheaper than
+    compressing it.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries: OrderedDict[tuple[str, bytes], bytes] = OrderedDict()
+
+    @staticmethod
+    def key(encoding: str, body: bytes) -> tuple[str, bytes]:
+        return encoding, hashlib.blake2b(body, digest_size=16).digest()
+
+    def get(self, key: tuple[str, bytes]) -> bytes | None:
+        compressed = self._entries.get(key)
+        if compressed is not None:
+            self._entries.move_to_end(key)
+        return compressed
+
+    def put(self, key: tuple[str, bytes], compressed: bytes) -> None:
+        if len(compressed) > self.max_bytes or key in self._entries:
+            return
+        self._entries[key] = compressed
+        self.current_bytes += len(compressed)
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= len(evicted)
+
+
+compressed_cache = CompressedBodyCache(COMPRESSION_CACHE_MAX_BYTES)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing responses with the best encoding the client accepts
+    (zstd or brotli when their packages are installed, else gzip).
+
+    Responses under COMPRESSION_MIN_BYTES, responses that already have a Content-Encoding and
+    streamed responses (sent in several body messages) pass through untouched. Bodies of at
+    least COMPRESSION_THREAD_MIN_BYTES are compressed on a worker thread, and compressed bodies
+    are reused from `compressed_cache` when the same bytes are sent again.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_BYTES,
+                 thread_min_size: int = COMPRESSION_THREAD_MIN_BYTES,
+                 cache: CompressedBodyCache = compressed_cache):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.thread_min_size = thread_min_size
+        self.cache = cache
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoders = available_encodings()
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), list(encoders))
+        start_message: Message | None = None
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if start_message is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+            start, start_message = start_message, None
+            headers = MutableHeaders(raw=list(start["headers"]))
+            headers.add_vary_header("Accept-Encoding")
+            body = message.get("body", b"")
+            if (encoding is None or message.get("more_body", False) or len(body) < self.minimum_size
+                    or "content-encoding" in headers):
+                await send({**start, "headers": headers.raw})
+                await send(message)
+                return
+
+            compressed = await self._compress(encoding, encoders[encoding], body)
+            headers["content-encoding"] = encoding
+            headers["content-length"] = str(len(compressed))
+            await send({**start, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+    async def _compress(self, encoding: str, encoder: Callable[[bytes], bytes], body: bytes) -> bytes:
+        if self.cache.max_bytes <= 0:
+            RESPONSE_COMPRESSION.labels(encoding, "disabled").inc()
+            return await self._run_encoder(encoder, body)
+        key = self.cache.key(encoding, body)
+        compressed = self.cache.get(key)
+        if compressed is not None:
+            RESPONSE_COMPRESSION.labels(encoding, "hit").inc()
+            return compressed
+        RESPONSE_COMPRESSION.labels(encoding, "miss").inc()
+        compressed = await self._run_encoder(encoder, body)
+        self.cache.put(key, compressed)
+        return compressed
+
+    async def _run_encoder(self, encoder: Callable[[bytes], bytes], body: bytes) -> bytes:
+        if len(body) >= self.thread_min_size:
+            # zlib, brotli y zstd liberan el GIL mientras comprimen
+            return await anyio.to_thread.run_sync(encoder, body)
+        return encoder(body)
@@ -1,12 +1,63 @@
 import uuid # Added for screen_id type hint
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import desc, and_, update # update re-added
+from sqlalchemy import desc, and_, update, insert, tuple_, func, literal_column, bindparam, DateTime, Integer # update re-added
+from sqlalchemy import values, column, String
+from sqlalchemy.dialects.postgresql import insert as pg_insert, UUID
 from .models import FutureViewing, ProcessingStatus, ScreenViewings, Screens # Added ScreenViewings and Screens
 from datetime import datetime, timedelta, timezone
 
-
-async def create_future_viewing(db: AsyncSession, name: str, age: int, content: str) -> FutureViewing:
+# Sentencias de las rutas calientes, construidas una sola vez con parámetros (bindparam).
+# Construir select()/update() en cada llamada cuesta CPU de Python aun con la caché de
+# compilación de SQLAlchemy (hay que recalcular la clave de caché); así solo se enlazan los
+# valores. Como el SQL no cambia entre llamadas, asyncpg reutiliza la sentencia preparada de
+# cada conexión (ver DB_PREPARED_STATEMENT_CACHE_SIZE en db.py).
+_PAGINATED_STMT = (
+    select(FutureViewing)
+    .order_by(desc(FutureViewing.created_at))
+    .offset(bindparam("offset", type_=Integer))
+    .limit(bindparam("limit", type_=Integer))
+)
+_RECENT_NOT_VIEWED_STMT = (
+    select(FutureViewing)
+    .where(
+        FutureViewing.status == ProcessingStatus.COMPLETED,
+        FutureViewing.created_at >= bindparam("since", type_=DateTime(timezone=True)),
+        ~select(ScreenViewings.id)  # Subquery for NOT EXISTS
+        .where(
+            ScreenViewings.future_viewing_id == FutureViewing.id,
+            ScreenViewings.screen_id == bindparam("screen_id"),
+        )
+        .exists(),
+    )
+    .order_by(desc(FutureViewing.created_at))
+    .offset(bindparam("offset", type_=Integer))
+    .limit(bindparam("limit", type_=Integer))
+)
+_INSERT_SCREEN_VIEWINGS_STMT = insert(ScreenViewings)
+# Los nombres de los parámetros no pueden coincidir con columnas del SET
+_UPDATE_IMAGE_STMT = (
+    update(FutureViewing)
+    .where(FutureViewing.id == bindparam("fv_id"))
+    .values(
+        image_url=bindparam("new_image_url", type_=FutureViewing.image_url.type),
+        status=bindparam("new_status", type_=FutureViewing.status.type),
+    )
+    .returning(FutureViewing)
+    .execution_options(synchronize_session=False)
+)
+_UPDATE_STATUS_STMT = (
+    update(FutureViewing)
+    .where(FutureViewing.id == bindparam("fv_id"))
+    .values(status=bindparam("new_status", type_=FutureViewing.status.type))
+    .returning(FutureViewing)
+    .execution_options(synchronize_session=False)
+)
+
+
+async def create_future_viewing(
+    db: AsyncSession, name: str, age: int, content: str, claimed_by: str | None = None
+) -> FutureViewing:
     """
     Creates a new FutureViewing record in the database.
 
@@ -15,6 +66,8 @@ async def create_future_viewing(db: AsyncSession, name: str, age: int, content:
         name (str): The name for the FutureViewing.
         age (int): The age for the FutureViewing.
         content (str): The content/prompt for the FutureViewing.
+        claimed_by (str | None, optional): Instance that will run the image generation job.
+                                           Defaults to None (unclaimed).
 
     Returns:
         FutureViewing: The newly created and refreshed FutureViewing object.
@@ -23,7 +76,9 @@ async def create_future_viewing(db: AsyncSession, name: str, age: int, content:
         name=name,
         age=age,
         content=content,
-        status=ProcessingStatus.PENDING
+        status=ProcessingStatus.PENDING,
+        claimed_by=claimed_by,
+        claimed_at=func.now() if claimed_by else None,
     )
     db.add(db_fv)
     await db.commit()
@@ -31,6 +86,200 @@ async def create_future_viewing(db: AsyncSession, name: str, age: int, content:
     return db_fv
 
 
+async def create_future_viewing_idempotent(
+    db: AsyncSession, name: str, age: int, content: str, idempotency_key: str, claimed_by: str | None = None
+) -> tuple[FutureViewing, bool]:
+    """
+    Creates a FutureViewing unless one with the same idempotency key already exists.
+
+    Runs a single `INSERT ... ON CONFLICT (idempotency_key) DO UPDATE ... RETURNING`, so
+    concurrent retries with the same key cannot create two rows: the losers get the row that
+    won. The no-op update only locks the existing row so that RETURNING can include it.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asynchronous session.
+        name (str): The name for the FutureViewing.
+        age (int): The age for the FutureViewing.
+        content (str): The content/prompt for the FutureViewing.
+        idempotency_key (str): Client-supplied key identifying this creation request.
+        claimed_by (str | None, optional): Instance that will run the image generation job if the
+                                           row is created. Defaults to None (unclaimed).
+
+    Returns:
+        tuple[FutureViewing, bool]: The new or original FutureViewing, and whether it was
+                                    created by this call (False for a retry).
+    """
+    stmt = (
+        pg_insert(FutureViewing)
+        .values(
+            id=uuid.uuid4(),
+            name=name,
+            age=age,
+            content=content,
+            status=ProcessingStatus.PENDING,
+            idempotency_key=idempotency_key,
+            claimed_by=claimed_by,
+            claimed_at=func.now() if claimed_by else None,
+        )
+        .on_conflict_do_update(
+            index_elements=[FutureViewing.idempotency_key],
+            index_where=FutureViewing.idempotency_key.isnot(None),
+            set_={"idempotency_key": FutureViewing.idempotency_key},
+        )
+        # xmax = 0 sólo en filas recién insertadas por esta sentencia
+        .returning(FutureViewing, literal_column("xmax = 0").label("inserted"))
+    )
+    result = await db.execute(stmt)
+    db_fv, inserted = result.one()
+    # RETURNING ya trae la fila completa: se separa de la sesión para que el commit no la
+    # expire y no haga falta un refresh (una consulta más)
+    db.expunge(db_fv)
+    await db.commit()
+    return db_fv, inserted
+
+
+async def get_future_viewing_by_idempotency_key(db: AsyncSession, idempotency_key: str) -> FutureViewing | None:
+    """
+    Retrieves the FutureViewing created with `idempotency_key`, if the key is still live.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asynchronous session.
+        idempotency_key (str): Client-supplied key of the creation request.
+
+    Returns:
+        FutureViewing | None: The FutureViewing, or None if no live row uses the key.
+    """
+    result = await db.execute(select(FutureViewing).where(FutureViewing.idempotency_key == idempotency_key))
+    return result.scalars().first()
+
+
+async def expire_idempotency_keys(db: AsyncSession, older_than: datetime) -> int:
+    """
+    Clears the idempotency keys of FutureViewings created before `older_than`.
+
+    The rows are kept; only their keys are released, so later requests reusing the same key
+    create a new FutureViewing.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asynchronous session.
+        older_than (datetime): Keys of rows created before this moment expire.
+
+    Returns:
+        int: The number of keys cleared.
+    """
+    result = await db.execute(
+        update(FutureViewing)
+        .where(FutureViewing.idempotency_key.isnot(None), FutureViewing.created_at < older_than)
+        .values(idempotency_key=None)
+    )
+    await db.commit()
+    return result.rowcount
+
+
+async def claim_pending_future_viewings(
+    db: AsyncSession, owner: str, stale_before: datetime, created_after: datetime, limit: int
+) -> list[FutureViewing]:
+    """
+    Claims PENDING FutureViewings whose image job no live instance holds, oldest first.
+
+    A row is claimable when it has no owner (released on shutdown, or created before claims
+    existed) or when its owner stopped renewing the lease before `stale_before` (crashed).
+    `FOR UPDATE SKIP LOCKED` lets several instances recover at the same time without
+    claiming the same row twice or waiting on each other.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asynchronous session.
+        owner (str): Identifier of the claiming instance.
+        stale_before (datetime): Claims renewed before this moment are considered abandoned.
+        created_after (datetime): Older rows are left alone (their image would no longer be shown).
+        limit (int): The maximum number of rows to claim.
+
+    Returns:
+        list[FutureViewing]: The claimed rows, oldest first.
+    """
+    if limit <= 0:
+        return []
+    claimable = (
+        select(FutureViewing.id)
+        .where(
+            FutureViewing.status == ProcessingStatus.PENDING,
+            FutureViewing.created_at >= created_after,
+            (FutureViewing.claimed_by.is_(None)) | (FutureViewing.claimed_at < stale_before),
+        )
+        .order_by(FutureViewing.created_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    result = await db.execute(
+        update(FutureViewing)
+        .where(FutureViewing.id.in_(claimable.scalar_subquery()))
+        .values(claimed_by=owner, claimed_at=func.now())
+        .returning(FutureViewing)
+        .execution_options(synchronize_session=False)
+    )
+    claimed = sorted(result.scalars().all(), key=lambda fv: fv.created_at)
+    for fv in claimed:
+        db.expunge(fv)
+    await db.commit()
+    return claimed
+
+
+async def renew_claims(db: AsyncSession, owner: str, fv_ids: list[uuid.UUID]) -> int:
+    """
+    Renews the lease on the given PENDING FutureViewings claimed by `owner`.
+
+    Only the jobs the instance still holds are passed in, so a row it dropped (e.g. a job whose
+    worker failed) stops being renewed and another instance recovers it once the lease expires.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asynchronous session.
+        owner (str): Identifier of the instance holding the claims.
+        fv_ids (list[uuid.UUID]): IDs of the jobs the instance holds (queued, deferred or in progress).
+
+    Returns:
+        int: The number of claims renewed.
+    """
+    if not fv_ids:
+        return 0
+    result = await db.execute(
+        update(FutureViewing)
+        .where(
+            FutureViewing.id.in_(fv_ids),
+            FutureViewing.claimed_by == owner,
+            FutureViewing.status == ProcessingStatus.PENDING,
+        )
+        .values(claimed_at=func.now())
+    )
+    await db.commit()
+    return result.rowcount
+
+
+async def release_claims(db: AsyncSession, owner: str, fv_ids: list[uuid.UUID] | None = None) -> int:
+    """
+    Releases the claims held by `owner` on PENDING FutureViewings, e.g. on shutdown, so that
+    another instance picks up their image jobs right away.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asynchronous session.
+        owner (str): Identifier of the instance holding the claims.
+        fv_ids (list[uuid.UUID] | None, optional): Release only these rows. Defaults to None (all
+                                                    of the instance's claims).
+
+    Returns:
+        int: The number of claims released.
+    """
+    conditions = [FutureViewing.claimed_by == owner, FutureViewing.status == ProcessingStatus.PENDING]
+    if fv_ids is not None:
+        conditions.append(FutureViewing.id.in_(fv_ids))
+    result = await db.execute(
+        update(FutureViewing)
+        .where(*conditions)
+        .values(claimed_by=None, claimed_at=None)
+    )
+    await db.commit()
+    return result.rowcount
+
+
 async def get_future_viewing_by_id(db: AsyncSession, fv_id: str) -> FutureViewing | None:
     """
     Retrieves a FutureViewing record by its ID.
@@ -60,13 +309,9 @@ async def update_future_viewing_image(db: AsyncSession, fv_id: str, image_url: s
     Returns:
         FutureViewing | None: The updated and refreshed FutureViewing object, or None if not found.
     """
-    stmt = (
-        update(FutureViewing)
-        .where(FutureViewing.id == fv_id)
-        .values(image_url=image_url, status=status)
-        .returning(FutureViewing)
+    result = await db.execute(
+        _UPDATE_IMAGE_STMT, {"fv_id": fv_id, "new_image_url": image_url, "new_status": status}
     )
-    result = await db.execute(stmt)
     await db.commit()
     updated_fv = result.scalars().first()
     if updated_fv:
@@ -86,13 +331,7 @@ async def update_future_viewing_status(db: AsyncSession, fv_id: str, status: Pro
     Returns:
         FutureViewing | None: The updated and refreshed FutureViewing object, or None if not found.
     """
-    stmt = (
-        update(FutureViewing)
-        .where(FutureViewing.id == fv_id)
-        .values(status=status)
-        .returning(FutureViewing)
-    )
-    result = await db.execute(stmt)
+    result = await db.execute(_UPDATE_STATUS_STMT, {"fv_id": fv_id, "new_status": status})
     await db.commit()
     updated_fv = result.scalars().first()
     if updated_fv:
@@ -100,6 +339,76 @@ async def update_future_viewing_status(db: AsyncSession, fv_id: str, status: Pro
     return updated_fv
 
 
+async def apply_status_updates(
+    db: AsyncSession, updates: list[tuple[uuid.UUID, ProcessingStatus, str | None]]
+) -> dict[uuid.UUID, datetime]:
+    """
+    Applies the final status (and image URL) of several FutureViewings in one statement.
+
+    Runs a single `UPDATE ... FROM (VALUES ...)` and one commit for the whole batch, instead of
+    an UPDATE, a commit and a refresh per row. A None image URL leaves the stored one unchanged.
+    If an ID appears more than once, the last update wins.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asynchronous session.
+        updates (list[tuple[uuid.UUID, ProcessingStatus, str | None]]): (id, status, image_url)
+                                                                        for each FutureViewing.
+
+    Returns:
+        dict[uuid.UUID, datetime]: The created_at of every updated FutureViewing, by ID.
+                                   IDs that do not exist are missing from the result.
+    """
+    if not updates:
+        return {}
+    rows = {uuid.UUID(str(fv_id)): (status, image_url) for fv_id, status, image_url in updates}
+    table = FutureViewing.__table__
+    batch = values(
+        column("id", UUID(as_uuid=True)),
+        column("status", table.c.status.type),
+        column("image_url", String),
+        name="batch",
+    ).data([(fv_id, status, image_url) for fv_id, (status, image_url) in rows.items()])
+    result = await db.execute(
+        update(table)
+        .where(table.c.id == batch.c.id)
+        .values(status=batch.c.status, image_url=func.coalesce(batch.c.image_url, table.c.image_url))
+        .returning(table.c.id, table.c.created_at)
+    )
+    created = {fv_id: created_at for fv_id, created_at in result.all()}
+    await db.commit()
+    return created
+
+
+async def reset_failed_future_viewing(db: AsyncSession, fv_id: str, claimed_by: str) -> FutureViewing | None:
+    """
+    Puts a FAILED FutureViewing back to PENDING, claimed by `claimed_by`, so its image is
+    generated again.
+
+    The status check is part of the UPDATE, so two concurrent retries of the same row reset
+    (and enqueue) it only once.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asynchronous session.
+        fv_id (str): The UUID (as a string) of the FutureViewing to retry.
+        claimed_by (str): Instance that will run the new image generation job.
+
+    Returns:
+        FutureViewing | None: The reset FutureViewing, or None if it does not exist or is not FAILED.
+    """
+    result = await db.execute(
+        update(FutureViewing)
+        .where(FutureViewing.id == fv_id, FutureViewing.status == ProcessingStatus.FAILED)
+        .values(status=ProcessingStatus.PENDING, claimed_by=claimed_by, claimed_at=func.now())
+        .returning(FutureViewing)
+        .execution_options(synchronize_session=False)
+    )
+    reset_fv = result.scalars().first()
+    if reset_fv is not None:
+        db.expunge(reset_fv)  # Los valores devueltos ya están al día; evita el refresh tras el commit
+    await db.commit()
+    return reset_fv
+
+
 async def register_screen(db: AsyncSession, screen_name: str | None = None) -> Screens:
     """
     Registers a new screen in the database.
@@ -136,12 +445,7 @@ async def get_future_viewings_paginated(db: AsyncSession, page: int = 1, page_si
     if page <= 0: page = 1
     if page_size <= 0: page_size = 20
     offset = (page - 1) * page_size
-    result = await db.execute(
-        select(FutureViewing)
-        .order_by(desc(FutureViewing.created_at))
-        .offset(offset)
-        .limit(page_size)
-    )
+    result = await db.execute(_PAGINATED_STMT, {"offset": offset, "limit": page_size})
     return result.scalars().all()
 
 
@@ -177,35 +481,20 @@ async def get_recent_future_viewings_and_mark_viewed(
     twenty_four_hours_ago = datetime.now(timezone.utc) - timedelta(hours=24)
 
     # 1. Obtener las imágenes
-    stmt = (
-        select(FutureViewing)
-        .where(
-            and_(
-                FutureViewing.status == ProcessingStatus.COMPLETED,
-                FutureViewing.created_at >= twenty_four_hours_ago,
-                ~select(ScreenViewings.id) # Subquery for NOT EXISTS
-                .where(
-                    ScreenViewings.future_viewing_id == FutureViewing.id,
-                    ScreenViewings.screen_id == screen_id
-                ).exists()
-            )
-        )
-        .order_by(desc(FutureViewing.created_at))
-        .offset(offset)
-        .limit(page_size)
+    result = await db.execute(
+        _RECENT_NOT_VIEWED_STMT,
+        {"since": twenty_four_hours_ago, "screen_id": screen_id, "offset": offset, "limit": page_size},
     )
-    result = await db.execute(stmt)
     images_to_show = result.scalars().all()
 
     if not images_to_show:
         return []
 
-    # 2. Create ScreenViewings entries
-    new_screen_viewings = [
-        ScreenViewings(future_viewing_id=img.id, screen_id=screen_id)
-        for img in images_to_show
-    ]
-    db.add_all(new_screen_viewings)
+    # 2. Create ScreenViewings entries (un INSERT multi-fila, sin pasar por el unit of work del ORM)
+    await db.execute(
+        _INSERT_SCREEN_VIEWINGS_STMT,
+        [{"id": uuid.uuid4(), "future_viewing_id": img.id, "screen_id": screen_id} for img in images_to_show],
+    )
     await db.commit()
 
     # 3. Revertir el orden para la presentación
@@ -220,4 +509,381 @@ async def get_recent_future_viewings_and_mark_viewed(
         await db.refresh(img)
         refreshed_images.append(img)
 
-    return refreshed_images
\ No newline at end of file
+    return refreshed_images
+
+async def get_completed_future_viewings_since(db: AsyncSession, since: datetime) -> list[FutureViewing]:
+    """
+    Retrieves every COMPLETED FutureViewing created since `since`, oldest first.
+
+    Used to warm and resynchronize the in-memory screen feed (see app/feed.py).
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asynchronous session.
+        since (datetime): Only FutureViewings created at or after this moment are returned.
+
+    Returns:
+        list[FutureViewing]: The matching FutureViewing objects, ordered by (created_at, id).
+    """
+    result = await db.execute(
+        select(FutureViewing)
+        .where(FutureViewing.status == ProcessingStatus.COMPLETED, FutureViewing.created_at >= since)
+        .order_by(FutureViewing.created_at, FutureViewing.id)
+    )
+    return result.scalars().all()
+
+
+async def get_shown_future_viewing_ids(
+    db: AsyncSession, screen_id: uuid.UUID, since: datetime
+) -> set[uuid.UUID] | None:
+    """
+    Retrieves the IDs of the FutureViewings created since `since` that a screen has already shown.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asynchronous session.
+        screen_id (uuid.UUID): The ID of the screen.
+        since (datetime): Only FutureViewings created at or after this moment are considered.
+
+    Returns:
+        set[uuid.UUID] | None: The shown FutureViewing IDs, or None if the screen is not registered.
+    """
+    screen = await db.execute(select(Screens.id).where(Screens.id == screen_id))
+    if screen.scalar_one_or_none() is None:
+        return None
+    result = await db.execute(
+        select(ScreenViewings.future_viewing_id)
+        .join(FutureViewing, FutureViewing.id == ScreenViewings.future_viewing_id)
+        .where(ScreenViewings.screen_id == screen_id, FutureViewing.created_at >= since)
+    )
+    return set(result.scalars().all())
+
+
+async def get_screen_viewings_since(
+    db: AsyncSession, screen_ids: list[uuid.UUID], viewed_since: datetime
+) -> list[tuple[uuid.UUID, uuid.UUID]]:
+    """
+    Retrieves what the given screens have shown since `viewed_since`, wherever it was recorded.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asynchronous session.
+        screen_ids (list[uuid.UUID]): The IDs of the screens.
+        viewed_since (datetime): Only ScreenViewings viewed at or after this moment are returned.
+
+    Returns:
+        list[tuple[uuid.UUID, uuid.UUID]]: (screen_id, future_viewing_id) pairs.
+    """
+    if not screen_ids:
+        return []
+    result = await db.execute(
+        select(ScreenViewings.screen_id, ScreenViewings.future_viewing_id)
+        .where(ScreenViewings.screen_id.in_(screen_ids), ScreenViewings.viewed_at >= viewed_since)
+    )
+    return [tuple(row) for row in result.all()]
+
+
+async def insert_screen_viewings(
+    db: AsyncSession, rows: list[tuple[uuid.UUID, uuid.UUID, datetime]]
+) -> int:
+    """
+    Records many (future_viewing_id, screen_id, viewed_at) display events in one statement.
+
+    Rows already recorded, and rows whose FutureViewing or screen no longer exists, are
+    skipped, so a batch is never rejected because of a single row.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asynchronous session.
+        rows (list[tuple[uuid.UUID, uuid.UUID, datetime]]): The display events to record.
+
+    Returns:
+        int: The number of ScreenViewings rows inserted.
+    """
+    if not rows:
+        return 0
+    batch = values(
+        column("id", UUID(as_uuid=True)),
+        column("future_viewing_id", UUID(as_uuid=True)),
+        column("screen_id", UUID(as_uuid=True)),
+        column("viewed_at", DateTime(timezone=True)),
+        name="batch",
+    ).data([(uuid.uuid4(), fv_id, screen_id, viewed_at) for fv_id, screen_id, viewed_at in rows])
+    existing = (
+        select(batch.c.id, batch.c.future_viewing_id, batch.c.screen_id, batch.c.viewed_at)
+        .join(FutureViewing, FutureViewing.id == batch.c.future_viewing_id)
+        .join(Screens, Screens.id == batch.c.screen_id)
+    )
+    result = await db.execute(
+        pg_insert(ScreenViewings)
+        .from_select(["id", "future_viewing_id", "screen_id", "viewed_at"], existing)
+        .on_conflict_do_nothing(constraint="_future_viewing_screen_uc")
+    )
+    await db.commit()
+    return result.rowcount
+
+
+async def get_future_viewings_by_ids(db: AsyncSession, fv_ids: list[uuid.UUID]) -> list[FutureViewing]:
+    """
+    Retrieves the FutureViewing records matching the given IDs in a single query.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asynchronous session.
+        fv_ids (list[uuid.UUID]): The IDs of the FutureViewings to retrieve.
+
+    Returns:
+        list[FutureViewing]: The found FutureViewing objects. Unknown IDs are ignored.
+    """
+    if not fv_ids:
+        return []
+    result = await db.execute(select(FutureViewing).where(FutureViewing.id.in_(fv_ids)))
+    return result.scalars().all()
+
+
+async def get_screens_for_future_viewings(
+    db: AsyncSession, fv_ids: list[uuid.UUID]
+) -> dict[uuid.UUID, list[Screens]]:
+    """
+    Retrieves, in a single query, the screens each of the given FutureViewings was shown on.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asynchronous session.
+        fv_ids (list[uuid.UUID]): The IDs of the FutureViewings.
+
+    Returns:
+        dict[uuid.UUID, list[Screens]]: The screens per FutureViewing ID, in the order they showed
+                                        it. FutureViewings never shown are missing from the result.
+    """
+    if not fv_ids:
+        return {}
+    result = await db.execute(
+        select(ScreenViewings.future_viewing_id, Screens)
+        .join(Screens, Screens.id == ScreenViewings.screen_id)
+        .where(ScreenViewings.future_viewing_id.in_(fv_ids))
+        .order_by(ScreenViewings.viewed_at, ScreenViewings.id)
+    )
+    screens: dict[uuid.UUID, list[Screens]] = {}
+    for fv_id, screen in result.all():
+        screens.setdefault(fv_id, []).append(screen)
+    return screens
+
+
+async def get_viewings_for_screens(
+    db: AsyncSession,
+    screen_ids: list[uuid.UUID],
+    limit: int,
+    before: tuple[datetime, uuid.UUID] | None = None,
+) -> dict[uuid.UUID, list[tuple[datetime, uuid.UUID, FutureViewing]]]:
+    """
+    Retrieves, in a single query, the most recent viewings shown on each of the given screens.
+
+    A window function numbers each screen's ScreenViewings from the most recent one, so every
+    screen gets at most `limit` rows however many screens are requested.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asynchronous session.
+        screen_ids (list[uuid.UUID]): The IDs of the screens.
+        limit (int): The maximum number of viewings per screen.
+        before (tuple[datetime, uuid.UUID] | None, optional): Only ScreenViewings older than this
+                                                              (viewed_at, id) are returned, for
+                                                              keyset pagination. Defaults to None.
+
+    Returns:
+        dict[uuid.UUID, list[tuple[datetime, uuid.UUID, FutureViewing]]]: Per screen ID, the
+        (viewed_at, ScreenViewings id, FutureViewing) of each viewing, most recent first.
+    """
+    if not screen_ids or limit <= 0:
+        return {}
+    conditions = [ScreenViewings.screen_id.in_(screen_ids)]
+    if before is not None:
+        conditions.append(
+            tuple_(ScreenViewings.viewed_at, ScreenViewings.id)
+            < tuple_(*before, types=[ScreenViewings.viewed_at.type, ScreenViewings.id.type])
+        )
+    ranked = (
+        select(
+            ScreenViewings.id,
+            ScreenViewings.screen_id,
+            ScreenViewings.future_viewing_id,
+            ScreenViewings.viewed_at,
+            func.row_number().over(
+                partition_by=ScreenViewings.screen_id,
+                order_by=(desc(ScreenViewings.viewed_at), desc(ScreenViewings.id)),
+            ).label("position"),
+        )
+        .where(*conditions)
+        .subquery()
+    )
+    result = await db.execute(
+        select(ranked.c.screen_id, ranked.c.viewed_at, ranked.c.id, FutureViewing)
+        .join(FutureViewing, FutureViewing.id == ranked.c.future_viewing_id)
+        .where(ranked.c.position <= limit)
+        .order_by(ranked.c.screen_id, ranked.c.position)
+    )
+    viewings: dict[uuid.UUID, list[tuple[datetime, uuid.UUID, FutureViewing]]] = {}
+    for screen_id, viewed_at, sv_id, fv in result.all():
+        viewings.setdefault(screen_id, []).append((viewed_at, sv_id, fv))
+    return viewings
+
+
+async def get_screen_by_id(db: AsyncSession, screen_id: uuid.UUID) -> Screens | None:
+    """
+    Retrieves a Screens record by its ID.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asynchronous session.
+        screen_id (uuid.UUID): The ID of the screen to retrieve.
+
+    Returns:
+        Screens | None: The found Screens object, or None if not found.
+    """
+    result = await db.execute(select(Screens).where(Screens.id == screen_id))
+    return result.scalars().first()
+
+
+async def get_screens(db: AsyncSession) -> list[Screens]:
+    """
+    Retrieves every registered screen, oldest first.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asynchronous session.
+
+    Returns:
+        list[Screens]: All Screens objects, ordered by creation date.
+    """
+    result = await db.execute(select(Screens).order_by(Screens.created_at, Screens.id))
+    return result.scalars().all()
+
+
+async def get_future_viewings_for_prefetch(
+    db: AsyncSession,
+    screen_id: uuid.UUID,
+    after: tuple[datetime, uuid.UUID] | None = None,
+    limit: int = 100,
+) -> list[FutureViewing]:
+    """
+    Retrieves the completed FutureViewings a screen is about to display, without marking them as viewed.
+
+    Uses the same 24-hour window and "not yet shown on this screen" rule as
+    `get_recent_future_viewings_and_mark_viewed`, but walks the results in ascending
+    (created_at, id) order with keyset pagination so callers can prefetch them in chunks.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asynchronous session.
+        screen_id (uuid.UUID): The ID of the screen that will display the viewings.
+        after (tuple[datetime, uuid.UUID] | None, optional): The (created_at, id) of the last
+                                                             item already fetched. Defaults to None.
+        limit (int, optional): The maximum number of items to return. Defaults to 100.
+
+    Returns:
+        list[FutureViewing]: Completed FutureViewings with an image, oldest first.
+    """
+    twenty_four_hours_ago = datetime.now(timezone.utc) - timedelta(hours=24)
+    conditions = [
+        FutureViewing.status == ProcessingStatus.COMPLETED,
+        FutureViewing.image_url.is_not(None),
+        FutureViewing.created_at >= twenty_four_hours_ago,
+        ~select(ScreenViewings.id)
+        .where(
+            ScreenViewings.future_viewing_id == FutureViewing.id,
+            ScreenViewings.screen_id == screen_id
+        ).exists(),
+    ]
+    if after is not None:
+        conditions.append(
+            tuple_(FutureViewing.created_at, FutureViewing.id)
+            > tuple_(*after, types=[FutureViewing.created_at.type, FutureViewing.id.type])
+        )
+
+    result = await db.execute(
+        select(FutureViewing)
+        .where(and_(*conditions))
+        .order_by(FutureViewing.created_at, FutureViewing.id)
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+
+async def get_existing_future_viewing_ids(db: AsyncSession, fv_ids: list[uuid.UUID]) -> set[uuid.UUID]:
+    """
+    Returns which of the given IDs have a FutureViewing row, using a single `IN` query.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asynchronous session.
+        fv_ids (list[uuid.UUID]): The candidate FutureViewing IDs.
+
+    Returns:
+        set[uuid.UUID]: The subset of `fv_ids` that exist in the database.
+    """
+    if not fv_ids:
+        return set()
+    result = await db.execute(select(FutureViewing.id).where(FutureViewing.id.in_(fv_ids)))
+    return set(result.scalars().all())
+
+
+async def get_future_viewing_image_urls(
+    db: AsyncSession, after_id: uuid.UUID | None = None, limit: int = 1000
+) -> list[tuple[uuid.UUID, str]]:
+    """
+    Retrieves (id, image_url) pairs for FutureViewings that reference an image, in ID order.
+
+    Uses keyset pagination on the primary key so large tables can be walked in constant memory.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asynchronous session.
+        after_id (uuid.UUID | None, optional): Only return rows with an ID greater than this one.
+                                               Defaults to None (start from the beginning).
+        limit (int, optional): The maximum number of rows to return. Defaults to 1000.
+
+    Returns:
+        list[tuple[uuid.UUID, str]]: The (id, image_url) pairs for the next page.
+    """
+    stmt = select(FutureViewing.id, FutureViewing.image_url).where(FutureViewing.image_url.is_not(None))
+    if after_id is not None:
+        stmt = stmt.where(FutureViewing.id > after_id)
+    result = await db.execute(stmt.order_by(FutureViewing.id).limit(limit))
+    return [(row.id, row.image_url) for row in result]
+
+
+async def clear_future_viewing_images(db: AsyncSession, fv_ids: list[uuid.UUID]) -> int:
+    """
+    Clears the image URL of the given FutureViewings in a single UPDATE, e.g. after their files were deleted.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asynchronous session.
+        fv_ids (list[uuid.UUID]): The IDs of the FutureViewings whose image no longer exists.
+
+    Returns:
+        int: The number of rows updated.
+    """
+    if not fv_ids:
+        return 0
+    result = await db.execute(
+        update(FutureViewing)
+        .where(FutureViewing.id.in_(fv_ids), FutureViewing.image_url.is_not(None))
+        .values(image_url=None)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount
+
+
+async def get_image_recency(
+    db: AsyncSession, fv_ids: list[uuid.UUID]
+) -> dict[uuid.UUID, tuple[datetime, datetime | None]]:
+    """
+    Retrieves, for each given FutureViewing, its creation time and the last time any screen displayed it.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asynchronous session.
+        fv_ids (list[uuid.UUID]): The IDs of the FutureViewings to look up.
+
+    Returns:
+        dict[uuid.UUID, tuple[datetime, datetime | None]]: Maps each existing ID to
+        (created_at, latest ScreenViewings.viewed_at or None if never displayed).
+    """
+    if not fv_ids:
+        return {}
+    result = await db.execute(
+        select(FutureViewing.id, FutureViewing.created_at, func.max(ScreenViewings.viewed_at))
+        .outerjoin(ScreenViewings, ScreenViewings.future_viewing_id == FutureViewing.id)
+        .where(FutureViewing.id.in_(fv_ids))
+        .group_by(FutureViewing.id, FutureViewing.created_at)
+    )
+    return {fv_id: (created_at, last_viewed_at) for fv_id, created_at, last_viewed_at in result}
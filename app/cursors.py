@@ -0,0 +1,35 @@
+import base64
+import uuid
+from datetime import datetime
+
+
+def encode_cursor(created_at: datetime, row_id: uuid.UUID) -> str:
+    """
+    Builds an opaque keyset pagination cursor from the position of the last row of a page.
+
+    Args:
+        created_at (datetime): Timestamp the pages are ordered by.
+        row_id (uuid.UUID): ID of the row, breaking ties between equal timestamps.
+
+    Returns:
+        str: The URL-safe cursor.
+    """
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    """
+    Reads back a cursor built by `encode_cursor`.
+
+    Args:
+        cursor (str): The cursor sent by the client.
+
+    Returns:
+        tuple[datetime, uuid.UUID]: The timestamp and row ID the next page starts after.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+    return datetime.fromisoformat(created_at), uuid.UUID(row_id)
@@ -1,7 +1,12 @@
 import os
+import time
+import uuid
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 from dotenv import load_dotenv
+from .metrics import DB_POOL_CHECKED_OUT, DB_POOL_OVERFLOW, DB_POOL_WAIT
+from .tracing import install_sql_tracing
 
 load_dotenv() # Carga variables desde .env
 
@@ -10,13 +15,99 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("No DATABASE_URL set for SQLAlchemy")
 
+# Configuración del pool de conexiones (por proceso: con N workers de uvicorn se abren hasta
+# N * (DB_POOL_SIZE + DB_MAX_OVERFLOW) conexiones contra Postgres o PgBouncer)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Segundos tras los que una conexión se recicla; -1 lo desactiva
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+# Sin pool en el proceso: cada sesión abre y cierra su conexión (útil detrás de PgBouncer)
+DB_NULL_POOL = os.getenv("DB_NULL_POOL", "false").lower() == "true"
+# PgBouncer en modo transacción no conserva las sentencias preparadas entre transacciones
+PGBOUNCER_MODE = os.getenv("PGBOUNCER_MODE", "false").lower() == "true"
+# Sentencias preparadas que se conservan por conexión (asyncpg); las consultas de crud.py usan
+# SQL fijo con parámetros, así que cada una se prepara una vez por conexión y se reutiliza
+DB_PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", "100"))
+
+
+class _TimedCheckoutMixin:
+    """Records in DB_POOL_WAIT how long each checkout waits for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - start)
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+class TimedNullPool(_TimedCheckoutMixin, NullPool):
+    pass
+
+
+def _engine_options() -> dict:
+    """Builds the create_async_engine keyword arguments from the DB_* / PGBOUNCER_MODE settings."""
+    options = {
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+    if DB_NULL_POOL:
+        options["poolclass"] = TimedNullPool
+    else:
+        options.update(
+            poolclass=TimedAsyncAdaptedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+    if PGBOUNCER_MODE:
+        # Sin caché de sentencias y con nombres únicos, para que dos backends distintos detrás
+        # de PgBouncer nunca reciban el mismo nombre de sentencia preparada
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    else:
+        options["connect_args"] = {"prepared_statement_cache_size": DB_PREPARED_STATEMENT_CACHE_SIZE}
+    return options
+
+
 engine = create_async_engine(
     DATABASE_URL,
     echo=False,        # Change to True for debugging SQL queries
-    pool_size=10,      # or higher, based on your needs/server limit
-    max_overflow=20,   # or higher
-    pool_timeout=30,   # default, adjust as needed
+    **_engine_options(),
 )
+# Métricas del pool, leídas en el momento de cada scrape de /metrics. Se consulta `engine.pool`
+# cada vez porque dispose() lo reemplaza; NullPool no lleva la cuenta y devuelve 0.
+DB_POOL_CHECKED_OUT.set_function(lambda: engine.pool.checkedout() if hasattr(engine.pool, "checkedout") else 0)
+DB_POOL_OVERFLOW.set_function(lambda: engine.pool.overflow() if hasattr(engine.pool, "overflow") else 0)
+
+
+def pool_status() -> dict:
+    """Current pool usage, as reported by /readyz. NullPool only reports its class."""
+    pool = engine.pool
+    status = {"class": type(pool).__name__}
+    if hasattr(pool, "checkedout"):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            max_overflow=DB_MAX_OVERFLOW,
+        )
+    return status
+
+
+# Atribuye sentencias, tiempo en BD y filas a la operación GraphQL en curso, y registra las lentas
+install_sql_tracing(engine)
+
 AsyncSessionLocal = sessionmaker(
     autocommit=False, autoflush=False, bind=engine, class_=AsyncSession
 )
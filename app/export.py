@@ -0,0 +1,314 @@
+"""
+Bulk export of `future_viewings` and `screen_viewings` as NDJSON or CSV.
+
+Both the HTTP endpoint (`GET /export/{table}`) and the command line stream the rows with
+constant memory: CSV comes straight from Postgres through `COPY ... TO STDOUT`, NDJSON from
+a server-side cursor read EXPORT_BATCH_ROWS rows at a time. Exports use their own small
+connection pool (EXPORT_MAX_CONNECTIONS), so a long export never takes connections from the
+API's pool; EXPORT_DATABASE_URL can point them at a read replica.
+
+Usage:
+    python -m app.export future_viewings --format csv --since 2024-01-01 --output viewings.csv
+    python -m app.export screen_viewings --since 2024-01-01T00:00:00Z --until 2024-02-01
+"""
+import argparse
+import asyncio
+import hmac
+import json
+import logging
+import os
+import sys
+import uuid
+from datetime import datetime, timezone
+from enum import Enum
+from typing import AsyncIterator
+
+from dotenv import load_dotenv
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+
+from .db import DATABASE_URL, DB_POOL_TIMEOUT, _engine_options
+from .metrics import EXPORTS_IN_PROGRESS
+from .models import FutureViewing, ScreenViewings
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Sin token el endpoint HTTP está desactivado (404); la CLI no lo necesita
+EXPORT_TOKEN = os.getenv("EXPORT_TOKEN")
+# Las exportaciones usan su propio pool: como mucho EXPORT_MAX_CONNECTIONS a la vez por proceso
+EXPORT_DATABASE_URL = os.getenv("EXPORT_DATABASE_URL") or DATABASE_URL
+EXPORT_MAX_CONNECTIONS = int(os.getenv("EXPORT_MAX_CONNECTIONS", "2"))
+# Filas por lectura del cursor (NDJSON) y trozos de COPY en espera de enviarse (CSV)
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "5000"))
+EXPORT_COPY_BUFFER_CHUNKS = int(os.getenv("EXPORT_COPY_BUFFER_CHUNKS", "16"))
+
+# Tabla exportable -> (columnas, columna por la que filtran since/until). Las columnas internas
+# (claves de idempotencia, reclamaciones de trabajos) no se exportan.
+EXPORT_TABLES = {
+    "future_viewings": (
+        [FutureViewing.id, FutureViewing.name, FutureViewing.age, FutureViewing.content,
+         FutureViewing.created_at, FutureViewing.image_url, FutureViewing.status],
+        FutureViewing.created_at,
+    ),
+    "screen_viewings": (
+        [ScreenViewings.id, ScreenViewings.future_viewing_id, ScreenViewings.screen_id, ScreenViewings.viewed_at],
+        ScreenViewings.viewed_at,
+    ),
+}
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+_export_engine: AsyncEngine | None = None
+# Exportaciones HTTP en curso; las que no caben se rechazan en lugar de esperar
+_export_slots = asyncio.Semaphore(EXPORT_MAX_CONNECTIONS)
+
+
+def get_export_engine() -> AsyncEngine:
+    """The engine used by exports, created on first use with a pool of EXPORT_MAX_CONNECTIONS."""
+    global _export_engine
+    if _export_engine is None:
+        options = _engine_options()
+        options.update(
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=max(EXPORT_MAX_CONNECTIONS, 1),
+            max_overflow=0,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+        _export_engine = create_async_engine(EXPORT_DATABASE_URL, **options)
+    return _export_engine
+
+
+async def dispose_export_engine() -> None:
+    """Closes the export pool, if it was ever opened."""
+    global _export_engine
+    if _export_engine is not None:
+        await _export_engine.dispose()
+        _export_engine = None
+
+
+def parse_timestamp(value: str | None) -> datetime | None:
+    """
+    Parses an ISO 8601 date or timestamp for the since/until filters.
+
+    Args:
+        value (str | None): e.g. "2024-01-01", "2024-01-01T12:00:00Z" or "2024-01-01T12:00:00+02:00".
+
+    Returns:
+        datetime | None: The timestamp (UTC when no offset is given), or None if value is empty.
+    Raises:
+        ValueError: If the value is not a valid ISO 8601 date or timestamp.
+    """
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def build_export_query(table: str, since: datetime | None = None, until: datetime | None = None) -> Select:
+    """
+    Builds the SELECT for an export: every exported column, optionally limited to
+    `since <= timestamp < until`. Rows are not ordered, so Postgres never sorts the table.
+
+    Raises:
+        KeyError: If the table is not exportable.
+    """
+    columns, timestamp_column = EXPORT_TABLES[table]
+    stmt = select(*columns)
+    if since is not None:
+        stmt = stmt.where(timestamp_column >= since)
+    if until is not None:
+        stmt = stmt.where(timestamp_column < until)
+    return stmt
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def ndjson_lines(rows) -> bytes:
+    """Serializes rows (anything with `_mapping`) as NDJSON, one object per line."""
+    return "".join(
+        json.dumps(dict(row._mapping), default=_json_default, ensure_ascii=False) + "\n" for row in rows
+    ).encode()
+
+
+async def stream_ndjson(stmt: Select) -> AsyncIterator[bytes]:
+    """Streams the query as NDJSON through a server-side cursor, one chunk per EXPORT_BATCH_ROWS rows."""
+    async with get_export_engine().connect() as conn:
+        result = await conn.stream(stmt.execution_options(yield_per=EXPORT_BATCH_ROWS))
+        async for rows in result.partitions():
+            yield ndjson_lines(rows)
+
+
+async def stream_csv(stmt: Select) -> AsyncIterator[bytes]:
+    """
+    Streams the query as CSV (with a header row) through `COPY (...) TO STDOUT`.
+
+    Postgres formats the rows itself, so no row is ever decoded in Python. The chunks go
+    through a bounded queue: when the consumer is slow, COPY stops reading from the socket
+    instead of buffering the table in memory.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(EXPORT_COPY_BUFFER_CHUNKS, 1))
+    done = object()
+
+    async def put(chunk) -> None:
+        # asyncpg entrega bytearrays que puede reutilizar: se copian antes de encolarlos
+        await queue.put(bytes(chunk))
+
+    async def copy() -> None:
+        try:
+            async with get_export_engine().connect() as conn:
+                compiled = stmt.compile(dialect=conn.dialect)
+                args = [compiled.params[name] for name in compiled.positiontup]
+                raw = await conn.get_raw_connection()
+                await raw.driver_connection.copy_from_query(
+                    str(compiled), *args, output=put, format="csv", header=True
+                )
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(done)
+
+    task = asyncio.create_task(copy(), name="export_copy")
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is done:
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        # El cliente puede desconectarse a mitad: se cancela el COPY y se devuelve la conexión
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+def stream_export(table: str, fmt: str, since: datetime | None = None, until: datetime | None = None) -> AsyncIterator[bytes]:
+    """
+    Streams an exportable table in the given format ("ndjson" or "csv").
+
+    Raises:
+        KeyError: If the table is not exportable.
+        ValueError: If the format is not supported.
+    """
+    stmt = build_export_query(table, since, until)
+    if fmt == "ndjson":
+        return stream_ndjson(stmt)
+    if fmt == "csv":
+        return stream_csv(stmt)
+    raise ValueError(f"Unsupported export format: {fmt}")
+
+
+class _ExportResponse(StreamingResponse):
+    """
+    StreamingResponse that holds one export slot until the response is over.
+
+    The slot and the EXPORTS_IN_PROGRESS gauge are released in `__call__`, not in the body
+    generator: a generator that never got iterated (the client went away before the first
+    chunk, or sending the headers failed) would never run its `finally`.
+    """
+
+    def __init__(self, content: AsyncIterator[bytes], table: str, **kwargs):
+        super().__init__(content, **kwargs)
+        self.table = table
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # Cierra el COPY o el cursor si la exportación se abandonó a medias
+            await self.body_iterator.aclose()
+            EXPORTS_IN_PROGRESS.labels(self.table).dec()
+            _export_slots.release()
+
+
+async def export_endpoint(request: Request) -> Response:
+    """
+    Streams a whole table as NDJSON or CSV.
+
+    Requires `Authorization: Bearer <EXPORT_TOKEN>`; without EXPORT_TOKEN the endpoint does not
+    exist. Query parameters: `format` (ndjson, the default, or csv), and `since` / `until`
+    (ISO 8601) to export only rows whose created_at / viewed_at falls in [since, until).
+
+    Args:
+        request (Request): The incoming Starlette request.
+
+    Returns:
+        Response: The streamed export; 400 for invalid parameters, 401 for a wrong token,
+                  404 for an unknown table or when exports are disabled, and 429 when
+                  EXPORT_MAX_CONNECTIONS exports are already running.
+    """
+    if not EXPORT_TOKEN:
+        return PlainTextResponse("Not Found", status_code=404)
+    authorization = request.headers.get("authorization", "")
+    if not hmac.compare_digest(authorization.encode(), f"Bearer {EXPORT_TOKEN}".encode()):
+        return PlainTextResponse("Unauthorized", status_code=401, headers={"www-authenticate": "Bearer"})
+
+    table = request.path_params["table"]
+    if table not in EXPORT_TABLES:
+        return PlainTextResponse(f"Unknown table. Exportable: {', '.join(EXPORT_TABLES)}.", status_code=404)
+    fmt = request.query_params.get("format", "ndjson")
+    if fmt not in EXPORT_FORMATS:
+        return PlainTextResponse("format must be ndjson or csv.", status_code=400)
+    try:
+        since = parse_timestamp(request.query_params.get("since"))
+        until = parse_timestamp(request.query_params.get("until"))
+    except ValueError:
+        return PlainTextResponse("since and until must be ISO 8601 dates or timestamps.", status_code=400)
+
+    if _export_slots.locked():
+        return PlainTextResponse("Too many exports in progress.", status_code=429, headers={"retry-after": "30"})
+    await _export_slots.acquire()
+    EXPORTS_IN_PROGRESS.labels(table).inc()
+    logger.info("Exportación de %s (%s) desde %s hasta %s", table, fmt, since, until)
+    return _ExportResponse(
+        stream_export(table, fmt, since, until),
+        table,
+        media_type=EXPORT_FORMATS[fmt],
+        headers={
+            "cache-control": "no-store",
+            "content-disposition": f'attachment; filename="{table}.{fmt}"',
+        },
+    )
+
+
+async def _export_to_file(table: str, fmt: str, since: datetime | None, until: datetime | None, output: str | None) -> None:
+    out = open(output, "wb") if output else sys.stdout.buffer
+    written = 0
+    try:
+        async for chunk in stream_export(table, fmt, since, until):
+            out.write(chunk)
+            written += len(chunk)
+    finally:
+        if output:
+            out.close()
+        else:
+            out.flush()
+        await dispose_export_engine()
+    logger.info("Exportados %d bytes de %s", written, table)
+
+
+if __name__ == "__main__":
+    # Los logs van a stderr, así la exportación puede escribirse a stdout
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+
+    parser = argparse.ArgumentParser(description="Export future_viewings or screen_viewings as NDJSON or CSV.")
+    parser.add_argument("table", choices=list(EXPORT_TABLES))
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="ndjson")
+    parser.add_argument("--since", type=parse_timestamp, help="Only rows at or after this ISO 8601 date/timestamp.")
+    parser.add_argument("--until", type=parse_timestamp, help="Only rows before this ISO 8601 date/timestamp.")
+    parser.add_argument("--output", help="Output file (default: stdout).")
+    args = parser.parse_args()
+
+    asyncio.run(_export_to_file(args.table, args.format, args.since, args.until, args.output))
@@ -0,0 +1,259 @@
+import asyncio
+import bisect
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from . import crud
+from .db import AsyncSessionLocal
+from .models import FutureViewing, ProcessingStatus
+
+logger = logging.getLogger(__name__)
+
+# "database" consulta Postgres en cada sondeo; "memory" responde recentFutureViewings desde el
+# índice en memoria. Con varios procesos, "memory" solo ve lo que otro proceso mostró a la misma
+# pantalla tras la siguiente sincronización, así que conviene con un único proceso o con afinidad
+SCREEN_FEED_MODE = os.getenv("SCREEN_FEED_MODE", "database")
+# Cada cuánto se recarga el índice desde la base de datos (imágenes de otras instancias o expulsadas)
+SCREEN_FEED_SYNC_SECONDS = float(os.getenv("SCREEN_FEED_SYNC_SECONDS", "30"))
+# Los ScreenViewings de los sondeos se guardan en lote cada SCREEN_VIEWINGS_FLUSH_SECONDS
+SCREEN_VIEWINGS_FLUSH_SECONDS = float(os.getenv("SCREEN_VIEWINGS_FLUSH_SECONDS", "1"))
+SCREEN_VIEWINGS_FLUSH_MAX_ROWS = int(os.getenv("SCREEN_VIEWINGS_FLUSH_MAX_ROWS", "1000"))
+# Misma ventana que get_recent_future_viewings_and_mark_viewed
+FEED_WINDOW = timedelta(hours=24)
+
+_MIN_UUID = uuid.UUID(int=0)
+
+FeedKey = tuple[datetime, uuid.UUID]
+
+
+@dataclass
+class _ScreenState:
+    """What one screen has shown, and its cursor: the keys it has not shown yet, oldest first."""
+    shown: set[uuid.UUID]
+    unshown: list[FeedKey]
+    generation: int
+
+
+class ScreenFeed:
+    """
+    In-process index of the COMPLETED FutureViewings from the last 24 hours, serving
+    `recentFutureViewings` from memory.
+
+    The index is loaded from the database in the background at startup, resynchronized every
+    SCREEN_FEED_SYNC_SECONDS, and updated by the image workers as jobs complete. Each screen
+    keeps a sorted list of the viewings it has not shown yet, so a poll takes its page from the
+    end of that list in O(page). A screen's state is loaded from ScreenViewings on its first
+    poll, so the feed picks up where it left off after a restart, and every sync merges in what
+    other processes showed the screen. The ScreenViewings rows a poll produces are written
+    asynchronously in batches; a crash can lose up to SCREEN_VIEWINGS_FLUSH_SECONDS of them, and
+    those viewings are shown again.
+
+    Until the first load finishes, `poll()` returns None and callers fall back to the database.
+    """
+
+    def __init__(self):
+        self.entries: dict[uuid.UUID, dict] = {}  # id -> FutureViewing.to_dict()
+        self.keys: list[FeedKey] = []  # (created_at, id), en orden ascendente
+        self.ready = False
+        # Se incrementa cuando salen entradas del índice: las pantallas rehacen su lista al sondear
+        self.generation = 0
+        self._screens: dict[uuid.UUID, _ScreenState] = {}
+        self._loading: dict[uuid.UUID, asyncio.Task] = {}
+        self._pending_rows: list[tuple[uuid.UUID, uuid.UUID, datetime]] = []
+        self._tasks: list[asyncio.Task] = []
+        # Entradas añadidas por los workers mientras una sincronización consulta la base de datos
+        self._added_during_sync: set[uuid.UUID] | None = None
+        self._last_sync_at: datetime | None = None
+
+    # --- Índice ---
+
+    def _insert(self, key: FeedKey, data: dict) -> None:
+        self.entries[key[1]] = data
+        bisect.insort(self.keys, key)
+        for state in self._screens.values():
+            if state.generation == self.generation and key[1] not in state.shown:
+                bisect.insort(state.unshown, key)
+
+    def add_completed(self, fv_id: str, name: str, age: int, content: str, created_at: datetime, image_url: str) -> None:
+        """Adds a viewing whose image was just generated by this process."""
+        key = (created_at, uuid.UUID(fv_id))
+        if not self.ready or key[1] in self.entries or created_at < datetime.now(timezone.utc) - FEED_WINDOW:
+            return
+        data = FutureViewing(
+            id=key[1], name=name, age=age, content=content, created_at=created_at,
+            image_url=image_url, status=ProcessingStatus.COMPLETED,
+        ).to_dict()
+        self._insert(key, data)
+        if self._added_during_sync is not None:
+            self._added_during_sync.add(key[1])
+
+    async def sync(self) -> None:
+        """
+        Reloads the index from the database, keeping the per-screen state, and merges into each
+        known screen what other processes showed it since the previous sync.
+        """
+        started_at = datetime.now(timezone.utc)
+        since = started_at - FEED_WINDOW
+        screen_ids = list(self._screens)
+        self._added_during_sync = set()
+        try:
+            async with AsyncSessionLocal() as db_session:
+                rows = await crud.get_completed_future_viewings_since(db_session, since)
+                marks = []
+                if screen_ids and self._last_sync_at is not None:
+                    # Con margen: las otras instancias guardan sus ScreenViewings en lote, con retraso
+                    overlap = timedelta(seconds=SCREEN_FEED_SYNC_SECONDS + SCREEN_VIEWINGS_FLUSH_SECONDS)
+                    marks = await crud.get_screen_viewings_since(db_session, screen_ids, self._last_sync_at - overlap)
+            fresh = {fv.id: (fv.created_at, fv.to_dict()) for fv in rows}
+            # Las completadas durante la consulta pueden no estar en su resultado
+            for fv_id in self._added_during_sync - fresh.keys():
+                data = self.entries[fv_id]
+                fresh[fv_id] = (datetime.fromisoformat(data["createdAt"]), data)
+        finally:
+            self._added_during_sync = None
+        removed = self.entries.keys() - fresh.keys()
+        if removed or not self.ready:
+            self.entries = {fv_id: data for fv_id, (_, data) in fresh.items()}
+            self.keys = sorted((created_at, fv_id) for fv_id, (created_at, _) in fresh.items())
+            self.generation += 1
+        else:
+            for fv_id, (created_at, data) in fresh.items():
+                if fv_id in self.entries:
+                    self.entries[fv_id] = data  # p. ej. imageUrl borrada al expulsar la imagen
+                else:
+                    self._insert((created_at, fv_id), data)
+        for screen_id, fv_id in marks:
+            state = self._screens.get(screen_id)
+            if state is not None and fv_id in self.entries and fv_id not in state.shown:
+                state.shown.add(fv_id)
+                state.generation = -1  # Su lista de pendientes se rehace en el próximo sondeo
+        # Lo mostrado fuera de la ventana ya no hace falta recordarlo
+        for state in self._screens.values():
+            state.shown &= self.entries.keys()
+        self._last_sync_at = started_at
+        self.ready = True
+
+    def _prune(self, cutoff: FeedKey) -> None:
+        expired = bisect.bisect_left(self.keys, cutoff)
+        if expired:
+            for _, fv_id in self.keys[:expired]:
+                self.entries.pop(fv_id, None)
+            del self.keys[:expired]
+
+    # --- Pantallas ---
+
+    async def _load_screen(self, screen_id: uuid.UUID) -> _ScreenState | None:
+        async with AsyncSessionLocal() as db_session:
+            shown = await crud.get_shown_future_viewing_ids(
+                db_session, screen_id, datetime.now(timezone.utc) - FEED_WINDOW
+            )
+        if shown is None:
+            return None
+        state = self._screens.get(screen_id)  # Otro sondeo pudo cargarla mientras tanto
+        if state is None:
+            state = _ScreenState(shown=shown, unshown=[], generation=-1)
+            self._screens[screen_id] = state
+        return state
+
+    async def _screen_state(self, screen_id: uuid.UUID) -> _ScreenState | None:
+        state = self._screens.get(screen_id)
+        if state is not None:
+            return state
+        # Sondeos simultáneos de una pantalla nueva comparten una única carga
+        task = self._loading.get(screen_id)
+        if task is None:
+            task = asyncio.create_task(self._load_screen(screen_id))
+            self._loading[screen_id] = task
+            task.add_done_callback(lambda _: self._loading.pop(screen_id, None))
+        return await asyncio.shield(task)
+
+    async def poll(self, screen_id: uuid.UUID, page: int = 1, page_size: int = 20) -> list[dict] | None:
+        """
+        Returns the next viewings for a screen and marks them as shown, like
+        `crud.get_recent_future_viewings_and_mark_viewed`: the newest `page_size` viewings the
+        screen has not shown (after skipping `page - 1` pages), oldest first.
+
+        Returns:
+            list[dict] | None: The viewings as dictionaries (via to_dict()), an empty list for
+                               an unregistered screen, or None while the index is not loaded.
+        """
+        if not self.ready:
+            return None
+        if page <= 0: page = 1
+        if page_size <= 0: page_size = 20
+        state = await self._screen_state(screen_id)
+        if state is None:
+            return []
+
+        now = datetime.now(timezone.utc)
+        cutoff = (now - FEED_WINDOW, _MIN_UUID)
+        self._prune(cutoff)
+        if state.generation != self.generation:
+            state.unshown = [key for key in self.keys if key[1] not in state.shown]
+            state.generation = self.generation
+        else:
+            del state.unshown[:bisect.bisect_left(state.unshown, cutoff)]
+
+        end = len(state.unshown) - (page - 1) * page_size
+        if end <= 0:
+            return []
+        start = max(end - page_size, 0)
+        picked = state.unshown[start:end]
+        del state.unshown[start:end]
+        for _, fv_id in picked:
+            state.shown.add(fv_id)
+            self._pending_rows.append((fv_id, screen_id, now))
+        return [self.entries[fv_id] for _, fv_id in picked]
+
+    # --- Persistencia y tareas en segundo plano ---
+
+    async def flush(self) -> None:
+        """Writes the buffered ScreenViewings rows; on failure they stay buffered for the next try."""
+        while self._pending_rows:
+            rows = self._pending_rows[:SCREEN_VIEWINGS_FLUSH_MAX_ROWS]
+            async with AsyncSessionLocal() as db_session:
+                await crud.insert_screen_viewings(db_session, rows)
+            del self._pending_rows[:len(rows)]
+
+    async def _flusher(self) -> None:
+        while True:
+            await asyncio.sleep(SCREEN_VIEWINGS_FLUSH_SECONDS)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("No se pudieron guardar %d ScreenViewings: %s", len(self._pending_rows), e)
+
+    async def _syncer(self) -> None:
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error("No se pudo sincronizar el índice de pantallas: %s", e)
+            await asyncio.sleep(SCREEN_FEED_SYNC_SECONDS)
+
+    def start(self) -> None:
+        """Starts warming the index and the periodic sync and flush tasks (memory mode only)."""
+        if SCREEN_FEED_MODE != "memory":
+            return
+        self._tasks = [
+            asyncio.create_task(self._syncer(), name="screen_feed_sync"),
+            asyncio.create_task(self._flusher(), name="screen_viewings_flush"),
+        ]
+
+    async def stop(self) -> None:
+        """Stops the background tasks and writes the ScreenViewings still buffered."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.ready = False
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error("Se perdieron %d ScreenViewings al apagar: %s", len(self._pending_rows), e)
+
+
+screen_feed = ScreenFeed()
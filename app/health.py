@@ -0,0 +1,74 @@
+import asyncio
+import os
+import time
+
+from sqlalchemy import text
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from .background import worker_tasks, draining
+from .db import engine, pool_status
+
+# Tiempo máximo para obtener una conexión del pool y ejecutar `SELECT 1` en /readyz
+READINESS_DB_TIMEOUT_SECONDS = float(os.getenv("READINESS_DB_TIMEOUT_SECONDS", "2"))
+
+
+async def healthz(request: Request) -> JSONResponse:
+    """
+    Liveness probe: the process is up and its event loop answers requests.
+
+    It does not touch the database, so a database outage never gets the process restarted.
+    """
+    return JSONResponse({"status": "ok"})
+
+
+async def _select_one() -> None:
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def _check_database() -> dict:
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(_select_one(), READINESS_DB_TIMEOUT_SECONDS)
+    except Exception as e:
+        return {"ok": False, "error": f"{type(e).__name__}: {e}" if str(e) else type(e).__name__}
+    return {"ok": True, "latency_ms": round((time.perf_counter() - start) * 1000, 3)}
+
+
+def _check_workers() -> dict:
+    workers = {}
+    for name, task in worker_tasks.items():
+        if not task.done():
+            workers[name] = {"ok": True}
+        elif task.cancelled():
+            workers[name] = {"ok": False, "error": "cancelled"}
+        else:
+            error = task.exception()
+            workers[name] = {"ok": False, "error": repr(error) if error else "stopped"}
+    if not any(name.startswith("image_generation") for name in workers):
+        workers["image_generation"] = {"ok": False, "error": "not started"}
+    return workers
+
+
+async def readyz(request: Request) -> JSONResponse:
+    """
+    Readiness probe: the database answers through the pool and the background workers are running.
+
+    Returns 200 with the individual checks and the current pool usage, or 503 when any check fails,
+    so the load balancer stops routing to this process until it recovers. While shutting down it
+    always answers 503, so no new work is routed to a process that is draining its image jobs.
+    """
+    if draining.is_set():
+        return JSONResponse({"status": "shutting_down", "pool": pool_status()}, status_code=503)
+    database = await _check_database()
+    workers = _check_workers()
+    ready = database["ok"] and all(w["ok"] for w in workers.values())
+    return JSONResponse(
+        {
+            "status": "ready" if ready else "not_ready",
+            "checks": {"database": database, "workers": workers},
+            "pool": pool_status(),
+        },
+        status_code=200 if ready else 503,
+    )
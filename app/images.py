@@ -0,0 +1,361 @@
+import mimetypes
+import os
+import re
+import stat
+import tarfile
+import time
+import uuid
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import AsyncIterator
+
+import anyio
+import anyio.to_thread
+from dotenv import load_dotenv
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response, PlainTextResponse, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from . import crud
+from .cursors import encode_cursor, decode_cursor
+from .db import AsyncSessionLocal
+
+load_dotenv()
+
+STATIC_FILES_DIR = os.getenv("STATIC_FILES_DIR", "static")
+IMAGES_SUBDIR = os.getenv("IMAGES_SUBDIR", "images")
+IMAGES_DIR = os.path.join(STATIC_FILES_DIR, IMAGES_SUBDIR)
+
+# Caché en memoria para las imágenes más solicitadas (0 la desactiva)
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+IMAGE_CACHE_MAX_FILE_BYTES = int(os.getenv("IMAGE_CACHE_MAX_FILE_BYTES", str(4 * 1024 * 1024)))
+
+# Imágenes cuya última entrega se recuerda para la expulsión por cuota; se olvidan las menos recientes
+SERVED_AT_MAX_ENTRIES = int(os.getenv("SERVED_AT_MAX_ENTRIES", "100000"))
+
+# Máximo de imágenes por paquete de precarga
+BUNDLE_MAX_ITEMS = int(os.getenv("BUNDLE_MAX_ITEMS", "500"))
+BUNDLE_CHUNK_SIZE = 64 * 1024
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+_NOT_MODIFIED_HEADERS = ("cache-control", "etag", "last-modified")
+
+# Las imágenes generadas se nombran con el UUID del FutureViewing y nunca se reescriben,
+# por lo que su nombre identifica su contenido.
+_CONTENT_ADDRESSED_NAME = re.compile(
+    r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\.(png|jpe?g|webp)$"
+)
+
+
+class _CachedImage:
+    __slots__ = ("body", "headers")
+
+    def __init__(self, body: bytes, headers: dict[str, str]):
+        self.body = body
+        self.headers = headers
+
+
+class ImageCache:
+    """
+    Bounded LRU cache holding the bytes and response headers of recently served images.
+
+    Args:
+        max_bytes (int): Total budget for cached image bodies. A value of 0 disables the cache.
+        max_file_bytes (int): Files larger than this are never cached.
+    """
+
+    def __init__(self, max_bytes: int, max_file_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.current_bytes = 0
+        self._entries: OrderedDict[str, _CachedImage] = OrderedDict()
+
+    def get(self, filename: str) -> _CachedImage | None:
+        entry = self._entries.get(filename)
+        if entry is not None:
+            self._entries.move_to_end(filename)
+        return entry
+
+    def accepts(self, size: int) -> bool:
+        return 0 < size <= min(self.max_file_bytes, self.max_bytes)
+
+    def put(self, filename: str, entry: _CachedImage) -> None:
+        if not self.accepts(len(entry.body)):
+            return
+        self.invalidate(filename)
+        self._entries[filename] = entry
+        self.current_bytes += len(entry.body)
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= len(evicted.body)
+
+    def invalidate(self, filename: str) -> None:
+        entry = self._entries.pop(filename, None)
+        if entry is not None:
+            self.current_bytes -= len(entry.body)
+
+
+image_cache = ImageCache(IMAGE_CACHE_MAX_BYTES, IMAGE_CACHE_MAX_FILE_BYTES)
+
+# Última vez (epoch) que se sirvió cada imagen, de la menos a la más reciente; la usa la
+# expulsión por cuota de disco
+served_at: OrderedDict[str, float] = OrderedDict()
+
+
+def _record_served(filename: str) -> None:
+    served_at[filename] = time.time()
+    served_at.move_to_end(filename)
+    while len(served_at) > SERVED_AT_MAX_ENTRIES:
+        served_at.popitem(last=False)
+
+
+async def prune_served_at() -> int:
+    """
+    Forgets the images in `served_at` whose file no longer exists (removed by the cleanup script
+    or by another instance's eviction).
+
+    Returns:
+        int: The number of entries dropped.
+    """
+    names = list(served_at)
+    gone = await anyio.to_thread.run_sync(
+        lambda: [name for name in names if not os.path.exists(os.path.join(IMAGES_DIR, name))]
+    )
+    for name in gone:
+        served_at.pop(name, None)
+    return len(gone)
+
+
+def _validators(stat_result: os.stat_result) -> dict[str, str]:
+    """
+    Builds strong validators for a file from its inode, mtime (ns) and size.
+
+    Generated images are written once, so these three values change whenever the bytes do.
+    """
+    etag = f'"{stat_result.st_ino:x}-{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+    return {
+        "etag": etag,
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+    }
+
+
+def _not_modified(headers: dict[str, str]) -> Response:
+    return Response(status_code=304, headers={k: headers[k] for k in _NOT_MODIFIED_HEADERS if k in headers})
+
+
+def _is_not_modified(request_headers: Headers, response_headers: dict[str, str]) -> bool:
+    """
+    Evaluates If-None-Match (which takes precedence) and If-Modified-Since for a 304 response.
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        # Comparación débil, tal como exige RFC 9110 para If-None-Match
+        return any(tag.removeprefix("W/") == response_headers["etag"] for tag in candidates)
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+            last_modified = parsedate_to_datetime(response_headers["last-modified"])
+        except (TypeError, ValueError):
+            return False
+        return last_modified <= since
+    return False
+
+
+class ImageFileResponse(FileResponse):
+    """
+    FileResponse that hands full-body transfers to the server through the ASGI
+    `http.response.pathsend` extension when available, so servers that implement it can
+    use sendfile(2) instead of copying the file through Python in 64 KiB chunks.
+    """
+
+    _scope: Scope | None = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self._scope = scope
+        await super().__call__(scope, receive, send)
+
+    async def _handle_simple(self, send: Send, send_header_only: bool) -> None:
+        extensions = (self._scope or {}).get("extensions") or {}
+        if send_header_only or "http.response.pathsend" not in extensions:
+            await super()._handle_simple(send, send_header_only)
+            return
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        await send({"type": "http.response.pathsend", "path": os.path.abspath(self.path)})
+
+
+async def serve_image(request: Request) -> Response:
+    """
+    Serves a generated image with long-lived caching headers.
+
+    Content-addressed names (the FutureViewing UUID) are served with
+    `Cache-Control: public, max-age=31536000, immutable` and a strong ETag, conditional
+    requests are answered with 304, and Range requests are delegated to `FileResponse`
+    (including 206/416 handling). Small, frequently requested images are kept in a bounded
+    in-memory LRU cache so the hot set is served without touching the disk.
+
+    Args:
+        request (Request): The incoming Starlette request.
+
+    Returns:
+        Response: The image, a 304 Not Modified response, or a 404 if it does not exist.
+    """
+    filename = request.path_params["filename"]
+    if filename != os.path.basename(filename) or filename.startswith("."):
+        return PlainTextResponse("Not Found", status_code=404)
+
+    immutable = bool(_CONTENT_ADDRESSED_NAME.match(filename))
+    cache_control = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+    wants_range = "range" in request.headers
+
+    # Solo los nombres inmutables pueden servirse desde memoria sin volver a consultar el disco
+    cached = image_cache.get(filename) if immutable else None
+    if cached is not None:
+        _record_served(filename)
+        if _is_not_modified(request.headers, cached.headers):
+            return _not_modified(cached.headers)
+        if not wants_range:
+            body = b"" if request.method == "HEAD" else cached.body
+            return Response(body, headers=cached.headers)
+
+    file_path = os.path.join(IMAGES_DIR, filename)
+    try:
+        stat_result = await anyio.to_thread.run_sync(os.stat, file_path)
+    except (FileNotFoundError, NotADirectoryError):
+        return PlainTextResponse("Not Found", status_code=404)
+    if not stat.S_ISREG(stat_result.st_mode):
+        return PlainTextResponse("Not Found", status_code=404)
+    _record_served(filename)
+
+    headers = {"cache-control": cache_control, "accept-ranges": "bytes", **_validators(stat_result)}
+    if _is_not_modified(request.headers, headers):
+        return _not_modified(headers)
+
+    if immutable and not wants_range and request.method == "GET" and image_cache.accepts(stat_result.st_size):
+        async with await anyio.open_file(file_path, "rb") as f:
+            body = await f.read()
+        media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        response = Response(body, headers=headers, media_type=media_type)
+        image_cache.put(filename, _CachedImage(body, dict(response.headers)))
+        return response
+
+    return ImageFileResponse(file_path, headers=headers, stat_result=stat_result)
+
+
+def _image_path_from_url(image_url: str | None) -> str | None:
+    """Maps a stored image URL (e.g. /static/images/<uuid>.png) back to its file in IMAGES_DIR."""
+    if not image_url:
+        return None
+    filename = os.path.basename(image_url)
+    if not filename or filename.startswith("."):
+        return None
+    return os.path.join(IMAGES_DIR, filename)
+
+
+async def _stream_tar(paths: list[str]) -> AsyncIterator[bytes]:
+    """
+    Streams the given files as an uncompressed POSIX tar archive.
+
+    Each member is read asynchronously in fixed-size chunks, so memory use stays at one chunk
+    regardless of how many images are bundled. Files that disappeared since the query are skipped.
+    """
+    for path in paths:
+        try:
+            stat_result = await anyio.to_thread.run_sync(os.stat, path)
+        except FileNotFoundError:
+            continue
+        info = tarfile.TarInfo(os.path.basename(path))
+        info.size = stat_result.st_size
+        info.mtime = int(stat_result.st_mtime)
+        info.mode = 0o644
+        yield info.tobuf(format=tarfile.USTAR_FORMAT)
+
+        remaining = info.size
+        async with await anyio.open_file(path, "rb") as f:
+            while remaining > 0:
+                chunk = await f.read(min(BUNDLE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        if remaining > 0:
+            # El archivo se truncó mientras se leía: se rellena para mantener el tar válido
+            yield b"\0" * remaining
+        padding = -info.size % tarfile.BLOCKSIZE
+        if padding:
+            yield b"\0" * padding
+    yield b"\0" * (tarfile.BLOCKSIZE * 2)
+
+
+async def image_bundle(request: Request) -> Response:
+    """
+    Streams the images for many FutureViewings as a single tar archive.
+
+    Accepts either a JSON body `{"viewingIds": [...]}` (POST) or a screen plus cursor, via
+    query parameters (`GET ?screenId=...&cursor=...&limit=...`) or the same keys in a JSON
+    body. In screen mode the archive contains the completed viewings from the last 24 hours
+    that the screen has not shown yet, oldest first, and the `X-Next-Cursor` header holds
+    the cursor for the following chunk. Viewings are not marked as viewed.
+
+    Members are named after the image file (`<uuid>.<ext>`), so screens can map them back to
+    the `imageUrl` returned by `recentFutureViewings`.
+
+    Args:
+        request (Request): The incoming Starlette request.
+
+    Returns:
+        Response: A streamed `application/x-tar` response, or a 400 for invalid input.
+    """
+    params = dict(request.query_params)
+    if request.method == "POST":
+        try:
+            body = await request.json()
+        except ValueError:
+            return PlainTextResponse("Invalid JSON body.", status_code=400)
+        if not isinstance(body, dict):
+            return PlainTextResponse("Invalid JSON body.", status_code=400)
+        params.update(body)
+
+    headers = {"cache-control": "no-store"}
+    async with AsyncSessionLocal() as db:
+        if params.get("viewingIds") is not None:
+            viewing_ids = params["viewingIds"]
+            if not isinstance(viewing_ids, list) or len(viewing_ids) > BUNDLE_MAX_ITEMS:
+                return PlainTextResponse(
+                    f"viewingIds must be a list of at most {BUNDLE_MAX_ITEMS} IDs.", status_code=400
+                )
+            try:
+                ids = [uuid.UUID(str(v)) for v in viewing_ids]
+            except ValueError:
+                return PlainTextResponse("Invalid viewing ID format.", status_code=400)
+            viewings = await crud.get_future_viewings_by_ids(db, ids)
+            # Respetar el orden solicitado por el cliente
+            order = {fv_id: i for i, fv_id in enumerate(ids)}
+            viewings = sorted(viewings, key=lambda v: order[v.id])
+        elif params.get("screenId") is not None:
+            try:
+                screen_id = uuid.UUID(str(params["screenId"]))
+                after = decode_cursor(params["cursor"]) if params.get("cursor") else None
+                limit = min(int(params.get("limit", BUNDLE_MAX_ITEMS)), BUNDLE_MAX_ITEMS)
+            except (ValueError, TypeError):
+                return PlainTextResponse("Invalid screenId, cursor or limit.", status_code=400)
+            viewings = await crud.get_future_viewings_for_prefetch(
+                db, screen_id=screen_id, after=after, limit=max(limit, 1)
+            )
+            if viewings:
+                headers["x-next-cursor"] = encode_cursor(viewings[-1].created_at, viewings[-1].id)
+        else:
+            return PlainTextResponse("Provide either viewingIds or screenId.", status_code=400)
+
+        paths = [
+            path for path in (_image_path_from_url(v.image_url) for v in viewings) if path is not None
+        ]
+
+    headers["x-bundle-count"] = str(len(paths))
+    return StreamingResponse(_stream_tar(paths), media_type="application/x-tar", headers=headers)
@@ -0,0 +1,102 @@
+import asyncio
+import uuid
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Hashable
+
+from . import crud
+from .db import AsyncSessionLocal
+from .cursors import encode_cursor, decode_cursor
+
+
+class DataLoader:
+    """
+    Batches the lookups that resolvers make while one level of a GraphQL query is resolved.
+
+    `load()` returns a future right away. Keys are collected until a full pass of the event loop
+    adds no new ones (by then every sibling resolver of the level has asked for its key), and
+    `batch_fn` then receives all of them at once. Results are cached per key for the life of
+    the loader, so a loader must be created per request.
+    """
+
+    def __init__(self, batch_fn: Callable[[list[Any]], Awaitable[list[Any]]]):
+        self.batch_fn = batch_fn
+        self._cache: dict[Hashable, asyncio.Future] = {}
+        self._queue: list[tuple[Hashable, asyncio.Future]] = []
+        self._batches: set[asyncio.Task] = set()
+
+    def load(self, key: Hashable) -> asyncio.Future:
+        future = self._cache.get(key)
+        if future is not None:
+            return future
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._cache[key] = future
+        self._queue.append((key, future))
+        if len(self._queue) == 1:
+            loop.call_soon(self._dispatch_when_idle, 1)
+        return future
+
+    def _dispatch_when_idle(self, queued: int) -> None:
+        if len(self._queue) != queued:
+            # Siguen llegando claves del mismo nivel: esperar otra vuelta del event loop
+            asyncio.get_running_loop().call_soon(self._dispatch_when_idle, len(self._queue))
+            return
+        batch, self._queue = self._queue, []
+        task = asyncio.ensure_future(self._run_batch(batch))
+        # El event loop sólo guarda referencias débiles a las tareas
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: list[tuple[Hashable, asyncio.Future]]) -> None:
+        try:
+            values = await self.batch_fn([key for key, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), value in zip(batch, values):
+            if not future.done():
+                future.set_result(value)
+
+
+async def _load_shown_on(fv_ids: list[uuid.UUID]) -> list[list[dict]]:
+    async with AsyncSessionLocal() as db:
+        screens = await crud.get_screens_for_future_viewings(db, fv_ids)
+    return [[screen.to_dict() for screen in screens.get(fv_id, [])] for fv_id in fv_ids]
+
+
+async def _load_screen_viewings(keys: list[tuple[uuid.UUID, int, str | None]]) -> list[dict]:
+    # Una consulta por combinación (first, after); normalmente todas las pantallas de un nivel comparten argumentos
+    groups: dict[tuple[int, str | None], list[uuid.UUID]] = defaultdict(list)
+    for screen_id, first, after in keys:
+        groups[(first, after)].append(screen_id)
+    pages = {}
+    async with AsyncSessionLocal() as db:
+        for (first, after), screen_ids in groups.items():
+            before = decode_cursor(after) if after else None
+            # Una fila de más indica si hay página siguiente
+            viewings = await crud.get_viewings_for_screens(db, screen_ids, limit=first + 1, before=before)
+            for screen_id in screen_ids:
+                rows = viewings.get(screen_id, [])
+                edges = [
+                    {"viewedAt": viewed_at.isoformat(), "cursor": encode_cursor(viewed_at, sv_id),
+                     "futureViewing": fv.to_dict()}
+                    for viewed_at, sv_id, fv in rows[:first]
+                ]
+                pages[(screen_id, first, after)] = {
+                    "edges": edges,
+                    "endCursor": edges[-1]["cursor"] if edges else None,
+                    "hasNextPage": len(rows) > first,
+                }
+    return [pages[key] for key in keys]
+
+
+class Loaders:
+    """The DataLoaders of one GraphQL request, stored in the context as `loaders`."""
+
+    def __init__(self):
+        # future_viewing_id -> pantallas en las que se mostró
+        self.shown_on = DataLoader(_load_shown_on)
+        # (screen_id, first, after) -> página de ScreenViewings de esa pantalla
+        self.screen_viewings = DataLoader(_load_screen_viewings)
@@ -0,0 +1,124 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "json" o "text"
+# Fracción de eventos de alto volumen (por petición/tarea) que se registran; 1.0 registra todos
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+# Atributos estándar de LogRecord; el resto proviene de `extra` y se emite como campos del JSON
+_RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener: QueueListener | None = None
+_queue_handler: QueueHandler | None = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, including any fields passed through `extra`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and key != "sample_rate":
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Drops a fraction of records that opt into sampling with `extra={"sample_rate": ...}`.
+
+    Records without a `sample_rate` are always kept, so errors and lifecycle events are never lost.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, "sample_rate", None)
+        return rate is None or rate >= 1.0 or random.random() < rate
+
+
+class _InProcessQueueHandler(QueueHandler):
+    """
+    QueueHandler for a same-process queue.
+
+    The stock `prepare()` formats the whole record (including tracebacks) on the calling thread
+    so that it can be pickled. Here only the message arguments are merged; JSON encoding,
+    traceback formatting and the write happen on the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def sampled(**fields) -> dict:
+    """Builds an `extra` dict for a high-volume event, subject to LOG_SAMPLE_RATE."""
+    return {"sample_rate": LOG_SAMPLE_RATE, **fields}
+
+
+def setup_logging() -> None:
+    """
+    Configures the root logger once for the whole application.
+
+    Loggers only put records on an in-memory queue; a QueueListener thread formats them (as JSON
+    by default) and writes them to stdout, so a slow log pipe never stalls the event loop.
+    Calling this more than once has no effect.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "text":
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s"))
+    else:
+        stream_handler.setFormatter(JsonFormatter())
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _queue_handler = _InProcessQueueHandler(log_queue)
+    _queue_handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """
+    Flushes the queued records and stops the listener thread.
+
+    The stdout handler is attached to the root logger directly before the queue is detached, so
+    records logged afterwards (by the server or at exit) are still written, synchronously.
+    """
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    (stream_handler,) = _listener.handlers
+    for log_filter in _queue_handler.filters:
+        stream_handler.addFilter(log_filter)
+    root.addHandler(stream_handler)
+    root.removeHandler(_queue_handler)
+    _listener.stop()
+    _listener = None
+    _queue_handler = None
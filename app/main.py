@@ -1,4 +1,4 @@
-import asyncio
+import logging
 import os
 from starlette.applications import Starlette
 from starlette.routing import Route, Mount
@@ -6,36 +6,78 @@ from starlette.staticfiles import StaticFiles
 from starlette.middleware import Middleware
 from starlette.middleware.cors import CORSMiddleware
 from ariadne.asgi import GraphQL
+from ariadne.asgi.handlers import GraphQLHTTPHandler
 from dotenv import load_dotenv
 
 from .schema import schema
-from .db import create_tables, get_db_session, AsyncSessionLocal # Importar AsyncSessionLocal
-from .background import image_generation_worker
+from .db import create_tables, get_db_session, AsyncSessionLocal, engine # Importar AsyncSessionLocal
+from .background import start_workers, stop_workers
+from .images import serve_image, image_bundle, IMAGES_SUBDIR
+from .metrics import metrics_endpoint, resolver_metrics_middleware
+from .health import healthz, readyz
+from .export import export_endpoint, dispose_export_engine
+from .profiling import loop_monitor, profile_endpoint
+from .compression import CompressionMiddleware
+from .feed import screen_feed
+from .loaders import Loaders
+from .tracing import SQLTracingExtension
+from .logging_config import setup_logging, stop_logging
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 STATIC_FILES_DIR = os.getenv("STATIC_FILES_DIR", "static")
+# El esquema lo gestiona Alembic; activar sólo en desarrollo para crear las tablas al arrancar
+CREATE_TABLES_ON_STARTUP = os.getenv("CREATE_TABLES_ON_STARTUP", "false").lower() == "true"
 
-# Función de contexto para GraphQL, para inyectar la sesión de BD
-async def get_context_value(request):
+# Función de contexto para GraphQL, para inyectar la sesión de BD y los DataLoaders
+async def get_context_value(request, data):
     # Crear una nueva sesión para cada solicitud GraphQL
     async with AsyncSessionLocal() as session:
-        return {"request": request, "db": session}
+        # Los DataLoaders cachean por petición: nunca se comparten entre peticiones
+        return {"request": request, "db": session, "loaders": Loaders()}
 
 # Crear la aplicación GraphQL con el contexto
-graphql_app = GraphQL(schema, context_value=get_context_value)
+graphql_app = GraphQL(
+    schema,
+    context_value=get_context_value,
+    http_handler=GraphQLHTTPHandler(
+        extensions=[SQLTracingExtension],
+        middleware=[resolver_metrics_middleware],
+    ),
+)
 
 
 async def startup():
-    print("Aplicación iniciándose...")
-    await create_tables() # Crear tablas de la base de datos si no existen
-    # Iniciar el worker de generación de imágenes en segundo plano
-    asyncio.create_task(image_generation_worker())
-    print("Worker de generación de imágenes iniciado.")
+    # Un único punto de configuración de logging: formato JSON y escritura fuera del event loop.
+    # Se hace al arrancar y no al importar, para que importar app.main no toque el logging global.
+    setup_logging()
+    logger.info("Aplicación iniciándose...")
+    # Retraso del event loop en /metrics y pila de lo que lo bloquea en los logs
+    loop_monitor.start()
+    if CREATE_TABLES_ON_STARTUP:
+        await create_tables() # Crear tablas de la base de datos si no existen
+    # Iniciar los workers en segundo plano (generación de imágenes y, si hay cuota, expulsión)
+    start_workers()
+    logger.info("Worker de generación de imágenes iniciado.")
+    # Carga en segundo plano el índice de recentFutureViewings (hasta entonces se consulta la BD)
+    screen_feed.start()
 
 async def shutdown():
-    print("Aplicación apagándose...")
-    # Aquí podrías añadir lógica para cerrar conexiones o tareas pendientes.
+    logger.info("Aplicación apagándose...")
+    try:
+        # Deja de aceptar trabajos, espera las generaciones en curso y devuelve el resto como PENDING
+        await stop_workers()
+        # Guarda los ScreenViewings pendientes de los últimos sondeos
+        await screen_feed.stop()
+        await engine.dispose()
+        await dispose_export_engine()
+        await loop_monitor.stop()
+        logger.info("Aplicación detenida.")
+    finally:
+        # Lo último: vacía la cola de logs; lo que se registre después se escribe directamente
+        stop_logging()
 
 # Configuración de CORS
 middleware = [
@@ -44,7 +86,17 @@ middleware = [
 
 # Rutas de la aplicación
 routes = [
-    Route("/graphql", graphql_app, methods=["GET", "POST", "OPTIONS"]), # Endpoint GraphQL
+    # Endpoint GraphQL, con las respuestas comprimidas según Accept-Encoding
+    Route("/graphql", CompressionMiddleware(graphql_app), methods=["GET", "POST", "OPTIONS"]),
+    # Imágenes generadas con cabeceras de caché de larga duración (debe ir antes del Mount)
+    Route(f"/{STATIC_FILES_DIR}/{IMAGES_SUBDIR}/{{filename}}", serve_image, methods=["GET", "HEAD"]),
+    # Paquete tar con todas las imágenes que una pantalla necesita precargar
+    Route("/images/bundle", image_bundle, methods=["GET", "POST"]),
+    Route("/export/{table}", export_endpoint, methods=["GET"]),  # Exportación masiva (requiere EXPORT_TOKEN)
+    Route("/debug/profile", profile_endpoint, methods=["GET"]),  # Profiler por muestreo (requiere PROFILER_TOKEN)
+    Route("/metrics", metrics_endpoint, methods=["GET"]),  # Métricas en formato Prometheus
+    Route("/healthz", healthz, methods=["GET"]),  # Liveness: el proceso responde
+    Route("/readyz", readyz, methods=["GET"]),    # Readiness: BD accesible y workers en marcha
     Mount(f"/{STATIC_FILES_DIR}", app=StaticFiles(directory=STATIC_FILES_DIR), name="static")
 ]
 
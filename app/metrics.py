@@ -0,0 +1,147 @@
+import functools
+import time
+
+from graphql import GraphQLResolveInfo
+from graphql.pyutils import is_awaitable
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from starlette.requests import Request
+from starlette.responses import Response
+
+# Este módulo no importa nada de la aplicación: cada módulo registra aquí sus propias métricas,
+# así se evitan importaciones circulares (db, background y services dependen de él).
+
+RESOLVER_LATENCY = Histogram(
+    "graphql_resolver_duration_seconds",
+    "Time spent resolving GraphQL fields (root fields and async resolvers).",
+    ["type", "field"],
+)
+TASK_QUEUE_DEPTH = Gauge(
+    "image_task_queue_depth",
+    "Image generation jobs waiting in the in-memory queue.",
+)
+IMAGE_JOBS_SHED = Counter(
+    "image_jobs_shed_total",
+    "Image jobs not queued on arrival because the queue was full, by action (rejected or deferred).",
+    ["action"],
+)
+IMAGE_JOB_QUEUE_WAIT = Histogram(
+    "image_job_queue_wait_seconds",
+    "Time image jobs spend in the queue before a worker takes them, by priority lane.",
+    ["priority"],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600),
+)
+STATUS_WRITE_BATCH_SIZE = Histogram(
+    "status_write_batch_size",
+    "Image job results committed per batched UPDATE.",
+    buckets=(1, 2, 5, 10, 20, 50, 100),
+)
+IMAGE_WORKERS_BUSY = Gauge(
+    "image_workers_busy",
+    "Image generation workers currently processing a job.",
+)
+PROVIDER_LATENCY = Histogram(
+    "image_provider_duration_seconds",
+    "Latency of image provider calls, including writing the image to disk.",
+    ["provider"],
+    buckets=(0.5, 1, 2.5, 5, 10, 15, 20, 30, 45, 60, 90, 120),
+)
+PROVIDER_ERRORS = Counter(
+    "image_provider_errors_total",
+    "Image provider calls that raised or returned no image.",
+    ["provider"],
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "Connections currently checked out from the SQLAlchemy pool.",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections",
+    "Connections opened beyond pool_size (negative while the pool is not full).",
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "Time spent waiting for a connection from the pool (including opening new connections).",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "How much later than scheduled the event loop ran the lag monitor's wake-up.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+EVENT_LOOP_STALLS = Counter(
+    "event_loop_stalls_total",
+    "Times the event loop stayed blocked beyond LOOP_STALL_THRESHOLD_MS (each logged with its stack).",
+)
+RESPONSE_COMPRESSION = Counter(
+    "graphql_response_compression_total",
+    "Compressed /graphql responses, by encoding and by whether the compressed body came from the cache.",
+    ["encoding", "cache"],
+)
+EXPORTS_IN_PROGRESS = Gauge(
+    "exports_in_progress",
+    "Bulk exports currently streaming through /export, by table.",
+    ["table"],
+)
+TIME_TO_COMPLETED = Histogram(
+    "future_viewing_time_to_completed_seconds",
+    "Time from FutureViewing creation until its image is COMPLETED.",
+    buckets=(1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600, 1800, 3600),
+)
+
+
+def resolver_metrics_middleware(resolve, obj, info: GraphQLResolveInfo, **kwargs):
+    """
+    GraphQL middleware recording resolver latency per field.
+
+    Only root fields and resolvers returning awaitables are observed. The default resolvers
+    that read keys from dicts are skipped, which keeps the overhead at one `perf_counter()`
+    call for them.
+    """
+    if info.field_name.startswith("__"):  # Campos de introspección
+        return resolve(obj, info, **kwargs)
+
+    start = time.perf_counter()
+    result = resolve(obj, info, **kwargs)
+
+    if is_awaitable(result):
+        async def observe_async():
+            try:
+                return await result
+            finally:
+                RESOLVER_LATENCY.labels(info.parent_type.name, info.field_name).observe(
+                    time.perf_counter() - start
+                )
+        return observe_async()
+
+    if info.path.prev is None:
+        RESOLVER_LATENCY.labels(info.parent_type.name, info.field_name).observe(time.perf_counter() - start)
+    return result
+
+
+def observe_provider_call(generate_image):
+    """
+    Decorator for `generate_image` methods of the image generators.
+
+    Records the call latency labeled by generator class, and counts an error when the call
+    raises or returns no image URL.
+    """
+    @functools.wraps(generate_image)
+    async def wrapper(self, *args, **kwargs):
+        provider = type(self).__name__
+        start = time.perf_counter()
+        try:
+            image_url = await generate_image(self, *args, **kwargs)
+        except Exception:
+            PROVIDER_ERRORS.labels(provider).inc()
+            raise
+        finally:
+            PROVIDER_LATENCY.labels(provider).observe(time.perf_counter() - start)
+        if not image_url:
+            PROVIDER_ERRORS.labels(provider).inc()
+        return image_url
+    return wrapper
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    """Exposes all metrics in the Prometheus text format."""
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
@@ -2,7 +2,7 @@ import uuid
 from sqlalchemy import Column, String, Integer, DateTime, Enum as SQLAlchemyEnum, Boolean, ForeignKey
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
-from sqlalchemy.schema import UniqueConstraint
+from sqlalchemy.schema import UniqueConstraint, Index
 from enum import Enum
 from .db import Base
 
@@ -27,6 +27,10 @@ class FutureViewing(Base):
         created_at (datetime): Timestamp of when the record was created.
         image_url (str, optional): URL of the generated image, if available.
         status (ProcessingStatus): Current processing status of the image generation.
+        idempotency_key (str, optional): Client-supplied key that makes `addFutureViewing` retries
+            return this row instead of creating a new one. Cleared once it expires.
+        claimed_by (str, optional): Instance that holds the image generation job of a PENDING row.
+        claimed_at (datetime, optional): When that instance last renewed its claim (lease).
     """
     __tablename__ = "future_viewings"
 
@@ -37,6 +41,21 @@ class FutureViewing(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     image_url = Column(String, nullable=True)
     status = Column(SQLAlchemyEnum(ProcessingStatus), default=ProcessingStatus.PENDING, nullable=False)
+    idempotency_key = Column(String(128), nullable=True)
+    claimed_by = Column(String(100), nullable=True)
+    claimed_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Índices parciales: sólo las filas con clave vigente, o pendientes, ocupan espacio en ellos
+    __table_args__ = (
+        Index(
+            "ix_future_viewings_idempotency_key", "idempotency_key",
+            unique=True, postgresql_where=idempotency_key.isnot(None),
+        ),
+        Index(
+            "ix_future_viewings_pending_created_at", "created_at",
+            postgresql_where=status == ProcessingStatus.PENDING,
+        ),
+    )
 
     def to_dict(self):
         """
@@ -105,4 +124,8 @@ class ScreenViewings(Base):
     screen_id = Column(UUID(as_uuid=True), ForeignKey("screens.id"), nullable=False)
     viewed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
-    __table_args__ = (UniqueConstraint('future_viewing_id', 'screen_id', name='_future_viewing_screen_uc'),)
+    __table_args__ = (
+        UniqueConstraint('future_viewing_id', 'screen_id', name='_future_viewing_screen_uc'),
+        # Lo mostrado recientemente en cada pantalla (sincronización del índice en memoria)
+        Index("ix_screen_viewings_screen_id_viewed_at", "screen_id", "viewed_at"),
+    )
@@ -0,0 +1,200 @@
+import asyncio
+import hmac
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from types import CodeType, FrameType
+
+import anyio.to_thread
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+
+from .metrics import EVENT_LOOP_LAG, EVENT_LOOP_STALLS
+
+logger = logging.getLogger(__name__)
+
+# Cada cuánto se mide el retraso del event loop (0 desactiva el monitor)
+LOOP_LAG_SAMPLE_INTERVAL_MS = float(os.getenv("LOOP_LAG_SAMPLE_INTERVAL_MS", "100"))
+# Un bloqueo del loop más largo que esto se registra con la pila que lo causa (0 desactiva el watchdog)
+LOOP_STALL_THRESHOLD_MS = float(os.getenv("LOOP_STALL_THRESHOLD_MS", "250"))
+# Sin token el endpoint del profiler está desactivado (404)
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN")
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+PROFILER_DEFAULT_INTERVAL_MS = float(os.getenv("PROFILER_DEFAULT_INTERVAL_MS", "10"))
+# Profundidad máxima de pila que se recorre por muestra
+PROFILER_MAX_DEPTH = 128
+
+_labels: dict[CodeType, str] = {}
+# Prefijos de sys.path de más largo a más corto, para acortar las rutas de los frames
+_path_prefixes = sorted({os.path.join(os.path.abspath(p), "") for p in sys.path if p}, key=len, reverse=True)
+
+
+def _frame_label(code: CodeType) -> str:
+    label = _labels.get(code)
+    if label is None:
+        filename = code.co_filename
+        for prefix in _path_prefixes:
+            if filename.startswith(prefix):
+                filename = filename[len(prefix):]
+                break
+        # El formato colapsado separa los frames con ";" (el contador va tras el último espacio)
+        label = f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+        _labels[code] = label
+    return label
+
+
+def collapse_stack(frame: FrameType | None) -> str:
+    """Renders a thread's stack as one collapsed-stack line body: outermost frame first, `;`-separated."""
+    labels = []
+    while frame is not None and len(labels) < PROFILER_MAX_DEPTH:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def sample_stacks(thread_id: int, seconds: float, interval: float) -> Counter:
+    """
+    Samples a thread's Python stack every `interval` seconds for `seconds` seconds.
+
+    Meant to run on its own thread: each sample only reads `sys._current_frames()` and walks
+    the target thread's frames, so the profiled thread is never paused or instrumented.
+
+    Returns:
+        Counter: Collapsed stack -> number of samples in which the thread was there.
+    """
+    stacks: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    next_sample = time.monotonic()
+    while next_sample < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            break
+        stacks[collapse_stack(frame)] += 1
+        del frame
+        next_sample += interval
+        delay = next_sample - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_sample = time.monotonic()  # Muestreo atrasado: no se recuperan las muestras perdidas
+    return stacks
+
+
+class LoopMonitor:
+    """
+    Measures how late the event loop runs its callbacks and reports what blocks it.
+
+    A task sleeps `interval` seconds at a time and records how much later than that it woke up
+    in EVENT_LOOP_LAG. That only tells after the fact that the loop was blocked, so a watchdog
+    thread also checks the task's heartbeat: when it is more than `stall_threshold` seconds late,
+    the loop thread is still stuck, and the watchdog logs its current stack (once per stall).
+    """
+
+    def __init__(self, interval: float, stall_threshold: float):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.loop_thread_id: int | None = None
+        self._heartbeat = time.monotonic()
+        self._reported_heartbeat: float | None = None
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    async def _sample_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            self._heartbeat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            EVENT_LOOP_LAG.observe(max(loop.time() - start - self.interval, 0.0))
+
+    def _watch(self) -> None:
+        while not self._stop.wait(min(self.stall_threshold / 4, 0.1)):
+            heartbeat = self._heartbeat
+            late = time.monotonic() - heartbeat - self.interval
+            if late < self.stall_threshold or heartbeat == self._reported_heartbeat:
+                continue
+            self._reported_heartbeat = heartbeat
+            frame = sys._current_frames().get(self.loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            del frame
+            EVENT_LOOP_STALLS.inc()
+            logger.warning(
+                "Event loop bloqueado desde hace %.0f ms", late * 1000,
+                extra={"lag_ms": round(late * 1000, 1), "stack": stack},
+            )
+
+    def start(self) -> None:
+        """Starts the lag sampler on the running loop and, if enabled, the watchdog thread."""
+        if self.interval <= 0:
+            return
+        self.loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.create_task(self._sample_lag(), name="loop_lag_monitor")
+        if self.stall_threshold > 0:
+            self._stop.clear()
+            self._watchdog = threading.Thread(target=self._watch, name="loop_watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self) -> None:
+        if self._watchdog is not None:
+            self._stop.set()
+            self._watchdog = None
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+loop_monitor = LoopMonitor(LOOP_LAG_SAMPLE_INTERVAL_MS / 1000, LOOP_STALL_THRESHOLD_MS / 1000)
+_profile_running = threading.Lock()
+
+
+async def profile_endpoint(request: Request) -> Response:
+    """
+    Samples the event loop thread for a while and returns the stacks in collapsed format
+    (`frame;frame;frame count` per line), ready for flamegraph.pl or speedscope.
+
+    Requires `Authorization: Bearer <PROFILER_TOKEN>`; without PROFILER_TOKEN the endpoint does
+    not exist. Query parameters: `seconds` (default 10, at most PROFILER_MAX_SECONDS) and
+    `interval_ms` (default PROFILER_DEFAULT_INTERVAL_MS). Samples where the loop waits in
+    `select` are idle time.
+
+    Args:
+        request (Request): The incoming Starlette request.
+
+    Returns:
+        Response: The collapsed stacks as text; 400 for invalid parameters, 401 for a wrong token,
+                  404 when the profiler is disabled and 409 while another profile is running.
+    """
+    if not PROFILER_TOKEN:
+        return PlainTextResponse("Not Found", status_code=404)
+    authorization = request.headers.get("authorization", "")
+    if not hmac.compare_digest(authorization.encode(), f"Bearer {PROFILER_TOKEN}".encode()):
+        return PlainTextResponse("Unauthorized", status_code=401, headers={"www-authenticate": "Bearer"})
+    try:
+        seconds = float(request.query_params.get("seconds", "10"))
+        interval_ms = float(request.query_params.get("interval_ms", PROFILER_DEFAULT_INTERVAL_MS))
+    except ValueError:
+        return PlainTextResponse("seconds and interval_ms must be numbers.", status_code=400)
+    if not 0 < seconds <= PROFILER_MAX_SECONDS or not 1 <= interval_ms <= 1000:
+        return PlainTextResponse(
+            f"seconds must be in (0, {PROFILER_MAX_SECONDS:g}] and interval_ms in [1, 1000].", status_code=400
+        )
+    if not _profile_running.acquire(blocking=False):
+        return PlainTextResponse("A profile is already running.", status_code=409)
+    try:
+        logger.info("Perfilando el event loop durante %.1f s (cada %.1f ms)", seconds, interval_ms)
+        stacks = await anyio.to_thread.run_sync(
+            sample_stacks, threading.get_ident(), seconds, interval_ms / 1000
+        )
+    finally:
+        _profile_running.release()
+    body = "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+    return PlainTextResponse(
+        body, headers={"cache-control": "no-store", "x-profile-samples": str(sum(stacks.values()))}
+    )
@@ -1,11 +1,16 @@
 import uuid  # Added for screenId conversion
-from ariadne import QueryType, MutationType, EnumType, make_executable_schema, gql
+from ariadne import QueryType, MutationType, ObjectType, EnumType, make_executable_schema, gql
 from graphql import GraphQLError
 from sqlalchemy.ext.asyncio import AsyncSession
 from .db import get_db_session, AsyncSessionLocal  # Importar el generador de sesión
 from . import crud
+from .feed import screen_feed
+from .cursors import decode_cursor
 from .models import ProcessingStatus as PyProcessingStatus, FutureViewing as ModelFutureViewing
-from .background import enqueue_image_generation
+from .background import (
+    enqueue_image_generation, check_admission, job_tracker, QueueFullError,
+    ShuttingDownError, INSTANCE_ID, JobPriority,
+)
 
 # Cargar la definición del esquema desde un string
 # (Podrías también cargarlo desde un archivo .graphql)
@@ -26,12 +31,22 @@ type_defs = gql("""
         createdAt: DateTime!
         imageUrl: String
         status: ProcessingStatus!
+        # Position in the image generation queue of the server that accepted it: 0 while the
+        # image is being generated, 1 for the next job, and so on. Null when not waiting here.
+        queuePosition: Int
+        # Estimated time the image will be ready, from the measured worker throughput.
+        estimatedReadyAt: DateTime
+        # Screens this viewing has been shown on, in the order they showed it.
+        shownOn: [Screen!]!
     }
 
     input AddFutureViewingInput {
         name: String!
         age: Int!
         content: String!
+        # Optional client-generated key (e.g. a UUID), at most 128 characters. Retrying with the
+        # same key returns the original FutureViewing instead of creating and generating another.
+        idempotencyKey: String
     }
 
     type AddFutureViewingPayload {
@@ -39,6 +54,10 @@ type_defs = gql("""
         # Puedes añadir userErrors aquí si implementas validación más compleja
     }
 
+    type RetryFutureViewingPayload {
+        futureViewing: FutureViewing
+    }
+
     # Input type for registering a new screen.
     input RegisterScreenInput {
         # Optional friendly name for the screen.
@@ -53,6 +72,22 @@ type_defs = gql("""
         name: String
         # Timestamp of when the screen was registered.
         createdAt: DateTime!
+        # What the screen has displayed, most recent first. `after` takes the endCursor of
+        # the previous page.
+        viewings(first: Int = 20, after: String): ScreenViewingConnection!
+    }
+
+    # A FutureViewing shown on a screen.
+    type ScreenViewingEdge {
+        viewedAt: DateTime!
+        cursor: String!
+        futureViewing: FutureViewing!
+    }
+
+    type ScreenViewingConnection {
+        edges: [ScreenViewingEdge!]!
+        endCursor: String
+        hasNextPage: Boolean!
     }
 
     # Payload type for the registerScreen mutation.
@@ -73,10 +108,16 @@ type_defs = gql("""
             page: Int = 1,
             pageSize: Int = 20
         ): [FutureViewing!]!
+        # Every registered screen, oldest first.
+        screens: [Screen!]!
+        # A single screen, or null if the ID is unknown.
+        screen(id: ID!): Screen
     }
 
     type Mutation {
         addFutureViewing(input: AddFutureViewingInput!): AddFutureViewingPayload!
+        # Generates the image of a FAILED FutureViewing again, behind live submissions.
+        retryFutureViewing(id: ID!): RetryFutureViewingPayload!
         # Mutation to register a new screen.
         registerScreen(input: RegisterScreenInput!): RegisterScreenPayload!
     }
@@ -101,6 +142,8 @@ async def resolve_recent_future_viewings(_, info, screenId, page=1, pageSize=20)
     Fetches FutureViewing items that are completed, created in the last 24 hours,
     and not yet viewed on the specified screen. It then marks these items as viewed
     on that screen by creating ScreenViewings entries.
+    Served from the in-memory screen feed (app/feed.py) once it is loaded, and from
+    the database otherwise or when SCREEN_FEED_MODE is "database".
     Handles potential ValueError if screenId is not a valid UUID, raising GraphQLError.
 
     Args:
@@ -116,21 +159,92 @@ async def resolve_recent_future_viewings(_, info, screenId, page=1, pageSize=20)
     Raises:
         GraphQLError: If the provided screenId is not a valid UUID.
     """
-    async with AsyncSessionLocal() as db:
-        try:
-            screen_id_uuid = uuid.UUID(screenId)
-        except ValueError:
-            raise GraphQLError("Invalid screenId format. Please provide a valid UUID.")
+    try:
+        screen_id_uuid = uuid.UUID(screenId)
+    except ValueError:
+        raise GraphQLError("Invalid screenId format. Please provide a valid UUID.")
 
+    viewings = await screen_feed.poll(screen_id_uuid, page=page, page_size=pageSize)
+    if viewings is not None:
+        return viewings
+
+    async with AsyncSessionLocal() as db:
         viewings = await crud.get_recent_future_viewings_and_mark_viewed(
             db, screen_id=screen_id_uuid, page=page, page_size=pageSize
         )
         return [v.to_dict() for v in viewings]
 
 
+@query.field("screens")
+async def resolve_screens(_, info):
+    """
+    Resolves the `screens` GraphQL query.
+
+    Returns:
+        list[dict]: Every registered Screen (as dictionaries via to_dict()), oldest first.
+    """
+    async with AsyncSessionLocal() as db:
+        screens = await crud.get_screens(db)
+        return [s.to_dict() for s in screens]
+
+
+@query.field("screen")
+async def resolve_screen(_, info, id):
+    """
+    Resolves the `screen` GraphQL query.
+
+    Args:
+        _ : The parent object, typically not used in root resolvers.
+        info: GraphQL resolve info.
+        id (str): The ID of the screen.
+
+    Returns:
+        dict | None: The Screen (as a dictionary via to_dict()), or None if it does not exist.
+    Raises:
+        GraphQLError: If the provided id is not a valid UUID.
+    """
+    try:
+        screen_id = uuid.UUID(id)
+    except ValueError:
+        raise GraphQLError("Invalid id format. Please provide a valid UUID.") from None
+    async with AsyncSessionLocal() as db:
+        screen = await crud.get_screen_by_id(db, screen_id)
+        return screen.to_dict() if screen else None
+
+
 # Tipos de Mutation
 mutation = MutationType()
 
+# Debe coincidir con la longitud de la columna future_viewings.idempotency_key
+MAX_IDEMPOTENCY_KEY_LENGTH = 128
+# Cabecera con la que un kiosco se identifica para el reparto justo de la cola de imágenes
+CLIENT_ID_HEADER = "X-Client-Id"
+MAX_CLIENT_ID_LENGTH = 100
+
+
+def _job_source(info) -> str:
+    """Kiosk or client identity for the image queue: the X-Client-Id header, or else the client IP."""
+    request = info.context["request"]
+    client_id = request.headers.get(CLIENT_ID_HEADER)
+    if client_id:
+        return client_id[:MAX_CLIENT_ID_LENGTH]
+    return request.client.host if request.client else "unknown"
+
+
+def _admit_image_job(source: str) -> None:
+    """Runs check_admission and turns its errors into GraphQL errors with a code."""
+    try:
+        check_admission(source)
+    except QueueFullError as e:
+        raise GraphQLError(
+            "The image generation queue is full. Please retry later.",
+            extensions={"code": "QUEUE_FULL", "retryAfterSeconds": round(e.retry_after_seconds, 1)},
+        ) from None
+    except ShuttingDownError:
+        raise GraphQLError(
+            "The server is shutting down. Please retry.", extensions={"code": "SHUTTING_DOWN"}
+        ) from None
+
 
 @mutation.field("addFutureViewing")
 async def resolve_add_future_viewing(_, info, input):
@@ -139,31 +253,96 @@ async def resolve_add_future_viewing(_, info, input):
 
     Creates a new FutureViewing record based on the provided input,
     and enqueues a background task for image generation.
+    When the input carries an `idempotencyKey` already used by an earlier request, the
+    original FutureViewing is returned and no new image generation is enqueued.
 
     Args:
         _ : The parent object, typically not used in root resolvers.
         info: GraphQL resolve info, contains context like the db session.
         input (dict): A dictionary containing the input fields for the new
-                      FutureViewing (name, age, content).
+                      FutureViewing (name, age, content, optional idempotencyKey).
 
     Returns:
-        dict: A payload containing the newly created FutureViewing object
-              (as a dictionary via to_dict()).
+        dict: A payload containing the newly created (or, for a retry, the original)
+              FutureViewing object (as a dictionary via to_dict()).
+    Raises:
+        GraphQLError: If the idempotencyKey is empty or longer than 128 characters, or
+                      with code QUEUE_FULL when the image queue is full and
+                      IMAGE_QUEUE_FULL_POLICY is "reject", or SHUTTING_DOWN while the
+                      server drains its image jobs. Retries of an already accepted key
+                      are never rejected for these two reasons.
     """
-    async with AsyncSessionLocal() as db:
-        name = input["name"]
-        age = input["age"]
-        content = input["content"]
-
-        fv = await crud.create_future_viewing(db, name=name, age=age, content=content)
+    source = _job_source(info)
+    name = input["name"]
+    age = input["age"]
+    content = input["content"]
+    idempotency_key = input.get("idempotencyKey")
+    if idempotency_key is not None and not 0 < len(idempotency_key) <= MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise GraphQLError(
+            f"Invalid idempotencyKey. It must have between 1 and {MAX_IDEMPOTENCY_KEY_LENGTH} characters."
+        )
 
-        # Encolar la tarea de generación de imagen
+    async with AsyncSessionLocal() as db:
+        if idempotency_key is not None:
+            # Un reintento de una petición ya aceptada recibe su fila aunque la cola esté llena
+            # o el servidor se esté apagando: la admisión solo aplica a filas nuevas
+            existing = await crud.get_future_viewing_by_idempotency_key(db, idempotency_key)
+            if existing is not None:
+                return {"futureViewing": existing.to_dict()}
+        _admit_image_job(source)
+
+        if idempotency_key is None:
+            fv = await crud.create_future_viewing(db, name=name, age=age, content=content, claimed_by=INSTANCE_ID)
+            created = True
+        else:
+            # Dos primeras peticiones simultáneas con la misma clave siguen creando una sola fila
+            fv, created = await crud.create_future_viewing_idempotent(
+                db, name=name, age=age, content=content, idempotency_key=idempotency_key,
+                claimed_by=INSTANCE_ID,
+            )
+
+        # Encolar la tarea de generación de imagen (un reintento con la misma clave no genera otra)
         # Pasa el ID como string porque es más fácil de serializar si fuera necesario para colas externas
-        await enqueue_image_generation(str(fv.id), fv.name, fv.age, fv.content)
+        if created:
+            await enqueue_image_generation(str(fv.id), fv.name, fv.age, fv.content, source)
 
         return {"futureViewing": fv.to_dict()}
 
 
+@mutation.field("retryFutureViewing")
+async def resolve_retry_future_viewing(_, info, id):
+    """
+    Resolves the `retryFutureViewing` GraphQL mutation.
+
+    Puts a FAILED FutureViewing back to PENDING and enqueues its image generation in the
+    low-priority lane, so retries never delay live submissions for long.
+
+    Args:
+        _ : The parent object, typically not used in root resolvers.
+        info: GraphQL resolve info, contains context like the request.
+        id (str): The ID of the FutureViewing to retry.
+
+    Returns:
+        dict: A payload containing the FutureViewing, now PENDING (as a dictionary via to_dict()).
+    Raises:
+        GraphQLError: If the ID is invalid or the FutureViewing does not exist or is not FAILED,
+                      or with code QUEUE_FULL / SHUTTING_DOWN as in addFutureViewing.
+    """
+    try:
+        fv_id = str(uuid.UUID(id))
+    except ValueError:
+        raise GraphQLError("Invalid id format. Please provide a valid UUID.") from None
+    source = _job_source(info)
+    _admit_image_job(source)
+
+    async with AsyncSessionLocal() as db:
+        fv = await crud.reset_failed_future_viewing(db, fv_id, claimed_by=INSTANCE_ID)
+    if fv is None:
+        raise GraphQLError(f"FutureViewing {id} does not exist or is not FAILED.")
+    await enqueue_image_generation(fv_id, fv.name, fv.age, fv.content, source, JobPriority.LOW)
+    return {"futureViewing": fv.to_dict()}
+
+
 @mutation.field("registerScreen")
 async def resolve_register_screen(_, info, input):
     """
@@ -188,10 +367,50 @@ async def resolve_register_screen(_, info, input):
         return {"screen": registered_screen.to_dict()}
 
 
+# Campos calculados de FutureViewing (posición en la cola y hora estimada)
+future_viewing = ObjectType("FutureViewing")
+
+
+@future_viewing.field("queuePosition")
+def resolve_queue_position(obj, info):
+    return job_tracker.position(obj["id"])
+
+
+@future_viewing.field("estimatedReadyAt")
+def resolve_estimated_ready_at(obj, info):
+    ready_at = job_tracker.estimated_ready_at(obj["id"])
+    return ready_at.isoformat() if ready_at else None
+
+
+# Relaciones entre pantallas y viewings. Los resolvers no son async: devuelven el futuro del
+# DataLoader de la petición, así todos los elementos de una lista piden su clave en la misma
+# pasada y se resuelven con una sola consulta por nivel.
+@future_viewing.field("shownOn")
+def resolve_shown_on(obj, info):
+    return info.context["loaders"].shown_on.load(uuid.UUID(obj["id"]))
+
+
+screen_type = ObjectType("Screen")
+# Máximo de viewings por página en Screen.viewings
+MAX_SCREEN_VIEWINGS_PAGE = 100
+
+
+@screen_type.field("viewings")
+def resolve_screen_viewings(obj, info, first=20, after=None):
+    if not 0 < first <= MAX_SCREEN_VIEWINGS_PAGE:
+        raise GraphQLError(f"first must be between 1 and {MAX_SCREEN_VIEWINGS_PAGE}.")
+    if after is not None:
+        try:
+            decode_cursor(after)
+        except ValueError:
+            raise GraphQLError("Invalid after cursor.") from None
+    return info.context["loaders"].screen_viewings.load((uuid.UUID(obj["id"]), first, after))
+
+
 # EnumType para mapear el enum de Python al de GraphQL
 # El nombre 'ProcessingStatus' debe coincidir con el nombre del enum en tu `type_defs`
 processing_status_enum = EnumType("ProcessingStatus", PyProcessingStatus)
 
 # Crear el esquema ejecutable
 # Asegúrate de incluir todos los QueryType, MutationType, y EnumType que definas.
-schema = make_executable_schema(type_defs, query, mutation, processing_status_enum)
\ No newline at end of file
+schema = make_executable_schema(type_defs, query, mutation, future_viewing, screen_type, processing_status_enum)
\ No newline at end of file
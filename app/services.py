@@ -1,12 +1,11 @@
 import os
 import uuid
+import logging
 import aiofiles
-from google import genai
-from google.genai import types
-from PIL import Image
-from io import BytesIO
-import openai
 from dotenv import load_dotenv
+from .metrics import observe_provider_call
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
@@ -15,33 +14,30 @@ STATIC_FILES_DIR = os.getenv("STATIC_FILES_DIR", "static")  # Directorio base pa
 IMAGES_SUBDIR = os.getenv("IMAGES_SUBDIR", "images")  # Subdirectorio para imágenes
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")  # Si se usa Google API, aunque no se usa aquí
 
-if not OPENAI_API_KEY:
-    # print("Advertencia: OPENAI_API_KEY no está configurada. La generación de imágenes fallará.")
-    raise ValueError("No OPENAI_API_KEY set") # Opcional: lanzar error si es crítico
+IMAGES_SAVE_PATH = os.path.join(STATIC_FILES_DIR, IMAGES_SUBDIR)
 
-if not GOOGLE_API_KEY:
-    # print("Advertencia: GOOGLE_API_KEY no está configurada. La generación de imágenes con Google fallará.")
-    raise ValueError("No GOOGLE_API_KEY set")  # Opcional: lanzar error si es crítico
 
-# Asegurarse de que el directorio de imágenes exista
-IMAGES_SAVE_PATH = os.path.join(STATIC_FILES_DIR, IMAGES_SUBDIR)
-os.makedirs(IMAGES_SAVE_PATH, exist_ok=True)
+def _ensure_images_dir() -> None:
+    # Se crea al guardar la primera imagen, no al importar el módulo
+    os.makedirs(IMAGES_SAVE_PATH, exist_ok=True)
 
 
 class OpenAIImageGenerator:
     def __init__(self):
         if OPENAI_API_KEY:
+            import openai  # Importación diferida: el SDK tarda cientos de ms en cargarse
             self.client = openai.OpenAI(api_key=OPENAI_API_KEY)
         else:
             self.client = None  # No se puede operar sin API key
 
+    @observe_provider_call
     async def generate_image(self, name: str, age: int, content: str, future_viewing_id: uuid.UUID) -> str | None:
         if not self.client:
-            print("Cliente OpenAI no inicializado debido a falta de API key.")
+            logger.error("Cliente OpenAI no inicializado debido a falta de API key.")
             return None
 
         prompt = f"Imagen para {name} de {age} años que se imagina el futuro de la siguiente forma: {content}"
-        print(f"Generando imagen con prompt: {prompt}")
+        logger.debug("Generando imagen", extra={"viewing_id": str(future_viewing_id), "prompt_chars": len(prompt)})
         try:
             response = await self.client.images.generate(
                 model="dall-e-3",
@@ -61,6 +57,7 @@ class OpenAIImageGenerator:
 
             file_name = f"{str(future_viewing_id)}.png"
             file_path = os.path.join(IMAGES_SAVE_PATH, file_name)
+            _ensure_images_dir()
 
             async with aiofiles.open(file_path, "wb") as f:
                 await f.write(image_bytes)
@@ -71,31 +68,33 @@ class OpenAIImageGenerator:
             # Si tu servidor sirve `static/images` como `/images`, entonces sería:
             # image_url = f"/images/{file_name}"
             image_url = f"/{STATIC_FILES_DIR}/{IMAGES_SUBDIR}/{file_name}"
-            print(f"Imagen guardada en: {file_path}, URL relativa: {image_url}")
+            logger.info("Imagen guardada", extra={"viewing_id": str(future_viewing_id), "file_path": file_path})
             return image_url
 
         except Exception as e:
-            print(f"Error generando imagen para {future_viewing_id}: {e}")
+            logger.error("Error generando imagen: %s", e, extra={"viewing_id": str(future_viewing_id)})
             return None
 
 
 class GeminiImageGenerator:
     def __init__(self):
         if GOOGLE_API_KEY:
+            from google import genai  # Importación diferida: el SDK tarda cientos de ms en cargarse
             self.client = genai.Client()
         else:
-            print(f"Error initializing Gemini client: GOOGLE_API_KEY not set.")
+            logger.error("Error initializing Gemini client: GOOGLE_API_KEY not set.")
             self.client = None
 
+    @observe_provider_call
     async def generate_image(self, name: str, age: int, content: str, future_viewing_id: uuid.UUID) -> str | None:
         if not self.client:
-            print("Gemini client not initialized due to missing or invalid API key.")
+            logger.error("Gemini client not initialized due to missing or invalid API key.")
             return None
 
         prompt = (
             f"Imagen para {name} de {age} años que se imagina el futuro así: {content}. "
         )
-        print(f"Generando imagen con prompt: {prompt}")
+        logger.debug("Generando imagen", extra={"viewing_id": str(future_viewing_id), "prompt_chars": len(prompt)})
 
         try:
             response = await self.client.aio.models.generate_images(
@@ -110,23 +109,49 @@ class GeminiImageGenerator:
         )
 
             if not response.generated_images:
-                print("No images generated.")
+                logger.warning("No images generated.", extra={"viewing_id": str(future_viewing_id)})
                 # raise Exception("No images generated by Gemini.")
 
             for generated_image in response.generated_images:
                 file_name = f"{str(future_viewing_id)}.png"
                 file_path = os.path.join(IMAGES_SAVE_PATH, file_name)
+                _ensure_images_dir()
                 async with aiofiles.open(file_path, "wb") as f:
                     await f.write(generated_image.image.image_bytes)
 
                 image_url = f"/{STATIC_FILES_DIR}/{IMAGES_SUBDIR}/{file_name}"
-                print(f"Imagen guardada en: {file_path}, URL relativa: {image_url}")
+                logger.info("Imagen guardada", extra={"viewing_id": str(future_viewing_id), "file_path": file_path})
                 return image_url
 
 
         except Exception as e:
-            print(f"Error generando imagen para {future_viewing_id}: {e}")
+            logger.error("Error generando imagen: %s", e, extra={"viewing_id": str(future_viewing_id)})
             return None
 
-# Instancia global o inyectada donde se necesite
-image_generator = GeminiImageGenerator()
\ No newline at end of file
+# Instancia global, creada en el primer uso para que importar este módulo no cargue el SDK
+_image_generator: GeminiImageGenerator | None = None
+
+
+def ensure_image_provider_configured() -> None:
+    """
+    Checks the provider settings without loading its SDK.
+
+    Raises:
+        ValueError: If GOOGLE_API_KEY is not set.
+    """
+    if not GOOGLE_API_KEY:
+        raise ValueError("No GOOGLE_API_KEY set")
+
+
+def get_image_generator() -> GeminiImageGenerator:
+    """
+    Returns the shared image generator, importing the SDK and creating its client on first use.
+
+    Raises:
+        ValueError: If GOOGLE_API_KEY is not set.
+    """
+    global _image_generator
+    if _image_generator is None:
+        ensure_image_provider_configured()
+        _image_generator = GeminiImageGenerator()
+    return _image_generator
@@ -0,0 +1,256 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from ariadne.types import Extension
+from graphql import GraphQLResolveInfo
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Umbrales del log de consultas/operaciones lentas, en milisegundos
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_OPERATION_MS = float(os.getenv("SLOW_OPERATION_MS", "500"))
+# Número de ejecuciones de una misma sentencia en una operación a partir del cual se avisa (patrón N+1)
+REPEATED_STATEMENT_THRESHOLD = int(os.getenv("REPEATED_STATEMENT_THRESHOLD", "10"))
+# Archivo donde se exportan los spans en formato OTLP/JSON (una línea por operación). Vacío lo desactiva.
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+# Máximo de spans SQL guardados por operación
+MAX_SQL_SPANS = 500
+MAX_STATEMENT_LENGTH = 2000
+
+
+def _new_id(n_bytes: int) -> str:
+    return os.urandom(n_bytes).hex()
+
+
+def _attributes(values: dict) -> list[dict]:
+    """Encodes a dict as OTLP/JSON attributes."""
+    attributes = []
+    for key, value in values.items():
+        if isinstance(value, bool):
+            attributes.append({"key": key, "value": {"boolValue": value}})
+        elif isinstance(value, int):
+            attributes.append({"key": key, "value": {"intValue": str(value)}})
+        elif isinstance(value, float):
+            attributes.append({"key": key, "value": {"doubleValue": value}})
+        else:
+            attributes.append({"key": key, "value": {"stringValue": str(value)}})
+    return attributes
+
+
+class OperationTrace:
+    """
+    SQL activity attributed to one GraphQL operation.
+
+    Attributes:
+        name (str): Operation type and name, or its root fields when it is anonymous.
+        statements (int): Number of SQL statements executed.
+        db_time_ns (int): Total time spent in cursor execution, in nanoseconds.
+        rows (int): Rows returned or affected, as reported by the driver.
+    """
+
+    def __init__(self):
+        self.trace_id = _new_id(16)
+        self.span_id = _new_id(8)
+        self.name = ""
+        self.root_fields: list[str] = []
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.statements = 0
+        self.db_time_ns = 0
+        self.rows = 0
+        self.statement_counts: Counter[str] = Counter()
+        self.sql_spans: list[dict] = []
+
+    def record_statement(self, statement: str, start_ns: int, duration_ns: int, rows: int) -> None:
+        self.statements += 1
+        self.db_time_ns += duration_ns
+        self.rows += rows
+        self.statement_counts[statement] += 1
+        if TRACE_EXPORT_PATH and len(self.sql_spans) < MAX_SQL_SPANS:
+            self.sql_spans.append({
+                "traceId": self.trace_id,
+                "spanId": _new_id(8),
+                "parentSpanId": self.span_id,
+                "name": statement.split(None, 1)[0].upper() if statement else "SQL",
+                "kind": 3,  # SPAN_KIND_CLIENT
+                "startTimeUnixNano": str(start_ns),
+                "endTimeUnixNano": str(start_ns + duration_ns),
+                "attributes": _attributes({
+                    "db.system": "postgresql",
+                    "db.statement": statement[:MAX_STATEMENT_LENGTH],
+                    "db.rows": rows,
+                }),
+            })
+
+    def repeated_statements(self) -> dict[str, int]:
+        return {
+            statement[:MAX_STATEMENT_LENGTH]: count
+            for statement, count in self.statement_counts.items()
+            if count >= REPEATED_STATEMENT_THRESHOLD
+        }
+
+    def summary(self) -> dict:
+        return {
+            "operation": self.name,
+            "trace_id": self.trace_id,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "statements": self.statements,
+            "db_time_ms": round(self.db_time_ns / 1e6, 3),
+            "rows": self.rows,
+        }
+
+    def to_otlp(self) -> dict:
+        operation_span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name or "graphql",
+            "kind": 2,  # SPAN_KIND_SERVER
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _attributes({
+                "graphql.root_fields": ",".join(self.root_fields),
+                "db.statement_count": self.statements,
+                "db.time_ms": self.db_time_ns / 1e6,
+                "db.rows": self.rows,
+            }),
+        }
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": _attributes({"service.name": "graphql-future-viewings"})},
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [operation_span, *self.sql_spans],
+                }],
+            }]
+        }
+
+
+# Operación GraphQL en curso; la leen los eventos de SQLAlchemy (se propaga a los greenlets)
+current_operation: ContextVar[OperationTrace | None] = ContextVar("current_operation", default=None)
+
+
+class FileSpanExporter:
+    """
+    Appends OTLP/JSON trace batches to a local file, one line per operation.
+
+    Writes happen on a daemon thread so the event loop never blocks on file I/O.
+    The output can be read by the OpenTelemetry Collector `otlpjsonfile` receiver.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: queue.SimpleQueue[dict] = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, payload: dict) -> None:
+        self._queue.put(payload)
+
+    def _run(self) -> None:
+        while True:
+            payload = self._queue.get()
+            try:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(payload) + "\n")
+            except OSError as e:
+                logger.error("Could not write trace to %s: %s", self.path, e)
+
+
+span_exporter = FileSpanExporter(TRACE_EXPORT_PATH) if TRACE_EXPORT_PATH else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_ns", []).append((time.time_ns(), time.perf_counter_ns()))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_ns, start_perf_ns = conn.info["query_start_ns"].pop()
+    duration_ns = time.perf_counter_ns() - start_perf_ns
+    rows = max(getattr(cursor, "rowcount", -1) or 0, 0)
+
+    trace = current_operation.get()
+    if trace is not None:
+        trace.record_statement(statement, start_ns, duration_ns, rows)
+
+    duration_ms = duration_ns / 1e6
+    if duration_ms >= SLOW_QUERY_MS:
+        record = {
+            "event": "slow_query",
+            "operation": trace.name if trace is not None else None,
+            "trace_id": trace.trace_id if trace is not None else None,
+            "duration_ms": round(duration_ms, 3),
+            "rows": rows,
+            "statement": statement[:MAX_STATEMENT_LENGTH],
+        }
+        logger.warning(
+            "Slow SQL statement (%.1f ms, %d rows) in %s: %s",
+            duration_ms, rows, record["operation"] or "-", record["statement"], extra={"slow_query": record},
+        )
+
+
+def install_sql_tracing(engine) -> None:
+    """
+    Registers the cursor execution hooks on an engine (sync or async).
+
+    Every statement is timed; when it runs inside a traced GraphQL operation, its count,
+    time and rows are added to that operation, and statements slower than SLOW_QUERY_MS are logged.
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class SQLTracingExtension(Extension):
+    """
+    Ariadne extension that attributes SQL activity to the GraphQL operation being executed.
+
+    When the operation finishes it logs a structured record if it was slower than
+    SLOW_OPERATION_MS or repeated a statement REPEATED_STATEMENT_THRESHOLD times (N+1
+    patterns), and exports the operation and its SQL statements as spans when
+    TRACE_EXPORT_PATH is set.
+    """
+
+    def __init__(self):
+        self.trace: OperationTrace | None = None
+        self._token = None
+
+    def request_started(self, context) -> None:
+        self.trace = OperationTrace()
+        self._token = current_operation.set(self.trace)
+
+    def resolve(self, next_, obj, info: GraphQLResolveInfo, **kwargs):
+        if info.path.prev is None and self.trace is not None:
+            if not self.trace.root_fields:
+                operation = info.operation
+                self.trace.name = f"{operation.operation.value} {operation.name.value if operation.name else ''}".strip()
+            self.trace.root_fields.append(info.field_name)
+        return next_(obj, info, **kwargs)
+
+    def request_finished(self, context) -> None:
+        trace = self.trace
+        if trace is None:
+            return
+        current_operation.reset(self._token)
+        trace.end_ns = time.time_ns()
+        if trace.name in ("query", "mutation", "subscription", ""):
+            trace.name = f"{trace.name} {','.join(trace.root_fields)}".strip()
+
+        summary = trace.summary()
+        repeated = trace.repeated_statements()
+        if summary["duration_ms"] >= SLOW_OPERATION_MS or repeated:
+            record = {"event": "slow_operation", **summary, "repeated_statements": repeated}
+            logger.warning(
+                "GraphQL operation %s took %.1f ms with %d SQL statements (%.1f ms in DB, %d rows)%s",
+                trace.name, summary["duration_ms"], trace.statements, summary["db_time_ms"], trace.rows,
+                f"; {len(repeated)} statement(s) repeated >= {REPEATED_STATEMENT_THRESHOLD} times" if repeated else "",
+                extra={"slow_operation": record},
+            )
+        if span_exporter is not None:
+            span_exporter.export(trace.to_otlp())
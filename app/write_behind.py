@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime
+
+from .crud import apply_status_updates
+from .db import AsyncSessionLocal
+from .metrics import STATUS_WRITE_BATCH_SIZE
+from .models import ProcessingStatus
+
+logger = logging.getLogger(__name__)
+
+# Resultados de trabajos que comparten un mismo UPDATE: se escribe al llenarse el lote o al
+# pasar este tiempo desde el primer resultado en espera
+STATUS_FLUSH_MAX_BATCH = int(os.getenv("STATUS_FLUSH_MAX_BATCH", "50"))
+STATUS_FLUSH_DELAY_MS = float(os.getenv("STATUS_FLUSH_DELAY_MS", "5"))
+
+
+class StatusWriteBehind:
+    """
+    Coalesces the final status writes of image jobs into batched UPDATEs.
+
+    Workers call `write()` when a job finishes, and the call only returns once the row has been
+    committed, so a job is never acknowledged before its result is durable. Results that arrive
+    within `delay_seconds` of each other, up to `max_batch`, share one
+    `UPDATE ... FROM (VALUES ...)` and one transaction.
+    """
+
+    def __init__(self, max_batch: int, delay_seconds: float):
+        self.max_batch = max(max_batch, 1)
+        self.delay_seconds = delay_seconds
+        self._pending: list[tuple[str, ProcessingStatus, str | None, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._flushes: set[asyncio.Task] = set()
+
+    async def write(self, fv_id: str, status: ProcessingStatus, image_url: str | None = None) -> datetime | None:
+        """
+        Queues the final status of a FutureViewing and waits until it is committed.
+
+        Returns:
+            datetime | None: The FutureViewing's created_at, or None if it no longer exists.
+        Raises:
+            Exception: Whatever the batched UPDATE raised; the row keeps its previous state.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((fv_id, status, image_url, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.delay_seconds, self._flush_now)
+        # shield: si el worker se cancela mientras espera, la escritura del lote sigue su curso
+        return await asyncio.shield(future)
+
+    def _flush_now(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.create_task(self._flush(batch), name="status_write_flush")
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: list[tuple[str, ProcessingStatus, str | None, asyncio.Future]]) -> None:
+        STATUS_WRITE_BATCH_SIZE.observe(len(batch))
+        try:
+            async with AsyncSessionLocal() as db_session:
+                created = await apply_status_updates(
+                    db_session, [(fv_id, status, image_url) for fv_id, status, image_url, _ in batch]
+                )
+        except Exception as e:
+            logger.error("No se pudo guardar un lote de %d resultados de imagen: %s", len(batch), e)
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for fv_id, _, _, future in batch:
+            if not future.done():
+                future.set_result(created.get(uuid.UUID(str(fv_id))))
+
+    async def drain(self) -> None:
+        """Writes whatever is still buffered and waits for every batch in progress (used on shutdown)."""
+        self._flush_now()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+
+status_writer = StatusWriteBehind(STATUS_FLUSH_MAX_BATCH, STATUS_FLUSH_DELAY_MS / 1000)
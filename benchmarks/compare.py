@@ -0,0 +1,96 @@
+"""
+Compares benchmark results against a stored baseline and fails on p95 regressions.
+
+Usage:
+    python -m benchmarks.compare benchmarks/baselines/10000-10.json results.json --tolerance 0.3
+
+Exits with status 1 when any case's p95 is more than `tolerance` slower than the baseline and
+the absolute difference also exceeds `--min-delta-ms` (so run-to-run jitter on very fast
+cases does not fail the gate), and when the current report has cases the baseline lacks: a new
+case is not gated until the baseline is regenerated with it.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def compare(
+    baseline: dict, current: dict, tolerance: float = 0.3, min_delta_ms: float = 2.0
+) -> tuple[list[dict], list[str], list[str]]:
+    """
+    Compares the p95 of every case present in both reports.
+
+    Args:
+        baseline (dict): Report produced by `benchmarks.run` and stored as baseline.
+        current (dict): Report of the run being checked.
+        tolerance (float): Allowed relative p95 increase (0.3 = 30%).
+        min_delta_ms (float): Increases smaller than this many milliseconds never count as regressions.
+
+    Returns:
+        tuple[list[dict], list[str], list[str]]: One row per compared case (with a `regressed`
+        flag), the cases of the current report missing from the baseline (ungated), and the
+        baseline cases missing from the current report (e.g. skipped with `--only`).
+    """
+    base_results = baseline.get("results", {})
+    current_results = current.get("results", {})
+    rows = []
+    for name, base in base_results.items():
+        if name not in current_results:
+            continue
+        base_p95 = base["p95_ms"]
+        current_p95 = current_results[name]["p95_ms"]
+        delta = current_p95 - base_p95
+        ratio = current_p95 / base_p95 if base_p95 else float("inf")
+        rows.append({
+            "case": name,
+            "baseline_p95_ms": base_p95,
+            "current_p95_ms": current_p95,
+            "change": ratio - 1,
+            "regressed": ratio > 1 + tolerance and delta > min_delta_ms,
+        })
+    not_in_baseline = sorted(current_results.keys() - base_results.keys())
+    not_in_current = sorted(base_results.keys() - current_results.keys())
+    return rows, not_in_baseline, not_in_current
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Fail when p95 latencies regress against a baseline.")
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("current", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.3, help="Allowed relative p95 increase.")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="Ignore increases below this many ms.")
+    args = parser.parse_args(argv)
+
+    baseline = json.loads(args.baseline.read_text())
+    current = json.loads(args.current.read_text())
+    if baseline.get("scale") != current.get("scale"):
+        print(f"Warning: comparing different scales {baseline.get('scale')} vs {current.get('scale')}")
+
+    rows, not_in_baseline, not_in_current = compare(baseline, current, args.tolerance, args.min_delta_ms)
+    for row in rows:
+        flag = "REGRESSION" if row["regressed"] else "ok"
+        print(f"{row['case']:55s} {row['baseline_p95_ms']:9.2f} -> {row['current_p95_ms']:9.2f} ms "
+              f"({row['change']:+7.1%})  {flag}")
+    for name in not_in_baseline:
+        print(f"{name:55s} MISSING FROM BASELINE")
+    for name in not_in_current:
+        print(f"{name:55s} not run")
+
+    failed = False
+    regressions = [row["case"] for row in rows if row["regressed"]]
+    if regressions:
+        print(f"\n{len(regressions)} case(s) regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        failed = True
+    if not_in_baseline:
+        print(f"\n{len(not_in_baseline)} case(s) have no baseline; regenerate it with "
+              f"`python -m benchmarks.run --save-baseline`: {', '.join(not_in_baseline)}")
+        failed = True
+    if failed:
+        return 1
+    print("\nNo p95 regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+Profiles the Python CPU spent per call on the hot crud statements, building the SQLAlchemy
+construct on every call versus executing the prebuilt, parameterized statement from app.crud.
+
+Usage:
+    python -m benchmarks.profile_statements --iterations 2000
+
+CPU is measured with time.process_time(), so the time spent waiting for Postgres is excluded
+and the difference between both variants is the client-side work saved per call (statement
+construction, cache-key generation, parameter processing). Every call runs in one transaction
+that is rolled back at the end, so the database is left unchanged.
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _cases(fv_id: uuid.UUID, screen_id: uuid.UUID):
+    """(name, built per call, prebuilt) pairs; each variant returns (statement, params)."""
+    from sqlalchemy import and_, desc, select, update
+    from app import crud
+    from app.models import FutureViewing, ProcessingStatus, ScreenViewings
+
+    since = datetime.now(timezone.utc) - timedelta(hours=24)
+
+    def paginated_built():
+        return select(FutureViewing).order_by(desc(FutureViewing.created_at)).offset(40).limit(20), None
+
+    def recent_built():
+        return (
+            select(FutureViewing)
+            .where(
+                and_(
+                    FutureViewing.status == ProcessingStatus.COMPLETED,
+                    FutureViewing.created_at >= since,
+                    ~select(ScreenViewings.id)
+                    .where(ScreenViewings.future_viewing_id == FutureViewing.id, ScreenViewings.screen_id == screen_id)
+                    .exists(),
+                )
+            )
+            .order_by(desc(FutureViewing.created_at))
+            .offset(0)
+            .limit(20)
+        ), None
+
+    def update_image_built():
+        return (
+            update(FutureViewing)
+            .where(FutureViewing.id == fv_id)
+            .values(image_url="/static/images/profile.png", status=ProcessingStatus.COMPLETED)
+            .returning(FutureViewing)
+        ), None
+
+    def update_status_built():
+        return (
+            update(FutureViewing)
+            .where(FutureViewing.id == fv_id)
+            .values(status=ProcessingStatus.COMPLETED)
+            .returning(FutureViewing)
+        ), None
+
+    return [
+        ("get_future_viewings_paginated", paginated_built,
+         lambda: (crud._PAGINATED_STMT, {"offset": 40, "limit": 20})),
+        ("get_recent_future_viewings (select)", recent_built,
+         lambda: (crud._RECENT_NOT_VIEWED_STMT,
+                  {"since": since, "screen_id": screen_id, "offset": 0, "limit": 20})),
+        ("update_future_viewing_image", update_image_built,
+         lambda: (crud._UPDATE_IMAGE_STMT, {"fv_id": fv_id, "new_image_url": "/static/images/profile.png",
+                                             "new_status": ProcessingStatus.COMPLETED})),
+        ("update_future_viewing_status", update_status_built,
+         lambda: (crud._UPDATE_STATUS_STMT, {"fv_id": fv_id, "new_status": ProcessingStatus.COMPLETED})),
+    ]
+
+
+async def _measure(db, variant, iterations: int) -> tuple[float, float]:
+    """Returns (CPU seconds, wall seconds) per call."""
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for _ in range(iterations):
+        stmt, params = variant()
+        result = await db.execute(stmt, params)
+        result.scalars().all()
+    return (time.process_time() - cpu_start) / iterations, (time.perf_counter() - wall_start) / iterations
+
+
+async def profile(iterations: int, rounds: int) -> list[dict]:
+    from sqlalchemy import func, select
+    from app.db import AsyncSessionLocal, engine
+    from app.logging_config import setup_logging
+    from app.models import FutureViewing, Screens
+
+    setup_logging()
+    rows = []
+    async with AsyncSessionLocal() as db:
+        fv_id = (await db.execute(select(FutureViewing.id).limit(1))).scalar_one_or_none()
+        screen_id = (await db.execute(select(Screens.id).limit(1))).scalar_one_or_none()
+        if fv_id is None or screen_id is None:
+            raise SystemExit("The database is empty; run `python -m benchmarks.seed` first.")
+        for name, built, prebuilt in _cases(fv_id, screen_id):
+            # Calentamiento: caché de compilación de SQLAlchemy y sentencias preparadas de asyncpg
+            await _measure(db, built, 20)
+            await _measure(db, prebuilt, 20)
+            built_cpu, built_wall, pre_cpu, pre_wall = [], [], [], []
+            # Rondas alternadas, para que la deriva de la máquina afecte igual a ambas variantes
+            for _ in range(rounds):
+                cpu, wall = await _measure(db, built, iterations // rounds)
+                built_cpu.append(cpu)
+                built_wall.append(wall)
+                cpu, wall = await _measure(db, prebuilt, iterations // rounds)
+                pre_cpu.append(cpu)
+                pre_wall.append(wall)
+            rows.append({
+                "case": name,
+                "built_cpu_us": min(built_cpu) * 1e6,
+                "prebuilt_cpu_us": min(pre_cpu) * 1e6,
+                "built_wall_us": min(built_wall) * 1e6,
+                "prebuilt_wall_us": min(pre_wall) * 1e6,
+            })
+        await db.rollback()
+    await engine.dispose()
+    return rows
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Per-call Python CPU of built vs prebuilt crud statements.")
+    parser.add_argument("--iterations", type=int, default=2000, help="Calls per variant and case.")
+    parser.add_argument("--rounds", type=int, default=5, help="Alternating rounds the calls are split into.")
+    parser.add_argument("--rate", type=int, default=1000, help="Request rate used to project the CPU saved.")
+    args = parser.parse_args(argv)
+
+    rows = asyncio.run(profile(args.iterations, args.rounds))
+    print(f"{'case':40s} {'built CPU':>11s} {'prebuilt CPU':>13s} {'saved':>9s}   at {args.rate}/s")
+    for row in rows:
+        saved = row["built_cpu_us"] - row["prebuilt_cpu_us"]
+        print(f"{row['case']:40s} {row['built_cpu_us']:8.1f} µs {row['prebuilt_cpu_us']:10.1f} µs "
+              f"{saved:6.1f} µs   {saved * args.rate / 1e4:5.1f}% of a core")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,618 @@
+"""
+Times every crud function directly and every GraphQL resolver end to end through the ASGI app.
+
+Usage:
+    python -m benchmarks.run --iterations 200 --output results.json
+    python -m benchmarks.run --save-baseline
+
+Run it against a database prepared with `python -m benchmarks.seed`. The GraphQL requests go
+through the full Starlette app (routing, Ariadne, extensions, middleware) via httpx's ASGI
+transport, without a network hop and without starting the background workers.
+
+Cases that write (mark viewings as seen, create rows, clear images) undo their changes in an
+untimed teardown, so repeated runs measure the same data.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Awaitable, Callable
+
+# Los logs de la app (incluidos los avisos de operaciones lentas) alteran los tiempos
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASELINES_DIR = Path(__file__).parent / "baselines"
+
+
+@dataclass
+class Case:
+    """
+    One benchmarked operation.
+
+    Attributes:
+        name (str): Stable identifier used to match results against a baseline.
+        run (Callable): The timed coroutine function; receives the benchmark context.
+        setup (Callable | None): Untimed coroutine run before each iteration.
+        teardown (Callable | None): Untimed coroutine run after each iteration.
+    """
+    name: str
+    run: Callable[["BenchContext"], Awaitable[None]]
+    setup: Callable[["BenchContext"], Awaitable[None]] | None = None
+    teardown: Callable[["BenchContext"], Awaitable[None]] | None = None
+
+
+@dataclass
+class BenchContext:
+    session_factory: object
+    client: object
+    rng: random.Random
+    viewing_ids: list[uuid.UUID]
+    screen_ids: list[uuid.UUID]
+    viewings: int
+    screens: int
+    created_viewing_ids: list[uuid.UUID] = field(default_factory=list)
+    created_screen_ids: list[uuid.UUID] = field(default_factory=list)
+    # Estado que la fase `setup` deja a la fase temporizada y `teardown` limpia
+    current: dict = field(default_factory=dict)
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile of already collected samples."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize(samples_s: list[float]) -> dict:
+    samples_ms = [s * 1000 for s in samples_s]
+    return {
+        "n": len(samples_ms),
+        "mean_ms": round(statistics.fmean(samples_ms), 3),
+        "p50_ms": round(percentile(samples_ms, 50), 3),
+        "p95_ms": round(percentile(samples_ms, 95), 3),
+        "p99_ms": round(percentile(samples_ms, 99), 3),
+    }
+
+
+# --- Casos de crud.py ---
+
+async def _crud(ctx: BenchContext, fn, *args, **kwargs):
+    async with ctx.session_factory() as db:
+        return await fn(db, *args, **kwargs)
+
+
+async def _create_future_viewing(ctx):
+    from app import crud
+    fv = await _crud(ctx, crud.create_future_viewing, "Benchmark", 30, "Un robot jardinero en Marte")
+    ctx.created_viewing_ids.append(fv.id)
+
+
+async def _setup_idempotency_key(ctx):
+    ctx.current["idempotency_key"] = f"bench-{uuid.uuid4()}"
+
+
+async def _create_idempotent(ctx):
+    from app import crud
+    fv, _ = await _crud(
+        ctx, crud.create_future_viewing_idempotent, "Benchmark", 30, "Un robot jardinero en Marte",
+        ctx.current["idempotency_key"],
+    )
+    ctx.created_viewing_ids.append(fv.id)
+
+
+async def _setup_idempotent_retry(ctx):
+    from app import crud
+    if "retry_key" not in ctx.current:
+        ctx.current["retry_key"] = f"bench-{uuid.uuid4()}"
+        fv, _ = await _crud(
+            ctx, crud.create_future_viewing_idempotent, "Benchmark", 30, "Un tren magnético", ctx.current["retry_key"]
+        )
+        ctx.created_viewing_ids.append(fv.id)
+
+
+async def _retry_idempotent(ctx):
+    from app import crud
+    await _crud(ctx, crud.create_future_viewing_idempotent, "Benchmark", 30, "Un tren magnético", ctx.current["retry_key"])
+
+
+async def _by_idempotency_key(ctx):
+    from app import crud
+    await _crud(ctx, crud.get_future_viewing_by_idempotency_key, ctx.current["retry_key"])
+
+
+async def _setup_expired_key(ctx):
+    await _setup_idempotency_key(ctx)
+    await _create_idempotent(ctx)
+    ctx.current["older_than"] = datetime.now(timezone.utc)
+
+
+async def _expire_idempotency_keys(ctx):
+    from app import crud
+    await _crud(ctx, crud.expire_idempotency_keys, ctx.current["older_than"])
+
+
+async def _create_batch(ctx, claimed_by: str | None = None, size: int = 20) -> list[uuid.UUID]:
+    from app import crud
+    batch = []
+    for _ in range(size):
+        fv = await _crud(ctx, crud.create_future_viewing, "Benchmark", 30, "Un faro en el desierto", claimed_by=claimed_by)
+        ctx.created_viewing_ids.append(fv.id)
+        batch.append(fv.id)
+    return batch
+
+
+async def _setup_unclaimed_batch(ctx):
+    # Solo las filas de esta iteración son reclamables (las sembradas son anteriores)
+    ctx.current["created_after"] = datetime.now(timezone.utc)
+    await _create_batch(ctx)
+
+
+async def _claim_pending(ctx):
+    from app import crud
+    now = datetime.now(timezone.utc)
+    await _crud(
+        ctx, crud.claim_pending_future_viewings, "benchmark",
+        stale_before=now - timedelta(minutes=2), created_after=ctx.current["created_after"], limit=20,
+    )
+
+
+async def _setup_claimed_batch(ctx):
+    if "claimed_batch" not in ctx.current:
+        ctx.current["claimed_batch"] = await _create_batch(ctx, claimed_by="benchmark")
+
+
+async def _renew_claims(ctx):
+    from app import crud
+    await _crud(ctx, crud.renew_claims, "benchmark", ctx.current["claimed_batch"])
+
+
+async def _setup_release_batch(ctx):
+    await _create_batch(ctx, claimed_by="benchmark-release")
+
+
+async def _release_claims(ctx):
+    from app import crud
+    await _crud(ctx, crud.release_claims, "benchmark-release")
+
+
+async def _get_future_viewing_by_id(ctx):
+    from app import crud
+    await _crud(ctx, crud.get_future_viewing_by_id, ctx.rng.choice(ctx.viewing_ids))
+
+
+async def _setup_own_viewing(ctx):
+    from app import crud
+    fv = await _crud(ctx, crud.create_future_viewing, "Benchmark", 30, "Un tren magnético")
+    ctx.created_viewing_ids.append(fv.id)
+    ctx.current["fv_id"] = fv.id
+
+
+async def _update_future_viewing_image(ctx):
+    from app import crud
+    from app.models import ProcessingStatus
+    fv_id = ctx.current["fv_id"]
+    await _crud(ctx, crud.update_future_viewing_image, fv_id, f"/static/images/{fv_id}.png", ProcessingStatus.COMPLETED)
+
+
+async def _update_future_viewing_status(ctx):
+    from app import crud
+    from app.models import ProcessingStatus
+    await _crud(ctx, crud.update_future_viewing_status, ctx.current["fv_id"], ProcessingStatus.FAILED)
+
+
+async def _setup_status_batch(ctx):
+    ctx.current["batch"] = await _create_batch(ctx)
+
+
+async def _apply_status_updates(ctx):
+    from app import crud
+    from app.models import ProcessingStatus
+    updates = [(fv_id, ProcessingStatus.COMPLETED, f"/static/images/{fv_id}.png") for fv_id in ctx.current["batch"]]
+    await _crud(ctx, crud.apply_status_updates, updates)
+
+
+async def _setup_failed_viewing(ctx):
+    from app import crud
+    from app.models import ProcessingStatus
+    await _setup_own_viewing(ctx)
+    await _crud(ctx, crud.update_future_viewing_status, ctx.current["fv_id"], ProcessingStatus.FAILED)
+
+
+async def _reset_failed_future_viewing(ctx):
+    from app import crud
+    await _crud(ctx, crud.reset_failed_future_viewing, ctx.current["fv_id"], "benchmark")
+
+
+async def _register_screen(ctx):
+    from app import crud
+    screen = await _crud(ctx, crud.register_screen, "Pantalla benchmark")
+    ctx.created_screen_ids.append(screen.id)
+
+
+async def _paginated_first(ctx):
+    from app import crud
+    await _crud(ctx, crud.get_future_viewings_paginated, page=1, page_size=20)
+
+
+async def _paginated_deep(ctx):
+    from app import crud
+    await _crud(ctx, crud.get_future_viewings_paginated, page=max(1, ctx.viewings // 40), page_size=20)
+
+
+async def _setup_screen(ctx):
+    ctx.current["screen_id"] = ctx.rng.choice(ctx.screen_ids)
+    ctx.current["since"] = datetime.now(timezone.utc)
+
+
+async def _undo_screen_viewings(ctx):
+    """Deletes the ScreenViewings created during the iteration so the next one sees the same data."""
+    from sqlalchemy import delete
+    from app.models import ScreenViewings
+    async with ctx.session_factory() as db:
+        await db.execute(
+            delete(ScreenViewings).where(
+                ScreenViewings.screen_id == ctx.current["screen_id"],
+                ScreenViewings.viewed_at >= ctx.current["since"],
+            )
+        )
+        await db.commit()
+
+
+async def _recent_and_mark_viewed(ctx):
+    from app import crud
+    await _crud(ctx, crud.get_recent_future_viewings_and_mark_viewed, screen_id=ctx.current["screen_id"])
+
+
+async def _completed_since(ctx):
+    from app import crud
+    await _crud(ctx, crud.get_completed_future_viewings_since, datetime.now(timezone.utc) - timedelta(hours=24))
+
+
+async def _shown_ids(ctx):
+    from app import crud
+    await _crud(ctx, crud.get_shown_future_viewing_ids, ctx.current["screen_id"],
+                datetime.now(timezone.utc) - timedelta(hours=24))
+
+
+async def _screen_viewings_since(ctx):
+    from app import crud
+    await _crud(ctx, crud.get_screen_viewings_since, ctx.screen_ids, datetime.now(timezone.utc) - timedelta(minutes=1))
+
+
+async def _insert_screen_viewings(ctx):
+    from app import crud
+    now = datetime.now(timezone.utc)
+    rows = [(fv_id, ctx.current["screen_id"], now) for fv_id in ctx.rng.sample(ctx.viewing_ids, min(20, len(ctx.viewing_ids)))]
+    await _crud(ctx, crud.insert_screen_viewings, rows)
+
+
+async def _by_ids(ctx):
+    from app import crud
+    await _crud(ctx, crud.get_future_viewings_by_ids, ctx.rng.sample(ctx.viewing_ids, min(50, len(ctx.viewing_ids))))
+
+
+async def _prefetch(ctx):
+    from app import crud
+    await _crud(ctx, crud.get_future_viewings_for_prefetch, ctx.current["screen_id"], limit=100)
+
+
+async def _existing_ids(ctx):
+    from app import crud
+    await _crud(ctx, crud.get_existing_future_viewing_ids, ctx.rng.sample(ctx.viewing_ids, min(500, len(ctx.viewing_ids))))
+
+
+async def _image_urls(ctx):
+    from app import crud
+    await _crud(ctx, crud.get_future_viewing_image_urls, after_id=ctx.rng.choice(ctx.viewing_ids), limit=1000)
+
+
+async def _screens_for_viewings(ctx):
+    from app import crud
+    await _crud(ctx, crud.get_screens_for_future_viewings, ctx.rng.sample(ctx.viewing_ids, min(100, len(ctx.viewing_ids))))
+
+
+async def _viewings_for_screens(ctx):
+    from app import crud
+    await _crud(ctx, crud.get_viewings_for_screens, ctx.rng.sample(ctx.screen_ids, min(20, len(ctx.screen_ids))), limit=21)
+
+
+async def _screen_by_id(ctx):
+    from app import crud
+    await _crud(ctx, crud.get_screen_by_id, ctx.rng.choice(ctx.screen_ids))
+
+
+async def _get_screens(ctx):
+    from app import crud
+    await _crud(ctx, crud.get_screens)
+
+
+async def _clear_images(ctx):
+    from app import crud
+    await _crud(ctx, crud.clear_future_viewing_images, [ctx.current["fv_id"]])
+
+
+async def _image_recency(ctx):
+    from app import crud
+    await _crud(ctx, crud.get_image_recency, ctx.rng.sample(ctx.viewing_ids, min(500, len(ctx.viewing_ids))))
+
+
+# --- Casos de resolvers (a través de la aplicación ASGI) ---
+
+async def _graphql(ctx: BenchContext, query: str, variables: dict | None = None) -> dict:
+    response = await ctx.client.post("/graphql", json={"query": query, "variables": variables or {}})
+    response.raise_for_status()
+    payload = response.json()
+    if payload.get("errors"):
+        raise RuntimeError(f"GraphQL errors: {payload['errors']}")
+    return payload["data"]
+
+
+async def _gql_future_viewings(ctx):
+    await _graphql(ctx, "query { futureViewings(page: 1, pageSize: 20) { id name age content createdAt imageUrl status } }")
+
+
+async def _gql_future_viewings_shown_on(ctx):
+    await _graphql(ctx, "query { futureViewings(page: 1, pageSize: 100) { id name shownOn { id name } } }")
+
+
+async def _gql_screens_viewings(ctx):
+    await _graphql(
+        ctx,
+        "query { screens { id viewings(first: 10) { edges { viewedAt futureViewing { id name } } hasNextPage } } }",
+    )
+
+
+async def _gql_screen(ctx):
+    await _graphql(
+        ctx,
+        "query($id: ID!) { screen(id: $id) { id name createdAt viewings(first: 10) { edges { viewedAt } hasNextPage } } }",
+        {"id": str(ctx.rng.choice(ctx.screen_ids))},
+    )
+
+
+async def _gql_recent_future_viewings(ctx):
+    await _graphql(
+        ctx,
+        "query($screenId: ID!) { recentFutureViewings(screenId: $screenId) { id name createdAt imageUrl status } }",
+        {"screenId": str(ctx.current["screen_id"])},
+    )
+
+
+async def _setup_feed_screen(ctx):
+    """Warms the in-memory feed and the chosen screen's state outside the timed phase."""
+    from app.feed import screen_feed
+    if not screen_feed.ready:
+        await screen_feed.sync()
+    await _setup_screen(ctx)
+    await screen_feed._screen_state(ctx.current["screen_id"])
+
+
+async def _undo_feed_screen(ctx):
+    """Forgets what the poll marked, so the next iteration sees the same feed."""
+    from app.feed import screen_feed
+    screen_feed._screens.pop(ctx.current["screen_id"], None)
+    screen_feed._pending_rows.clear()
+
+
+async def _gql_add_future_viewing(ctx):
+    data = await _graphql(
+        ctx,
+        "mutation($input: AddFutureViewingInput!) { addFutureViewing(input: $input) { futureViewing { id status } } }",
+        {"input": {"name": "Benchmark", "age": 30, "content": "Una biblioteca infinita"}},
+    )
+    ctx.created_viewing_ids.append(uuid.UUID(data["addFutureViewing"]["futureViewing"]["id"]))
+
+
+async def _gql_retry_future_viewing(ctx):
+    await _graphql(
+        ctx,
+        "mutation($id: ID!) { retryFutureViewing(id: $id) { futureViewing { id status } } }",
+        {"id": str(ctx.current["fv_id"])},
+    )
+
+
+async def _drain_task_queue(ctx):
+    """No worker runs during the benchmark; drop the jobs the mutation enqueued."""
+    from app.background import task_queue
+    while not task_queue.empty():
+        task_queue.get_nowait()
+        task_queue.task_done()
+
+
+async def _gql_register_screen(ctx):
+    data = await _graphql(
+        ctx, "mutation { registerScreen(input: {name: \"Pantalla benchmark\"}) { screen { id } } }"
+    )
+    ctx.created_screen_ids.append(uuid.UUID(data["registerScreen"]["screen"]["id"]))
+
+
+CASES = [
+    Case("crud.create_future_viewing", _create_future_viewing),
+    Case("crud.create_future_viewing_idempotent[new]", _create_idempotent, setup=_setup_idempotency_key),
+    Case("crud.create_future_viewing_idempotent[retry]", _retry_idempotent, setup=_setup_idempotent_retry),
+    Case("crud.get_future_viewing_by_idempotency_key", _by_idempotency_key, setup=_setup_idempotent_retry),
+    Case("crud.expire_idempotency_keys", _expire_idempotency_keys, setup=_setup_expired_key),
+    Case("crud.claim_pending_future_viewings[20]", _claim_pending, setup=_setup_unclaimed_batch),
+    Case("crud.renew_claims[20]", _renew_claims, setup=_setup_claimed_batch),
+    Case("crud.release_claims[20]", _release_claims, setup=_setup_release_batch),
+    Case("crud.get_future_viewing_by_id", _get_future_viewing_by_id),
+    Case("crud.update_future_viewing_image", _update_future_viewing_image, setup=_setup_own_viewing),
+    Case("crud.update_future_viewing_status", _update_future_viewing_status, setup=_setup_own_viewing),
+    Case("crud.apply_status_updates[20]", _apply_status_updates, setup=_setup_status_batch),
+    Case("crud.reset_failed_future_viewing", _reset_failed_future_viewing, setup=_setup_failed_viewing),
+    Case("crud.register_screen", _register_screen),
+    Case("crud.get_future_viewings_paginated[first]", _paginated_first),
+    Case("crud.get_future_viewings_paginated[deep]", _paginated_deep),
+    Case("crud.get_recent_future_viewings_and_mark_viewed", _recent_and_mark_viewed,
+         setup=_setup_screen, teardown=_undo_screen_viewings),
+    Case("crud.get_completed_future_viewings_since[24h]", _completed_since),
+    Case("crud.get_shown_future_viewing_ids", _shown_ids, setup=_setup_screen),
+    Case("crud.get_screen_viewings_since", _screen_viewings_since),
+    Case("crud.insert_screen_viewings[20]", _insert_screen_viewings, setup=_setup_screen, teardown=_undo_screen_viewings),
+    Case("crud.get_future_viewings_by_ids", _by_ids),
+    Case("crud.get_future_viewings_for_prefetch", _prefetch, setup=_setup_screen),
+    Case("crud.get_existing_future_viewing_ids", _existing_ids),
+    Case("crud.get_future_viewing_image_urls", _image_urls),
+    Case("crud.get_screens_for_future_viewings[100]", _screens_for_viewings),
+    Case("crud.get_viewings_for_screens[20]", _viewings_for_screens),
+    Case("crud.get_screen_by_id", _screen_by_id),
+    Case("crud.get_screens", _get_screens),
+    Case("crud.clear_future_viewing_images", _clear_images, setup=_setup_own_viewing),
+    Case("crud.get_image_recency", _image_recency),
+    Case("graphql.futureViewings", _gql_future_viewings),
+    Case("graphql.futureViewings[shownOn]", _gql_future_viewings_shown_on),
+    Case("graphql.screens[viewings]", _gql_screens_viewings),
+    Case("graphql.screen[viewings]", _gql_screen),
+    Case("graphql.recentFutureViewings", _gql_recent_future_viewings,
+         setup=_setup_screen, teardown=_undo_screen_viewings),
+    Case("graphql.recentFutureViewings[memory]", _gql_recent_future_viewings,
+         setup=_setup_feed_screen, teardown=_undo_feed_screen),
+    Case("graphql.addFutureViewing", _gql_add_future_viewing, teardown=_drain_task_queue),
+    Case("graphql.retryFutureViewing", _gql_retry_future_viewing, setup=_setup_failed_viewing,
+         teardown=_drain_task_queue),
+    Case("graphql.registerScreen", _gql_register_screen),
+]
+
+
+async def _run_case(case: Case, ctx: BenchContext, iterations: int, warmup: int) -> list[float]:
+    samples = []
+    for i in range(warmup + iterations):
+        if case.setup:
+            await case.setup(ctx)
+        start = time.perf_counter()
+        await case.run(ctx)
+        elapsed = time.perf_counter() - start
+        if case.teardown:
+            await case.teardown(ctx)
+        if i >= warmup:
+            samples.append(elapsed)
+    return samples
+
+
+async def _cleanup(ctx: BenchContext) -> None:
+    """Removes the rows created by the benchmark."""
+    from sqlalchemy import delete
+    from app.models import FutureViewing, ScreenViewings, Screens
+    async with ctx.session_factory() as db:
+        if ctx.created_viewing_ids:
+            await db.execute(delete(ScreenViewings).where(ScreenViewings.future_viewing_id.in_(ctx.created_viewing_ids)))
+            await db.execute(delete(FutureViewing).where(FutureViewing.id.in_(ctx.created_viewing_ids)))
+        # Filas creadas por addFutureViewing con clave, por si el id no llegó a registrarse
+        await db.execute(delete(FutureViewing).where(FutureViewing.idempotency_key.like("bench-%")))
+        if ctx.created_screen_ids:
+            await db.execute(delete(ScreenViewings).where(ScreenViewings.screen_id.in_(ctx.created_screen_ids)))
+            await db.execute(delete(Screens).where(Screens.id.in_(ctx.created_screen_ids)))
+        await db.commit()
+
+
+async def run_benchmarks(iterations: int = 100, warmup: int = 10, only: str | None = None, random_seed: int = 42) -> dict:
+    """
+    Runs the selected cases against the database in DATABASE_URL.
+
+    Args:
+        iterations (int): Timed iterations per case.
+        warmup (int): Untimed iterations per case, run first.
+        only (str | None): Only run cases whose name contains this substring.
+
+    Returns:
+        dict: Scale, environment and per-case latency summary (p50/p95/p99 in milliseconds).
+    """
+    import httpx
+    from sqlalchemy import func, select, text
+    from starlette.applications import Starlette
+
+    from app import main
+    from app.db import AsyncSessionLocal, engine
+    from app.logging_config import setup_logging
+    from app.models import FutureViewing, Screens
+
+    # Importar app.main ya no configura los logs; sin esto LOG_LEVEL=ERROR no se aplica
+    setup_logging()
+    async with AsyncSessionLocal() as db:
+        viewings = (await db.execute(select(func.count()).select_from(FutureViewing))).scalar_one()
+        screens = (await db.execute(select(func.count()).select_from(Screens))).scalar_one()
+        if not viewings or not screens:
+            raise SystemExit("The database is empty; run `python -m benchmarks.seed` first.")
+        viewing_ids = list((await db.execute(
+            select(FutureViewing.id).order_by(func.random()).limit(10_000)
+        )).scalars())
+        screen_ids = list((await db.execute(select(Screens.id))).scalars())
+        server_version = (await db.execute(text("SHOW server_version"))).scalar_one()
+
+    # Sólo las rutas: sin lifespan, así no arrancan los workers en segundo plano
+    app = Starlette(routes=main.routes)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        ctx = BenchContext(
+            session_factory=AsyncSessionLocal,
+            client=client,
+            rng=random.Random(random_seed),
+            viewing_ids=viewing_ids,
+            screen_ids=screen_ids,
+            viewings=viewings,
+            screens=screens,
+        )
+        results = {}
+        try:
+            for case in CASES:
+                if only and only not in case.name:
+                    continue
+                samples = await _run_case(case, ctx, iterations, warmup)
+                results[case.name] = summarize(samples)
+                r = results[case.name]
+                print(f"{case.name:55s} p50 {r['p50_ms']:8.2f} ms  p95 {r['p95_ms']:8.2f} ms  p99 {r['p99_ms']:8.2f} ms")
+        finally:
+            await _cleanup(ctx)
+    await engine.dispose()
+
+    return {
+        "scale": {"viewings": viewings, "screens": screens},
+        "environment": {
+            "python": platform.python_version(),
+            "postgres": server_version,
+            "machine": platform.machine(),
+            "iterations": iterations,
+            "warmup": warmup,
+        },
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "results": results,
+    }
+
+
+def baseline_path(scale: dict) -> Path:
+    return BASELINES_DIR / f"{scale['viewings']}-{scale['screens']}.json"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the crud and resolver benchmarks.")
+    parser.add_argument("--iterations", type=int, default=100, help="Timed iterations per case.")
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed iterations per case.")
+    parser.add_argument("--only", help="Only run cases whose name contains this text.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store the results as benchmarks/baselines/<viewings>-<screens>.json.")
+    args = parser.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        raise SystemExit("DATABASE_URL must point to the benchmark database.")
+    report = asyncio.run(run_benchmarks(args.iterations, args.warmup, args.only))
+
+    outputs = [Path(args.output)] if args.output else []
+    if args.save_baseline:
+        outputs.append(baseline_path(report["scale"]))
+    for path in outputs:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Results written to {path}")
@@ -0,0 +1,150 @@
+"""
+Seeds a local Postgres database with synthetic data for the benchmark suite.
+
+Usage:
+    python -m benchmarks.seed --viewings 10000 --screens 10 --reset
+
+Rows are loaded with COPY in chunks, so even the 10M-viewing scale loads in minutes and with
+constant memory. Uses DATABASE_URL; never point it at a database you care about.
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import asyncpg
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHUNK_SIZE = 50_000
+STATUSES = ("COMPLETED",) * 8 + ("PENDING", "FAILED")
+_WORDS = (
+    "robots ciudades flotantes océanos bosques energía solar trenes magnéticos estrellas "
+    "colonias marcianas jardines verticales drones música holográfica bibliotecas infinitas"
+).split()
+
+
+def asyncpg_dsn(database_url: str) -> str:
+    """Converts a SQLAlchemy URL (postgresql+asyncpg://...) into a plain asyncpg DSN."""
+    return database_url.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+def _content(rng: random.Random) -> str:
+    return " ".join(rng.choices(_WORDS, k=rng.randint(30, 120)))[:4000]
+
+
+def _future_viewing_rows(count: int, days: int, rng: random.Random):
+    now = datetime.now(timezone.utc)
+    span_seconds = days * 24 * 60 * 60
+    for _ in range(count):
+        fv_id = uuid.uuid4()
+        status = rng.choice(STATUSES)
+        image_url = f"/static/images/{fv_id}.png" if status == "COMPLETED" else None
+        created_at = now - timedelta(seconds=rng.uniform(0, span_seconds))
+        yield (fv_id, f"Persona {rng.randint(1, 10**6)}", rng.randint(5, 90), _content(rng), created_at, image_url, status)
+
+
+async def _copy_in_chunks(conn: asyncpg.Connection, table: str, columns: list[str], rows) -> int:
+    total = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            await conn.copy_records_to_table(table, records=chunk, columns=columns)
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        await conn.copy_records_to_table(table, records=chunk, columns=columns)
+        total += len(chunk)
+    return total
+
+
+async def seed(
+    database_url: str,
+    viewings: int,
+    screens: int,
+    days: int = 30,
+    seen_fraction: float = 0.5,
+    max_seen_per_screen: int = 2000,
+    reset: bool = False,
+    random_seed: int = 42,
+) -> None:
+    """
+    Loads `viewings` FutureViewings spread over the last `days` days and `screens` screens.
+
+    Each screen is marked as having already shown `seen_fraction` of the completed viewings in
+    the current 24h window (at most `max_seen_per_screen`), so `recentFutureViewings` exercises
+    its NOT EXISTS filter realistically.
+    """
+    # Crea las tablas con los modelos actuales si la base de datos está vacía
+    from app.db import create_tables, engine
+    await create_tables()
+    await engine.dispose()
+
+    rng = random.Random(random_seed)
+    conn = await asyncpg.connect(asyncpg_dsn(database_url))
+    try:
+        if reset:
+            await conn.execute("TRUNCATE screen_viewings, screens, future_viewings")
+
+        started = time.perf_counter()
+        loaded = await _copy_in_chunks(
+            conn, "future_viewings",
+            ["id", "name", "age", "content", "created_at", "image_url", "status"],
+            _future_viewing_rows(viewings, days, rng),
+        )
+        print(f"future_viewings: {loaded} rows in {time.perf_counter() - started:.1f}s")
+
+        now = datetime.now(timezone.utc)
+        screen_ids = [uuid.uuid4() for _ in range(screens)]
+        await conn.copy_records_to_table(
+            "screens", records=[(sid, f"Pantalla {i}", now) for i, sid in enumerate(screen_ids)],
+            columns=["id", "name", "created_at"],
+        )
+        print(f"screens: {len(screen_ids)} rows")
+
+        recent_ids = [
+            r["id"] for r in await conn.fetch(
+                "SELECT id FROM future_viewings WHERE status = 'COMPLETED' AND created_at >= $1",
+                now - timedelta(hours=24),
+            )
+        ]
+
+        def screen_viewing_rows():
+            for screen_id in screen_ids:
+                seen = min(int(len(recent_ids) * seen_fraction), max_seen_per_screen)
+                for fv_id in rng.sample(recent_ids, seen):
+                    yield (uuid.uuid4(), fv_id, screen_id, now)
+
+        started = time.perf_counter()
+        loaded = await _copy_in_chunks(
+            conn, "screen_viewings", ["id", "future_viewing_id", "screen_id", "viewed_at"], screen_viewing_rows()
+        )
+        print(f"screen_viewings: {loaded} rows in {time.perf_counter() - started:.1f}s")
+        await conn.execute("ANALYZE future_viewings; ANALYZE screens; ANALYZE screen_viewings;")
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed the benchmark database.")
+    parser.add_argument("--viewings", type=int, default=10_000, help="FutureViewings to create (10k to 10M).")
+    parser.add_argument("--screens", type=int, default=10, help="Screens to create (10 to 1000).")
+    parser.add_argument("--days", type=int, default=30, help="Spread created_at over this many days.")
+    parser.add_argument("--seen-fraction", type=float, default=0.5,
+                        help="Fraction of the 24h window each screen has already shown.")
+    parser.add_argument("--max-seen-per-screen", type=int, default=2000)
+    parser.add_argument("--reset", action="store_true", help="Truncate the tables first.")
+    args = parser.parse_args()
+
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        raise SystemExit("DATABASE_URL must point to the benchmark database.")
+    asyncio.run(seed(
+        database_url, args.viewings, args.screens, args.days, args.seen_fraction,
+        args.max_seen_per_screen, args.reset,
+    ))
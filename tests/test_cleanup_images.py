@@ -2,6 +2,8 @@ import unittest
 import os
 import tempfile
 import time
+import json
+import asyncio
 import shutil # For robust directory removal if tempfile has issues
 from unittest.mock import patch, MagicMock
 
@@ -11,6 +13,7 @@ import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app.cleanup_images import clean_old_images, logging as cleanup_logging # Import the logger from the script
+from app.cleanup_images import reconcile_images, evict_to_quota, _write_spool, _save_checkpoint
 
 class TestCleanupImages(unittest.TestCase):
 
@@ -142,5 +145,163 @@ class TestCleanupImages(unittest.TestCase):
         self.assertTrue(len(error_log_calls) >= 1, "Should log error for non-existent directory.")
 
 
+class TestReconcileImages(unittest.TestCase):
+    """Tests for the streaming cleanup mode (filesystem only, no database)."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.image_dir = os.path.join(self.temp_dir.name, 'images')
+        os.makedirs(self.image_dir)
+        self.days_threshold = 14
+
+        old_mtime = time.time() - (self.days_threshold + 1) * 24 * 60 * 60
+        self.old_files = []
+        for i in range(5):
+            path = os.path.join(self.image_dir, f"old_{i}.png")
+            with open(path, "w") as f:
+                f.write("old")
+            os.utime(path, (old_mtime, old_mtime))
+            self.old_files.append(path)
+        self.new_file = os.path.join(self.image_dir, "new.png")
+        with open(self.new_file, "w") as f:
+            f.write("new")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def run_cleanup(self, **kwargs):
+        return asyncio.run(reconcile_images(self.image_dir, self.days_threshold, batch_size=2, **kwargs))
+
+    def test_deletes_expired_files_in_batches(self):
+        report = self.run_cleanup()
+        self.assertEqual(report.scanned, 6)
+        self.assertEqual(report.expired, 5)
+        self.assertEqual(report.deleted, 5)
+        self.assertEqual(report.bytes_freed, 15)
+        self.assertTrue(os.path.exists(self.new_file))
+        self.assertFalse(any(os.path.exists(path) for path in self.old_files))
+
+    def test_dry_run_writes_report_without_deleting(self):
+        report_path = os.path.join(self.temp_dir.name, 'report.ndjson')
+        report = self.run_cleanup(dry_run=True, report_path=report_path)
+        self.assertEqual(report.expired, 5)
+        self.assertEqual(report.deleted, 0)
+        self.assertTrue(all(os.path.exists(path) for path in self.old_files))
+        with open(report_path) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(sorted(r["file"] for r in records), sorted(os.path.basename(p) for p in self.old_files))
+
+    def test_resumes_from_checkpoint(self):
+        checkpoint_path = os.path.join(self.temp_dir.name, 'cleanup.checkpoint')
+        spool_path = checkpoint_path + ".spool"
+        _write_spool(self.image_dir, spool_path)
+        with open(spool_path, "rb") as f:
+            first_line = f.readline()
+        # Simula una ejecución interrumpida que ya había procesado la primera entrada
+        first_path = os.path.join(self.image_dir, first_line.decode().split("\t")[0])
+        now = time.time()
+        _save_checkpoint(checkpoint_path, {
+            "phase": "files",
+            "offset": len(first_line),
+            "last_row_id": None,
+            "cutoff": now - self.days_threshold * 24 * 60 * 60,
+            "orphan_cutoff": now - 3600,
+            "report": {"scanned": 1},
+        })
+
+        report = self.run_cleanup(checkpoint_path=checkpoint_path)
+        self.assertEqual(report.scanned, 6)
+        self.assertEqual(report.errors, 0)
+        # La entrada ya procesada no se vuelve a visitar
+        self.assertTrue(os.path.exists(first_path))
+        self.assertTrue(os.path.exists(self.new_file))
+        remaining_old = [path for path in self.old_files if path != first_path]
+        self.assertFalse(any(os.path.exists(path) for path in remaining_old))
+        self.assertEqual(report.deleted, len(remaining_old))
+        self.assertFalse(os.path.exists(checkpoint_path))
+        self.assertFalse(os.path.exists(spool_path))
+
+    def test_refuses_to_resume_with_a_different_dry_run(self):
+        checkpoint_path = os.path.join(self.temp_dir.name, 'cleanup.checkpoint')
+        now = time.time()
+        _save_checkpoint(checkpoint_path, {
+            "phase": "files",
+            "offset": 0,
+            "last_row_id": None,
+            "cutoff": now - self.days_threshold * 24 * 60 * 60,
+            "orphan_cutoff": now - 3600,
+            "report": {"scanned": 2, "dry_run": True},
+        })
+
+        with self.assertLogs(level="ERROR"):
+            report = self.run_cleanup(checkpoint_path=checkpoint_path)
+        self.assertFalse(report.dry_run)
+        self.assertEqual(report.scanned, 0)
+        self.assertTrue(all(os.path.exists(path) for path in self.old_files))
+        self.assertTrue(os.path.exists(checkpoint_path))  # Se conserva para reanudarlo en modo dry run
+
+
+class TestEvictToQuota(unittest.TestCase):
+    """Tests for quota-driven eviction (filesystem and served-at recency only)."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.image_dir = os.path.join(self.temp_dir.name, 'images')
+        os.makedirs(self.image_dir)
+        now = time.time()
+        # Cuatro archivos de 100 bytes con antigüedades de 2, 3, 4 y 5 días
+        self.paths = {}
+        for days in (2, 3, 4, 5):
+            path = os.path.join(self.image_dir, f"img_{days}d.png")
+            with open(path, "wb") as f:
+                f.write(b"x" * 100)
+            mtime = now - days * 24 * 60 * 60
+            os.utime(path, (mtime, mtime))
+            self.paths[days] = path
+        # Un archivo recién escrito pertenece a la ventana de 24h y nunca se expulsa
+        self.recent_path = os.path.join(self.image_dir, "recent.png")
+        with open(self.recent_path, "wb") as f:
+            f.write(b"x" * 100)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def evict(self, max_bytes, **kwargs):
+        return asyncio.run(evict_to_quota(self.image_dir, max_bytes, batch_size=2, pause_seconds=0, **kwargs))
+
+    def test_under_budget_does_nothing(self):
+        report = self.evict(1000)
+        self.assertEqual(report.total_bytes, 500)
+        self.assertEqual(report.evicted, 0)
+
+    def test_evicts_least_recently_used_first(self):
+        evicted = []
+        report = self.evict(300, on_evicted=evicted.append)
+        self.assertEqual(report.evicted, 2)
+        self.assertEqual(sorted(evicted), ["img_4d.png", "img_5d.png"])
+        self.assertTrue(os.path.exists(self.paths[2]))
+        self.assertTrue(os.path.exists(self.paths[3]))
+        self.assertTrue(os.path.exists(self.recent_path))
+
+    def test_recently_served_images_are_kept(self):
+        served_at = {"img_5d.png": time.time()}
+        self.evict(300, served_at=served_at)
+        self.assertTrue(os.path.exists(self.paths[5]))
+        self.assertFalse(os.path.exists(self.paths[4]))
+        self.assertFalse(os.path.exists(self.paths[3]))
+
+    def test_never_evicts_current_window(self):
+        report = self.evict(0)
+        self.assertEqual(report.evicted, 4)
+        self.assertEqual(report.protected, 1)
+        self.assertTrue(os.path.exists(self.recent_path))
+
+    def test_dry_run_keeps_files(self):
+        report = self.evict(300, dry_run=True)
+        self.assertEqual(report.evicted, 2)
+        self.assertEqual(report.bytes_freed, 200)
+        self.assertTrue(all(os.path.exists(path) for path in self.paths.values()))
+
+
 if __name__ == '__main__':
     unittest.main()
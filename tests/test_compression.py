@@ -0,0 +1,101 @@
+import unittest
+import os
+import gzip
+from unittest.mock import patch
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route, request_response
+from starlette.testclient import TestClient
+
+from app import compression
+from app.compression import CompressedBodyCache, CompressionMiddleware, negotiate_encoding
+
+
+class TestNegotiation(unittest.TestCase):
+
+    def test_client_weights_then_server_preference(self):
+        supported = ["zstd", "br", "gzip"]
+        self.assertEqual(negotiate_encoding("gzip, deflate, br", supported), "br")
+        self.assertEqual(negotiate_encoding("gzip;q=1.0, br;q=0.5", supported), "gzip")
+        self.assertEqual(negotiate_encoding("*", supported), "zstd")
+        self.assertEqual(negotiate_encoding("*;q=0.1, zstd;q=0", supported), "br")
+        self.assertIsNone(negotiate_encoding("identity", supported))
+        self.assertIsNone(negotiate_encoding("", supported))
+        self.assertIsNone(negotiate_encoding("gzip;q=0", ["gzip"]))
+
+
+class TestCompressionMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [{"id": i, "content": "una biblioteca infinita " * 20} for i in range(50)]
+
+        async def page(request: Request):
+            return JSONResponse({"data": self.rows[:int(request.query_params.get("n", "50"))]})
+
+        async def streamed(request: Request):
+            async def chunks():
+                yield b"x" * 4096
+                yield b"y" * 4096
+            return StreamingResponse(chunks())
+
+        async def encoded(request: Request):
+            return PlainTextResponse("z" * 4096, headers={"content-encoding": "identity"})
+
+        self.cache = CompressedBodyCache(max_bytes=1024 * 1024)
+        routes = [
+            Route(path, CompressionMiddleware(
+                request_response(endpoint), minimum_size=1024, thread_min_size=8192, cache=self.cache
+            ))
+            for path, endpoint in [("/page", page), ("/streamed", streamed), ("/encoded", encoded)]
+        ]
+        # Sin brotli ni zstd instalados el resultado no depende del entorno
+        patcher = patch.object(compression, "available_encodings", return_value={"gzip": compression._gzip})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = TestClient(Starlette(routes=routes))
+
+    def _get(self, path, accept="gzip"):
+        # iter_raw() devuelve el cuerpo tal como llega, sin que httpx lo descomprima
+        with self.client.stream("GET", path, headers={"accept-encoding": accept}) as response:
+            return response, b"".join(response.iter_raw())
+
+    def test_large_response_is_gzipped_and_reused(self):
+        first, first_body = self._get("/page")
+        second, second_body = self._get("/page")
+        self.assertEqual(first.headers["content-encoding"], "gzip")
+        self.assertEqual(first.headers["vary"], "Accept-Encoding")
+        self.assertEqual(int(first.headers["content-length"]), len(first_body))
+        self.assertEqual(gzip.decompress(first_body), JSONResponse({"data": self.rows}).body)
+        self.assertEqual(second_body, first_body)
+        self.assertEqual(len(self.cache._entries), 1)  # La segunda respuesta no se volvió a comprimir
+
+    def test_passes_through_what_it_should_not_compress(self):
+        small, _ = self._get("/page?n=1")
+        identity, _ = self._get("/page", accept="identity")
+        streamed, streamed_body = self._get("/streamed")
+        encoded, _ = self._get("/encoded")
+        for response in (small, identity, streamed):
+            self.assertNotIn("content-encoding", response.headers)
+            self.assertEqual(response.headers["vary"], "Accept-Encoding")
+        self.assertEqual(streamed_body, b"x" * 4096 + b"y" * 4096)
+        self.assertEqual(encoded.headers["content-encoding"], "identity")
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = CompressedBodyCache(max_bytes=10)
+        a, b, c = (cache.key("gzip", body) for body in (b"a", b"b", b"c"))
+        cache.put(a, b"12345")
+        cache.put(b, b"12345")
+        cache.get(a)
+        cache.put(c, b"12345")
+        self.assertIsNotNone(cache.get(a))
+        self.assertIsNone(cache.get(b))
+        self.assertEqual(cache.current_bytes, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
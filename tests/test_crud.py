@@ -0,0 +1,134 @@
+import unittest
+import os
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from helpers import FakeSession
+
+from ariadne import graphql
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import crud, schema
+from app.background import QueueFullError
+from app.models import FutureViewing, ProcessingStatus
+
+# Base de datos con las migraciones aplicadas para las pruebas contra Postgres (se omiten sin ella)
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+ADD_MUTATION = """
+    mutation Add($key: String) {
+        addFutureViewing(input: {name: "Ana", age: 30, content: "un faro", idempotencyKey: $key}) {
+            futureViewing { id status }
+        }
+    }
+"""
+
+
+class TestIdempotentAddFutureViewing(unittest.TestCase):
+
+    def setUp(self):
+        self.rows: dict[str, FutureViewing] = {}
+
+        async def create_idempotent(db, name, age, content, idempotency_key, claimed_by=None):
+            # Igual que el INSERT ... ON CONFLICT: la primera llamada crea la fila, las demás la devuelven
+            if idempotency_key in self.rows:
+                return self.rows[idempotency_key], False
+            fv = FutureViewing(id=uuid.uuid4(), name=name, age=age, content=content,
+                               status=ProcessingStatus.PENDING, created_at=datetime.now(timezone.utc))
+            self.rows[idempotency_key] = fv
+            return fv, True
+
+        async def by_key(db, idempotency_key):
+            return self.rows.get(idempotency_key)
+
+        self.enqueue = AsyncMock()
+        self.admission = MagicMock()
+        patches = [
+            patch.object(schema.crud, "create_future_viewing_idempotent", side_effect=create_idempotent),
+            patch.object(schema.crud, "get_future_viewing_by_idempotency_key", side_effect=by_key),
+            patch.object(schema, "AsyncSessionLocal", MagicMock(side_effect=FakeSession)),
+            patch.object(schema, "enqueue_image_generation", self.enqueue),
+            patch.object(schema, "check_admission", self.admission),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        request = SimpleNamespace(headers={}, client=SimpleNamespace(host="10.0.0.1"))
+        self.context = {"request": request}
+
+    def _execute(self, key):
+        _, result = asyncio.run(graphql(
+            schema.schema, {"query": ADD_MUTATION, "variables": {"key": key}}, context_value=self.context
+        ))
+        return result
+
+    def _add(self, key):
+        result = self._execute(key)
+        self.assertNotIn("errors", result)
+        return result["data"]["addFutureViewing"]["futureViewing"]
+
+    def test_retry_returns_the_same_row_without_a_second_job(self):
+        first = self._add("kiosk-1-req-42")
+        retry = self._add("kiosk-1-req-42")
+        self.assertEqual(retry, first)
+        self.enqueue.assert_awaited_once()
+        self.assertEqual(self.enqueue.await_args.args[0], first["id"])
+
+        other = self._add("kiosk-1-req-43")
+        self.assertNotEqual(other["id"], first["id"])
+        self.assertEqual(self.enqueue.await_count, 2)
+
+    def test_retry_is_answered_while_the_queue_is_full(self):
+        """Admission only applies to new rows: a kiosk retrying during a surge gets its original row."""
+        first = self._add("kiosk-1-req-42")
+        self.admission.side_effect = QueueFullError(retry_after_seconds=3)
+
+        self.assertEqual(self._add("kiosk-1-req-42"), first)
+        rejected = self._execute("kiosk-1-req-43")
+        self.assertEqual(rejected["errors"][0]["extensions"]["code"], "QUEUE_FULL")
+        self.assertEqual(self.enqueue.await_count, 1)
+        self.assertNotIn("kiosk-1-req-43", self.rows)
+
+
+@unittest.skipUnless(TEST_DATABASE_URL, "TEST_DATABASE_URL no está definida")
+class TestCreateFutureViewingIdempotentOnPostgres(unittest.TestCase):
+
+    def test_same_key_returns_the_original_row(self):
+        key = f"test-{uuid.uuid4()}"
+
+        async def scenario():
+            engine = create_async_engine(TEST_DATABASE_URL)
+            session_factory = async_sessionmaker(engine, expire_on_commit=False)
+            try:
+                async with session_factory() as db:
+                    first, first_created = await crud.create_future_viewing_idempotent(
+                        db, name="Ana", age=30, content="un faro", idempotency_key=key, claimed_by="test"
+                    )
+                async with session_factory() as db:
+                    retry, retry_created = await crud.create_future_viewing_idempotent(
+                        db, name="Otra", age=99, content="otra cosa", idempotency_key=key, claimed_by="test"
+                    )
+                async with session_factory() as db:
+                    found = await crud.get_future_viewing_by_idempotency_key(db, key)
+                    self.assertIsNone(await crud.get_future_viewing_by_idempotency_key(db, f"{key}-other"))
+                self.assertEqual(found.id, first.id)
+                return first, first_created, retry, retry_created
+            finally:
+                async with session_factory() as db:
+                    await db.execute(delete(FutureViewing).where(FutureViewing.idempotency_key == key))
+                    await db.commit()
+                await engine.dispose()
+
+        first, first_created, retry, retry_created = asyncio.run(scenario())
+        self.assertTrue(first_created)
+        self.assertFalse(retry_created)
+        self.assertEqual(retry.id, first.id)
+        self.assertEqual((retry.name, retry.content), ("Ana", "un faro"))  # Los datos del reintento se ignoran
+
+
+if __name__ == '__main__':
+    unittest.main()
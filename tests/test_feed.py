@@ -0,0 +1,123 @@
+import unittest
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch, MagicMock
+
+from helpers import FakeSession
+
+from app.feed import ScreenFeed
+from app.models import FutureViewing, ProcessingStatus
+
+
+class TestScreenFeed(unittest.TestCase):
+
+    def setUp(self):
+        """Ten completed viewings, one per minute, and a fake database holding ScreenViewings."""
+        now = datetime.now(timezone.utc)
+        self.viewings = [
+            FutureViewing(id=uuid.uuid4(), name=f"n{i}", age=i, content="c", image_url=f"/img/{i}.png",
+                          status=ProcessingStatus.COMPLETED, created_at=now - timedelta(minutes=10 - i))
+            for i in range(10)
+        ]
+        self.screen_id = uuid.uuid4()
+        self.persisted: set[tuple[uuid.UUID, uuid.UUID]] = set()
+
+        async def completed_since(db, since):
+            return [fv for fv in self.viewings if fv.created_at >= since]
+
+        async def shown_ids(db, screen_id, since):
+            if screen_id != self.screen_id:
+                return None
+            return {fv_id for fv_id, s_id in self.persisted if s_id == screen_id}
+
+        async def viewed_since(db, screen_ids, since):
+            return [(s_id, fv_id) for fv_id, s_id in self.persisted if s_id in screen_ids]
+
+        async def insert_rows(db, rows):
+            self.persisted.update((fv_id, screen_id) for fv_id, screen_id, _ in rows)
+            return len(rows)
+
+        patches = [
+            patch("app.feed.AsyncSessionLocal", MagicMock(side_effect=FakeSession)),
+            patch("app.feed.crud.get_completed_future_viewings_since", side_effect=completed_since),
+            patch("app.feed.crud.get_shown_future_viewing_ids", side_effect=shown_ids),
+            patch("app.feed.crud.get_screen_viewings_since", side_effect=viewed_since),
+            patch("app.feed.crud.insert_screen_viewings", side_effect=insert_rows),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _names(self, viewings):
+        return [v["name"] for v in viewings]
+
+    def test_polls_return_newest_unshown_oldest_first(self):
+        async def scenario():
+            feed = ScreenFeed()
+            self.assertIsNone(await feed.poll(self.screen_id))  # Aún sin cargar: se usa la BD
+            await feed.sync()
+            return [
+                self._names(await feed.poll(self.screen_id, page_size=3)),
+                self._names(await feed.poll(self.screen_id, page=2, page_size=2)),
+                self._names(await feed.poll(self.screen_id, page_size=3)),
+            ]
+
+        first, second_page, third = asyncio.run(scenario())
+        self.assertEqual(first, ["n7", "n8", "n9"])
+        self.assertEqual(second_page, ["n3", "n4"])  # Salta la primera página (n5, n6) sin marcarla
+        self.assertEqual(third, ["n2", "n5", "n6"])
+
+    def test_completions_reach_screens_already_polling(self):
+        async def scenario():
+            feed = ScreenFeed()
+            await feed.sync()
+            await feed.poll(self.screen_id, page_size=20)
+            created_at = datetime.now(timezone.utc)
+            fv_id = str(uuid.uuid4())
+            feed.add_completed(fv_id, "late", 5, "c", created_at, "/img/late.png")
+            return await feed.poll(self.screen_id), fv_id
+
+        viewings, fv_id = asyncio.run(scenario())
+        self.assertEqual([v["id"] for v in viewings], [fv_id])
+        self.assertEqual(viewings[0]["status"], ProcessingStatus.COMPLETED)
+
+    def test_restart_resumes_from_persisted_screen_viewings(self):
+        async def scenario():
+            feed = ScreenFeed()
+            await feed.sync()
+            await feed.poll(self.screen_id, page_size=4)
+            await feed.flush()
+            restarted = ScreenFeed()
+            await restarted.sync()
+            return self._names(await restarted.poll(self.screen_id, page_size=20))
+
+        self.assertEqual(asyncio.run(scenario()), [f"n{i}" for i in range(6)])
+
+    def test_sync_merges_what_other_processes_showed(self):
+        """Two processes serving the same screen do not show it the same viewing twice."""
+        async def scenario():
+            first, second = ScreenFeed(), ScreenFeed()
+            for feed in (first, second):
+                await feed.sync()
+                await feed.poll(self.screen_id, page_size=2)
+            await first.flush()
+            await second.flush()
+            await first.poll(self.screen_id, page_size=3)  # n5, n6, n7 en este proceso
+            await first.flush()
+            await second.sync()
+            return self._names(await second.poll(self.screen_id, page_size=20))
+
+        self.assertEqual(asyncio.run(scenario()), [f"n{i}" for i in range(5)])
+
+    def test_unregistered_screen_gets_nothing(self):
+        async def scenario():
+            feed = ScreenFeed()
+            await feed.sync()
+            return await feed.poll(uuid.uuid4())
+
+        self.assertEqual(asyncio.run(scenario()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
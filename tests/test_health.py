@@ -0,0 +1,84 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import helpers  # noqa: F401  (ruta del repositorio y DATABASE_URL antes de importar app)
+
+from starlette.applications import Starlette
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app import health
+
+
+def _task(done=False, error=None):
+    task = MagicMock()
+    task.done.return_value = done
+    task.cancelled.return_value = False
+    task.exception.return_value = error
+    return task
+
+
+class TestHealth(unittest.TestCase):
+
+    def setUp(self):
+        app = Starlette(routes=[
+            Route("/healthz", health.healthz, methods=["GET"]),
+            Route("/readyz", health.readyz, methods=["GET"]),
+        ])
+        self.client = TestClient(app)
+        self.workers = {"image_generation-0": _task(), "pending_job_recovery": _task()}
+
+    def _readyz(self, select_one):
+        with patch.object(health, "_select_one", select_one), \
+                patch.dict(health.worker_tasks, self.workers, clear=True):
+            return self.client.get("/readyz")
+
+    def test_healthz_does_not_touch_the_database(self):
+        select_one = AsyncMock(side_effect=OSError("connection refused"))
+        with patch.object(health, "_select_one", select_one):
+            response = self.client.get("/healthz")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"status": "ok"})
+        select_one.assert_not_called()
+
+    def test_ready_when_database_answers_and_workers_run(self):
+        response = self._readyz(AsyncMock())
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["status"], "ready")
+        self.assertTrue(body["checks"]["database"]["ok"])
+        self.assertTrue(all(w["ok"] for w in body["checks"]["workers"].values()))
+
+    def test_not_ready_when_database_fails(self):
+        response = self._readyz(AsyncMock(side_effect=OSError("connection refused")))
+        self.assertEqual(response.status_code, 503)
+        database = response.json()["checks"]["database"]
+        self.assertFalse(database["ok"])
+        self.assertEqual(database["error"], "OSError: connection refused")
+
+    def test_not_ready_when_a_worker_stopped(self):
+        self.workers["pending_job_recovery"] = _task(done=True, error=RuntimeError("boom"))
+        response = self._readyz(AsyncMock())
+        self.assertEqual(response.status_code, 503)
+        workers = response.json()["checks"]["workers"]
+        self.assertTrue(workers["image_generation-0"]["ok"])
+        self.assertEqual(workers["pending_job_recovery"], {"ok": False, "error": "RuntimeError('boom')"})
+
+    def test_not_ready_before_image_workers_start(self):
+        del self.workers["image_generation-0"]
+        response = self._readyz(AsyncMock())
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["checks"]["workers"]["image_generation"], {"ok": False, "error": "not started"})
+
+    def test_not_ready_while_draining(self):
+        health.draining.set()
+        try:
+            response = self._readyz(AsyncMock())
+        finally:
+            health.draining.clear()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["status"], "shutting_down")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+import unittest
+import os
+import asyncio
+import io
+import tarfile
+import tempfile
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from helpers import FakeSession
+
+from starlette.applications import Starlette
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app import images
+from app.cursors import encode_cursor
+from app.images import ImageCache, IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL
+
+
+def _write_image(directory, name, body):
+    with open(os.path.join(directory, name), "wb") as f:
+        f.write(body)
+
+
+class TestServeImage(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.images_dir = tmp.name
+        self.name = f"{uuid.uuid4()}.png"
+        self.body = os.urandom(4096)
+        _write_image(self.images_dir, self.name, self.body)
+        patches = [
+            patch.object(images, "IMAGES_DIR", self.images_dir),
+            patch.object(images, "image_cache", ImageCache(max_bytes=1024 * 1024, max_file_bytes=64 * 1024)),
+            patch.object(images, "served_at", images.OrderedDict()),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        app = Starlette(routes=[Route("/static/images/{filename}", images.serve_image, methods=["GET", "HEAD"])])
+        self.client = TestClient(app)
+
+    def _url(self, name=None):
+        return f"/static/images/{name or self.name}"
+
+    def test_conditional_requests_get_304(self):
+        first = self.client.get(self._url())
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.content, self.body)
+        etag = first.headers["etag"]
+
+        not_modified = self.client.get(self._url(), headers={"if-none-match": etag})
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b"")
+        self.assertEqual(not_modified.headers["etag"], etag)
+        self.assertEqual(not_modified.headers["cache-control"], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(self.client.get(self._url(), headers={"if-none-match": '"other"'}).status_code, 200)
+        self.assertEqual(
+            self.client.get(self._url(), headers={"if-modified-since": first.headers["last-modified"]}).status_code, 304
+        )
+
+    def test_range_requests(self):
+        self.client.get(self._url())  # También con la imagen en la caché en memoria
+        partial = self.client.get(self._url(), headers={"range": "bytes=100-199"})
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial.content, self.body[100:200])
+        self.assertEqual(partial.headers["content-range"], f"bytes 100-199/{len(self.body)}")
+        self.assertEqual(self.client.get(self._url(), headers={"range": "bytes=99999-"}).status_code, 416)
+
+    def test_cache_control_depends_on_the_name(self):
+        _write_image(self.images_dir, "logo.png", b"logo")
+        immutable = self.client.get(self._url())
+        mutable = self.client.get(self._url("logo.png"))
+        self.assertEqual(immutable.headers["cache-control"], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(mutable.headers["cache-control"], REVALIDATE_CACHE_CONTROL)
+        self.assertEqual(mutable.content, b"logo")
+        self.assertIsNone(images.image_cache.get("logo.png"))  # Solo se cachean nombres inmutables
+        self.assertEqual(self.client.get(self._url(".hidden.png")).status_code, 404)
+
+    def test_hot_images_are_served_from_memory(self):
+        first = self.client.get(self._url())
+        os.remove(os.path.join(self.images_dir, self.name))
+        cached = self.client.get(self._url())
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(cached.content, self.body)
+        self.assertEqual(cached.headers["etag"], first.headers["etag"])
+        head = self.client.head(self._url())
+        self.assertEqual(head.content, b"")
+        self.assertEqual(head.headers["content-length"], str(len(self.body)))
+
+    def test_served_at_only_records_images_that_exist(self):
+        self.assertEqual(self.client.get(f"/static/images/{uuid.uuid4()}.png").status_code, 404)
+        self.assertEqual(self.client.get("/static/images/missing.png").status_code, 404)
+        self.assertEqual(list(images.served_at), [])
+        self.assertEqual(self.client.get(f"/static/images/{self.name}").status_code, 200)
+        self.assertEqual(list(images.served_at), [self.name])
+
+    def test_served_at_is_bounded_and_pruned(self):
+        names = [self.name]
+        for _ in range(2):
+            names.append(f"{uuid.uuid4()}.png")
+            _write_image(self.images_dir, names[-1], b"x")
+        with patch.object(images, "SERVED_AT_MAX_ENTRIES", 2):
+            for name in names:
+                self.client.get(f"/static/images/{name}")
+        self.assertEqual(list(images.served_at), names[1:])  # Se olvida la menos reciente
+
+        os.remove(os.path.join(self.images_dir, names[1]))
+        self.assertEqual(asyncio.run(images.prune_served_at()), 1)
+        self.assertEqual(list(images.served_at), names[2:])
+
+
+class TestImageBundle(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        created_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self.viewings = []
+        for i in range(3):
+            fv_id = uuid.uuid4()
+            self.viewings.append(SimpleNamespace(id=fv_id, created_at=created_at, image_url=f"/static/images/{fv_id}.png"))
+            if i != 1:  # El segundo no tiene archivo en disco
+                _write_image(tmp.name, f"{fv_id}.png", os.urandom(1000 + i))
+        self.by_ids = AsyncMock(side_effect=lambda db, ids: [v for v in reversed(self.viewings) if v.id in ids])
+        self.for_prefetch = AsyncMock(return_value=self.viewings[:2])
+        patches = [
+            patch.object(images, "IMAGES_DIR", tmp.name),
+            patch.object(images, "AsyncSessionLocal", MagicMock(side_effect=FakeSession)),
+            patch.object(images.crud, "get_future_viewings_by_ids", self.by_ids),
+            patch.object(images.crud, "get_future_viewings_for_prefetch", self.for_prefetch),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.client = TestClient(Starlette(routes=[Route("/images/bundle", images.image_bundle, methods=["GET", "POST"])]))
+        self.images_dir = tmp.name
+
+    def _members(self, response):
+        with tarfile.open(fileobj=io.BytesIO(response.content)) as tar:
+            return [(member.name, tar.extractfile(member).read()) for member in tar.getmembers()]
+
+    def test_bundle_by_viewing_ids_keeps_the_requested_order(self):
+        ids = [str(self.viewings[2].id), str(self.viewings[1].id), str(self.viewings[0].id)]
+        response = self.client.post("/images/bundle", json={"viewingIds": ids})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "application/x-tar")
+        members = self._members(response)
+        # El archivo que falta se omite; el resto llega completo y en el orden pedido
+        self.assertEqual([name for name, _ in members], [f"{ids[0]}.png", f"{ids[2]}.png"])
+        for name, data in members:
+            with open(os.path.join(self.images_dir, name), "rb") as f:
+                self.assertEqual(data, f.read())
+
+    def test_bundle_for_a_screen_returns_the_next_cursor(self):
+        screen_id = uuid.uuid4()
+        response = self.client.get(f"/images/bundle?screenId={screen_id}&limit=2")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["x-next-cursor"], encode_cursor(self.viewings[1].created_at, self.viewings[1].id))
+        self.assertEqual([name for name, _ in self._members(response)], [f"{self.viewings[0].id}.png"])
+        self.assertEqual(self.for_prefetch.await_args.kwargs, {"screen_id": screen_id, "after": None, "limit": 2})
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.client.get("/images/bundle").status_code, 400)
+        self.assertEqual(self.client.post("/images/bundle", content=b"{").status_code, 400)
+        self.assertEqual(self.client.post("/images/bundle", json={"viewingIds": ["nope"]}).status_code, 400)
+        self.assertEqual(self.client.get("/images/bundle?screenId=nope").status_code, 400)
+        self.assertEqual(self.client.get(f"/images/bundle?screenId={uuid.uuid4()}&cursor=%%%").status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
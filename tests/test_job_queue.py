@@ -0,0 +1,197 @@
+import unittest
+import asyncio
+import uuid
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from helpers import FakeSession
+
+from app import background
+from app.background import FairJobQueue, ImageJob, JobPriority, JobTracker
+
+
+def _job(fv_id, source, priority=JobPriority.HIGH):
+    return ImageJob(fv_id, "name", 30, "content", source, priority)
+
+
+class TestFairJobQueue(unittest.TestCase):
+
+    def _drain(self, queue):
+        order = []
+        while not queue.empty():
+            order.append(queue.get_nowait().future_viewing_id)
+        return order
+
+    def test_round_robin_between_sources(self):
+        """A burst from one source does not delay the other sources' jobs."""
+        queue = FairJobQueue(maxsize=100, low_lane_every=5)
+        for i in range(5):
+            queue.put_nowait(_job(f"a{i}", "kiosk-a"))
+        queue.put_nowait(_job("b0", "kiosk-b"))
+        queue.put_nowait(_job("c0", "kiosk-c"))
+
+        self.assertEqual(self._drain(queue), ["a0", "b0", "c0", "a1", "a2", "a3", "a4"])
+
+    def test_low_lane_gets_a_share_under_load(self):
+        """With both lanes busy, one of every `low_lane_every` jobs comes from the LOW lane."""
+        queue = FairJobQueue(maxsize=100, low_lane_every=3)
+        for i in range(3):
+            queue.put_nowait(_job(f"low{i}", "kiosk-a", JobPriority.LOW))
+        for i in range(6):
+            queue.put_nowait(_job(f"high{i}", "kiosk-a"))
+
+        self.assertEqual(
+            self._drain(queue),
+            ["high0", "high1", "low0", "high2", "high3", "low1", "high4", "high5", "low2"],
+        )
+
+    def test_positions_match_the_schedule(self):
+        queue = FairJobQueue(maxsize=100, low_lane_every=5)
+        queue.put_nowait(_job("a0", "kiosk-a"))
+        queue.put_nowait(_job("a1", "kiosk-a"))
+        queue.put_nowait(_job("b0", "kiosk-b"))
+        queue.put_nowait(_job("r0", "recovery", JobPriority.LOW))
+        tracker = JobTracker(queue)
+
+        positions = {fv_id: tracker.position(fv_id) for fv_id in ("a0", "a1", "b0", "r0")}
+        self.assertEqual(positions, {"a0": 1, "b0": 2, "a1": 3, "r0": 4})
+        self.assertEqual(self._drain(queue), ["a0", "b0", "a1", "r0"])
+        self.assertIsNone(tracker.position("a0"))
+
+    def test_full_and_source_size(self):
+        queue = FairJobQueue(maxsize=2, low_lane_every=5)
+        queue.put_nowait(_job("a0", "kiosk-a"))
+        queue.put_nowait(_job("a1", "kiosk-a", JobPriority.LOW))
+        self.assertTrue(queue.full())
+        self.assertEqual(queue.source_size("kiosk-a"), 2)
+        with self.assertRaises(asyncio.QueueFull):
+            queue.put_nowait(_job("b0", "kiosk-b"))
+
+    def test_room_treats_zero_maxsize_as_unbounded(self):
+        unbounded = FairJobQueue(maxsize=0, low_lane_every=5)
+        unbounded.put_nowait(_job("a0", "kiosk-a"))
+        self.assertFalse(unbounded.full())
+        self.assertEqual(unbounded.room(50), 50)
+        bounded = FairJobQueue(maxsize=3, low_lane_every=5)
+        bounded.put_nowait(_job("a0", "kiosk-a"))
+        self.assertEqual(bounded.room(50), 2)
+        self.assertEqual(bounded.room(1), 1)
+
+    def test_get_waits_for_a_job(self):
+        async def scenario():
+            queue = FairJobQueue(maxsize=10, low_lane_every=5)
+            getter = asyncio.create_task(queue.get())
+            await asyncio.sleep(0)
+            self.assertFalse(getter.done())
+            queue.put_nowait(_job("a0", "kiosk-a"))
+            job = await asyncio.wait_for(getter, 1)
+            self.assertEqual(job.future_viewing_id, "a0")
+            self.assertTrue(queue.empty())
+
+        asyncio.run(scenario())
+
+
+class TestJobClaims(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = FairJobQueue(maxsize=10, low_lane_every=5)
+        self.tracker = JobTracker(self.queue)
+        patches = [
+            patch.object(background, "task_queue", self.queue),
+            patch.object(background, "job_tracker", self.tracker),
+            patch.object(background, "AsyncSessionLocal", MagicMock(side_effect=FakeSession)),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_renewal_covers_only_the_jobs_held(self):
+        """Queued, deferred and in-progress jobs are renewed; nothing else this instance once claimed."""
+        queued, deferred, running = (str(uuid.uuid4()) for _ in range(3))
+        self.queue.put_nowait(_job(queued, "kiosk-a"))
+        self.tracker.deferred[deferred] = ("kiosk-b", JobPriority.HIGH)
+        self.tracker.in_progress[running] = 0.0
+        renew = AsyncMock(return_value=3)
+
+        async def scenario():
+            worker = asyncio.create_task(background.job_lease_renewal_worker())
+            await asyncio.sleep(0.05)
+            worker.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+
+        with patch.object(background, "IMAGE_JOB_LEASE_SECONDS", 0.03), patch.object(background, "renew_claims", renew):
+            asyncio.run(scenario())
+        _, owner, fv_ids = renew.await_args.args
+        self.assertEqual(owner, background.INSTANCE_ID)
+        self.assertEqual(sorted(fv_ids), sorted(uuid.UUID(fv_id) for fv_id in (queued, deferred, running)))
+
+    def test_recovery_claims_with_an_unbounded_queue(self):
+        """IMAGE_QUEUE_MAX_SIZE=0 means no limit, not no room: recovery still claims a batch."""
+        self.queue.maxsize = 0
+        claim = AsyncMock(return_value=[])
+
+        async def scenario():
+            worker = asyncio.create_task(background.pending_job_recovery_worker())
+            await asyncio.sleep(0.01)
+            worker.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+
+        with patch.object(background, "claim_pending_future_viewings", claim), \
+                patch.object(background, "IMAGE_QUEUE_REFILL_BATCH", 25):
+            asyncio.run(scenario())
+        self.assertEqual(claim.await_args.kwargs["limit"], 25)
+
+    def test_jobs_are_released_when_no_image_worker_can_run(self):
+        """Without an image provider the instance must not keep claiming and renewing jobs."""
+        self.queue.put_nowait(_job(str(uuid.uuid4()), "kiosk-a"))
+        self.tracker.deferred[str(uuid.uuid4())] = ("kiosk-b", JobPriority.HIGH)
+        release = AsyncMock(return_value=2)
+        claim = AsyncMock(return_value=[])
+
+        async def scenario():
+            background.start_workers()
+            await asyncio.sleep(0.05)
+            tasks = dict(background.worker_tasks)
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            return tasks
+
+        with patch.object(background, "ensure_image_provider_configured", side_effect=ValueError("No GOOGLE_API_KEY set")), \
+                patch.object(background, "release_claims", release), \
+                patch.object(background, "claim_pending_future_viewings", claim), \
+                patch.object(background, "expire_idempotency_keys", AsyncMock(return_value=0)), \
+                patch.dict(background.worker_tasks, clear=True), \
+                self.assertLogs("app.background", level="ERROR"):
+            tasks = asyncio.run(scenario())
+        release.assert_awaited_once()
+        self.assertEqual(release.await_args.args[1:], (background.INSTANCE_ID,))
+        self.assertTrue(tasks["pending_job_recovery"].cancelled())
+        self.assertTrue(tasks["job_lease_renewal"].cancelled())
+        self.assertEqual(self.tracker.held_ids(), [])
+
+    def test_failed_job_releases_its_claim(self):
+        """A job whose worker raises is handed back instead of staying claimed by this instance."""
+        fv_id = str(uuid.uuid4())
+        self.queue.put_nowait(_job(fv_id, "kiosk-a"))
+        release = AsyncMock(return_value=1)
+        run_job = AsyncMock(side_effect=RuntimeError("provider down"))
+
+        async def scenario():
+            worker = asyncio.create_task(background.image_generation_worker())
+            await asyncio.sleep(0.05)
+            worker.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+
+        with patch.object(background, "ensure_image_provider_configured"), \
+                patch.object(background, "get_image_generator", MagicMock()), \
+                patch.object(background, "_run_job", run_job), \
+                patch.object(background, "release_claims", release), \
+                self.assertLogs("app.background", level="ERROR"):
+            asyncio.run(scenario())
+        release.assert_awaited_once()
+        self.assertEqual(release.await_args.args[1:], (background.INSTANCE_ID, [uuid.UUID(fv_id)]))
+        self.assertEqual(self.tracker.held_ids(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
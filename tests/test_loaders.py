@@ -0,0 +1,98 @@
+import unittest
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch, MagicMock
+
+from helpers import FakeSession
+
+from app.loaders import DataLoader, Loaders
+from app.models import FutureViewing, ProcessingStatus
+
+
+class TestDataLoader(unittest.TestCase):
+
+    def test_sibling_loads_share_one_batch(self):
+        """Keys requested by resolvers of the same level reach batch_fn together, once each."""
+        batches = []
+
+        async def batch_fn(keys):
+            batches.append(keys)
+            return [key * 10 for key in keys]
+
+        async def resolve(loader, key):
+            await asyncio.sleep(0)  # Como un resolver padre que aún no ha terminado
+            return await loader.load(key)
+
+        async def scenario():
+            loader = DataLoader(batch_fn)
+            first = await asyncio.gather(*(resolve(loader, key) for key in [1, 2, 2, 3]))
+            second = await loader.load(3)  # Ya en caché: no genera otro lote
+            return first, second
+
+        first, second = asyncio.run(scenario())
+        self.assertEqual(first, [10, 20, 20, 30])
+        self.assertEqual(second, 30)
+        self.assertEqual(batches, [[1, 2, 3]])
+
+    def test_batch_error_reaches_every_key(self):
+        async def batch_fn(keys):
+            raise ConnectionError("database unavailable")
+
+        async def scenario():
+            loader = DataLoader(batch_fn)
+            return await asyncio.gather(loader.load("a"), loader.load("b"), return_exceptions=True)
+
+        results = asyncio.run(scenario())
+        self.assertTrue(all(isinstance(r, ConnectionError) for r in results))
+
+
+class TestScreenViewingsLoader(unittest.TestCase):
+
+    def setUp(self):
+        """Five viewings shown on one screen, one per minute."""
+        now = datetime.now(timezone.utc)
+        self.screen_id = uuid.uuid4()
+        self.rows = [
+            (now - timedelta(minutes=i), uuid.uuid4(),
+             FutureViewing(id=uuid.uuid4(), name=f"n{i}", age=i, content="c", image_url=None,
+                           status=ProcessingStatus.COMPLETED, created_at=now))
+            for i in range(5)
+        ]
+        self.calls = []
+
+        async def viewings_for_screens(db, screen_ids, limit, before=None):
+            self.calls.append((list(screen_ids), limit, before))
+            rows = [row for row in self.rows if before is None or (row[0], row[1]) < before]
+            return {self.screen_id: rows[:limit]} if self.screen_id in screen_ids else {}
+
+        patches = [
+            patch("app.loaders.AsyncSessionLocal", MagicMock(side_effect=FakeSession)),
+            patch("app.loaders.crud.get_viewings_for_screens", side_effect=viewings_for_screens),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_pages_follow_the_cursor(self):
+        async def scenario():
+            other = uuid.uuid4()
+            first, empty = await asyncio.gather(
+                Loaders().screen_viewings.load((self.screen_id, 3, None)),
+                Loaders().screen_viewings.load((other, 3, None)),
+            )
+            rest = await Loaders().screen_viewings.load((self.screen_id, 3, first["endCursor"]))
+            return first, empty, rest
+
+        first, empty, rest = asyncio.run(scenario())
+        names = lambda page: [edge["futureViewing"]["name"] for edge in page["edges"]]
+        self.assertEqual(names(first), ["n0", "n1", "n2"])
+        self.assertTrue(first["hasNextPage"])
+        self.assertEqual(names(rest), ["n3", "n4"])
+        self.assertFalse(rest["hasNextPage"])
+        self.assertEqual(empty, {"edges": [], "endCursor": None, "hasNextPage": False})
+        self.assertEqual(self.calls[0][1], 4)  # Una fila de más para saber si hay otra página
+
+
+if __name__ == '__main__':
+    unittest.main()
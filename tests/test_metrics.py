@@ -0,0 +1,81 @@
+import unittest
+import os
+import asyncio
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ariadne import QueryType, graphql, make_executable_schema
+from prometheus_client import REGISTRY
+
+from app.metrics import observe_provider_call, resolver_metrics_middleware
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class _FakeProvider:
+
+    def __init__(self, result=None, error=None):
+        self.result = result
+        self.error = error
+
+    @observe_provider_call
+    async def generate_image(self, prompt, filename):
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class TestResolverMetrics(unittest.TestCase):
+
+    def test_resolver_latency_is_recorded_per_field(self):
+        query = QueryType()
+
+        @query.field("metricsProbe")
+        async def resolve_metrics_probe(*_):
+            await asyncio.sleep(0)
+            return "ok"
+
+        schema = make_executable_schema("type Query { metricsProbe: String! }", query)
+        labels = {"type": "Query", "field": "metricsProbe"}
+        before = _sample("graphql_resolver_duration_seconds_count", **labels)
+
+        ok, result = asyncio.run(graphql(
+            schema, {"query": "{ metricsProbe }"}, middleware=[resolver_metrics_middleware]
+        ))
+
+        self.assertTrue(ok)
+        self.assertEqual(result, {"data": {"metricsProbe": "ok"}})
+        self.assertEqual(_sample("graphql_resolver_duration_seconds_count", **labels), before + 1)
+
+
+class TestProviderMetrics(unittest.TestCase):
+
+    def _counts(self):
+        return (
+            _sample("image_provider_duration_seconds_count", provider="_FakeProvider"),
+            _sample("image_provider_errors_total", provider="_FakeProvider"),
+        )
+
+    def test_successful_call_records_latency_only(self):
+        calls, errors = self._counts()
+        image_url = asyncio.run(_FakeProvider(result="/images/a.png").generate_image("prompt", "a.png"))
+        self.assertEqual(image_url, "/images/a.png")
+        self.assertEqual(self._counts(), (calls + 1, errors))
+
+    def test_raising_call_counts_an_error(self):
+        calls, errors = self._counts()
+        with self.assertRaises(RuntimeError):
+            asyncio.run(_FakeProvider(error=RuntimeError("quota")).generate_image("prompt", "a.png"))
+        self.assertEqual(self._counts(), (calls + 1, errors + 1))
+
+    def test_call_without_image_counts_an_error(self):
+        calls, errors = self._counts()
+        self.assertIsNone(asyncio.run(_FakeProvider().generate_image("prompt", "a.png")))
+        self.assertEqual(self._counts(), (calls + 1, errors + 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import os
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from starlette.applications import Starlette
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app import profiling
+from app.profiling import LoopMonitor, sample_stacks
+
+
+def _blocking_call(seconds):
+    time.sleep(seconds)
+
+
+class TestLoopMonitor(unittest.TestCase):
+
+    def test_stall_is_logged_with_the_blocking_stack(self):
+        """The watchdog reports the stall while it happens, once, with the frame that blocks the loop."""
+        async def scenario():
+            monitor = LoopMonitor(interval=0.01, stall_threshold=0.05)
+            monitor.start()
+            await asyncio.sleep(0.03)
+            _blocking_call(0.3)
+            await asyncio.sleep(0.03)
+            await monitor.stop()
+
+        with self.assertLogs("app.profiling", level="WARNING") as logs:
+            asyncio.run(scenario())
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("_blocking_call", logs.records[0].stack)
+        self.assertGreaterEqual(logs.records[0].lag_ms, 50)
+
+
+class TestSampler(unittest.TestCase):
+
+    def test_collapsed_stacks_point_at_the_busy_function(self):
+        stop = threading.Event()
+
+        def busy():
+            while not stop.is_set():
+                sum(range(1000))
+
+        thread = threading.Thread(target=busy)
+        thread.start()
+        try:
+            stacks = sample_stacks(thread.ident, seconds=0.2, interval=0.005)
+        finally:
+            stop.set()
+            thread.join()
+        self.assertGreater(sum(stacks.values()), 10)
+        top_stack, _ = stacks.most_common(1)[0]
+        leaf = top_stack.split(";")[-1]
+        self.assertTrue(leaf.startswith("busy (") and "test_profiling.py:" in leaf, leaf)
+        self.assertTrue(top_stack.startswith("_bootstrap ("))  # La raíz va primero
+
+
+class TestProfileEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch.object(profiling, "PROFILER_TOKEN", "secret")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = TestClient(Starlette(routes=[Route("/debug/profile", profiling.profile_endpoint)]))
+
+    def test_returns_collapsed_stacks(self):
+        response = self.client.get(
+            "/debug/profile?seconds=0.1&interval_ms=5", headers={"Authorization": "Bearer secret"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(response.headers["x-profile-samples"]), 0)
+        for line in response.text.splitlines():
+            stack, count = line.rsplit(" ", 1)
+            self.assertTrue(stack and int(count) > 0)
+
+    def test_rejects_bad_requests(self):
+        auth = {"Authorization": "Bearer secret"}
+        self.assertEqual(self.client.get("/debug/profile?seconds=0.1").status_code, 401)
+        self.assertEqual(self.client.get("/debug/profile?seconds=600", headers=auth).status_code, 400)
+        self.assertEqual(self.client.get("/debug/profile?interval_ms=abc", headers=auth).status_code, 400)
+        with patch.object(profiling, "PROFILER_TOKEN", None):
+            self.assertEqual(self.client.get("/debug/profile", headers=auth).status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import os
+from unittest.mock import patch
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ariadne import QueryType, graphql_sync, make_executable_schema
+from sqlalchemy import create_engine, text
+
+from app import tracing
+from app.tracing import SQLTracingExtension, current_operation, install_sql_tracing
+
+
+class TestSQLTracing(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        install_sql_tracing(self.engine)
+        with self.engine.begin() as conn:
+            conn.execute(text("CREATE TABLE viewings (id INTEGER PRIMARY KEY, views INTEGER)"))
+            conn.execute(text("INSERT INTO viewings (id, views) VALUES (1, 0), (2, 0), (3, 0)"))
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def _run_operation(self, *statements):
+        """Runs the statements inside a traced operation and returns its trace."""
+        extension = SQLTracingExtension()
+        extension.request_started({})
+        try:
+            with self.engine.begin() as conn:
+                for statement in statements:
+                    conn.execute(text(statement))
+        finally:
+            extension.request_finished({})
+        return extension.trace
+
+    def test_statements_and_rows_are_attributed_to_their_operation(self):
+        first = self._run_operation("UPDATE viewings SET views = views + 1", "SELECT id FROM viewings")
+        second = self._run_operation("UPDATE viewings SET views = 0 WHERE id = 1")
+        # Lo que se ejecuta fuera de una operación no se atribuye a ninguna
+        with self.engine.begin() as conn:
+            conn.execute(text("DELETE FROM viewings WHERE id = 3"))
+
+        self.assertIsNone(current_operation.get())
+        self.assertEqual(first.statements, 2)
+        self.assertEqual(first.rows, 3)
+        self.assertEqual(second.statements, 1)
+        self.assertEqual(second.rows, 1)
+        self.assertGreater(first.db_time_ns, 0)
+
+    def test_operation_is_named_after_the_graphql_query(self):
+        query = QueryType()
+
+        @query.field("total")
+        def resolve_total(*_):
+            with self.engine.connect() as conn:
+                return conn.execute(text("SELECT COUNT(*) FROM viewings")).scalar_one()
+
+        schema = make_executable_schema("type Query { total: Int! }", query)
+        extension = SQLTracingExtension()
+        ok, result = graphql_sync(schema, {"query": "query Totals { total }"}, extensions=[lambda: extension])
+
+        self.assertTrue(ok)
+        self.assertEqual(result, {"data": {"total": 3}})
+        self.assertEqual(extension.trace.name, "query Totals")
+        self.assertEqual(extension.trace.root_fields, ["total"])
+        self.assertEqual(extension.trace.statements, 1)
+
+    def test_slow_statement_is_logged_above_the_threshold(self):
+        with patch.object(tracing, "SLOW_QUERY_MS", 0), self.assertLogs("app.tracing", level="WARNING") as logs:
+            trace = self._run_operation("SELECT id FROM viewings")
+        records = [r for r in logs.records if hasattr(r, "slow_query")]
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0].slow_query["statement"], "SELECT id FROM viewings")
+        self.assertEqual(records[0].slow_query["trace_id"], trace.trace_id)
+
+    def test_fast_statement_is_not_logged(self):
+        with patch.object(tracing, "SLOW_QUERY_MS", 60_000), patch.object(tracing, "SLOW_OPERATION_MS", 60_000):
+            with self.assertNoLogs("app.tracing", level="WARNING"):
+                self._run_operation("SELECT id FROM viewings")
+
+    def test_repeated_statement_is_flagged(self):
+        statement = "SELECT views FROM viewings WHERE id = 1"
+        with patch.object(tracing, "REPEATED_STATEMENT_THRESHOLD", 3), \
+                patch.object(tracing, "SLOW_OPERATION_MS", 60_000), \
+                self.assertLogs("app.tracing", level="WARNING") as logs:
+            self._run_operation(statement, statement, statement, "SELECT id FROM viewings")
+        (record,) = [r for r in logs.records if hasattr(r, "slow_operation")]
+        self.assertEqual(record.slow_operation["repeated_statements"], {statement: 3})
+        self.assertEqual(record.slow_operation["statements"], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
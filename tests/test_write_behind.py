@@ -0,0 +1,75 @@
+import unittest
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from unittest.mock import patch, MagicMock
+
+from helpers import FakeSession
+
+from app.models import ProcessingStatus
+from app.write_behind import StatusWriteBehind
+
+
+class TestStatusWriteBehind(unittest.TestCase):
+
+    def setUp(self):
+        self.batches = []
+        self.created_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+        async def fake_apply(db, updates):
+            self.batches.append(list(updates))
+            return {uuid.UUID(fv_id): self.created_at for fv_id, _, _ in updates}
+
+        patcher_apply = patch("app.write_behind.apply_status_updates", side_effect=fake_apply)
+        patcher_session = patch("app.write_behind.AsyncSessionLocal", MagicMock(side_effect=FakeSession))
+        patcher_apply.start()
+        patcher_session.start()
+        self.addCleanup(patcher_apply.stop)
+        self.addCleanup(patcher_session.stop)
+
+    def test_concurrent_writes_share_one_batch(self):
+        """Writes within the delay are committed together and each caller gets its row back."""
+        async def scenario():
+            writer = StatusWriteBehind(max_batch=50, delay_seconds=0.01)
+            ids = [str(uuid.uuid4()) for _ in range(5)]
+            results = await asyncio.gather(*(
+                writer.write(fv_id, ProcessingStatus.COMPLETED, f"/static/images/{fv_id}.png") for fv_id in ids
+            ))
+            return ids, results
+
+        ids, results = asyncio.run(scenario())
+        self.assertEqual(len(self.batches), 1)
+        self.assertEqual([fv_id for fv_id, _, _ in self.batches[0]], ids)
+        self.assertEqual(results, [self.created_at] * 5)
+
+    def test_full_batch_flushes_without_waiting(self):
+        async def scenario():
+            writer = StatusWriteBehind(max_batch=2, delay_seconds=60)
+            ids = [str(uuid.uuid4()) for _ in range(4)]
+            await asyncio.wait_for(
+                asyncio.gather(*(writer.write(fv_id, ProcessingStatus.FAILED) for fv_id in ids)), 1
+            )
+
+        asyncio.run(scenario())
+        self.assertEqual([len(batch) for batch in self.batches], [2, 2])
+
+    def test_failed_flush_reaches_every_caller(self):
+        """A job is never acknowledged when its result could not be committed."""
+        async def failing_apply(db, updates):
+            raise ConnectionError("database unavailable")
+
+        async def scenario():
+            writer = StatusWriteBehind(max_batch=50, delay_seconds=0.01)
+            return await asyncio.gather(
+                writer.write(str(uuid.uuid4()), ProcessingStatus.COMPLETED, "/a.png"),
+                writer.write(str(uuid.uuid4()), ProcessingStatus.FAILED),
+                return_exceptions=True,
+            )
+
+        with patch("app.write_behind.apply_status_updates", side_effect=failing_apply):
+            results = asyncio.run(scenario())
+        self.assertTrue(all(isinstance(r, ConnectionError) for r in results))
+
+
+if __name__ == '__main__':
+    unittest.main()